@@ -0,0 +1,128 @@
+"""
+Controle de admissão das análises com IA: limite de análises simultâneas, fila de espera limitada
+(rejeição imediata quando cheia), prazo por análise e novas tentativas com backoff em rate limit do LLM.
+"""
+import os # Configurações via .env
+import time # Prazos e tempo de espera
+import random # Jitter do backoff
+import threading # Vagas compartilhadas entre as threads das análises
+from contextlib import contextmanager # Vaga liberada ao sair do bloco
+
+try:
+    from litellm.exceptions import RateLimitError # Rate limit dos LLMs chamados via LiteLLM (dependência do CrewAI)
+except ImportError:
+    RateLimitError = None
+
+MAX_ANALISES_SIMULTANEAS = int(os.getenv('MEDAI_MAX_ANALISES_SIMULTANEAS', os.getenv('MEDAI_POOL_CREWS', '4')))
+TAMANHO_FILA_ADMISSAO = int(os.getenv('MEDAI_FILA_ADMISSAO', '8'))
+ESPERA_MAX_ADMISSAO_S = float(os.getenv('MEDAI_ESPERA_MAX_ADMISSAO_S', '30'))
+TIMEOUT_ANALISE_S = float(os.getenv('MEDAI_TIMEOUT_ANALISE_S', '180'))
+TENTATIVAS_RATE_LIMIT = int(os.getenv('MEDAI_TENTATIVAS_RATE_LIMIT', '3'))
+BACKOFF_BASE_S = float(os.getenv('MEDAI_BACKOFF_BASE_S', '2'))
+
+class AnaliseRejeitada(Exception):
+    """Sem vaga nem lugar na fila (ou espera esgotada); a API responde 429"""
+
+class AnaliseExpirada(Exception):
+    """Análise passou do prazo e foi cancelada; a API responde 504"""
+
+class ControleAdmissao:
+    """Semáforo com fila limitada e métricas de espera e rejeição"""
+
+    def __init__(self, max_concorrentes=MAX_ANALISES_SIMULTANEAS, tamanho_fila=TAMANHO_FILA_ADMISSAO,
+                 espera_max_s=ESPERA_MAX_ADMISSAO_S):
+        self.max_concorrentes = max_concorrentes
+        self.tamanho_fila = tamanho_fila
+        self.espera_max_s = espera_max_s
+        self._condicao = threading.Condition()
+        self.executando = 0
+        self.aguardando = 0
+        self.metricas = {"admitidas": 0, "rejeitadas_fila_cheia": 0, "rejeitadas_espera": 0,
+                         "expiradas": 0, "novas_tentativas": 0, "espera_total_ms": 0.0, "espera_max_ms": 0.0}
+
+    @contextmanager
+    def admitir(self):
+        """Ocupa uma vaga durante o bloco; espera na fila se preciso ou levanta AnaliseRejeitada"""
+        inicio = time.perf_counter()
+        with self._condicao:
+            if self.executando >= self.max_concorrentes:
+                if self.aguardando >= self.tamanho_fila:
+                    self.metricas["rejeitadas_fila_cheia"] += 1
+                    raise AnaliseRejeitada(f"Limite de análises atingido ({self.max_concorrentes} executando, "
+                                           f"{self.aguardando} aguardando)")
+                self.aguardando += 1
+                try:
+                    liberou = self._condicao.wait_for(lambda: self.executando < self.max_concorrentes,
+                                                      timeout=self.espera_max_s)
+                finally:
+                    self.aguardando -= 1
+                if not liberou:
+                    self.metricas["rejeitadas_espera"] += 1
+                    raise AnaliseRejeitada(f"Nenhuma vaga liberada em {self.espera_max_s:.0f}s")
+            self.executando += 1
+            espera_ms = (time.perf_counter() - inicio) * 1000
+            self.metricas["admitidas"] += 1
+            self.metricas["espera_total_ms"] += espera_ms
+            self.metricas["espera_max_ms"] = max(self.metricas["espera_max_ms"], espera_ms)
+        try:
+            yield espera_ms
+        finally:
+            with self._condicao:
+                self.executando -= 1
+                self._condicao.notify()
+
+    def registrar(self, metrica):
+        with self._condicao:
+            self.metricas[metrica] += 1
+
+    def estatisticas(self):
+        with self._condicao:
+            dados = dict(self.metricas)
+            dados.update(executando=self.executando, aguardando=self.aguardando,
+                         max_concorrentes=self.max_concorrentes, tamanho_fila=self.tamanho_fila)
+        dados["espera_media_ms"] = round(dados["espera_total_ms"] / dados["admitidas"], 2) if dados["admitidas"] else 0.0
+        dados["espera_total_ms"] = round(dados["espera_total_ms"], 2)
+        dados["espera_max_ms"] = round(dados["espera_max_ms"], 2)
+        return dados
+
+def verificar_prazo(prazo):
+    """Levanta AnaliseExpirada se o prazo (time.monotonic) já passou; usado nos callbacks da crew"""
+    if prazo is not None and time.monotonic() > prazo:
+        raise AnaliseExpirada("Tempo máximo da análise excedido")
+
+def eh_rate_limit(erro):
+    """
+    Rate limit do LLM: RateLimitError do LiteLLM (o Gemini cai nele) ou HTTP 429, no erro ou em algum
+    erro encadeado (o CrewAI pode embrulhar a exceção original). Texto da mensagem não conta: uma
+    ferramenta que só menciona "quota" não pode disparar novas execuções da crew.
+    """
+    vistos = set()
+    while erro is not None and id(erro) not in vistos:
+        vistos.add(id(erro))
+        if RateLimitError is not None and isinstance(erro, RateLimitError):
+            return True
+        resposta = getattr(erro, "response", None)
+        if 429 in (getattr(erro, "status_code", None), getattr(resposta, "status_code", None)):
+            return True
+        erro = erro.__cause__ or erro.__context__
+    return False
+
+def executar_com_novas_tentativas(funcao, prazo=None, tentativas=TENTATIVAS_RATE_LIMIT, base_s=BACKOFF_BASE_S,
+                                  ao_repetir=None):
+    """
+    Executa funcao() repetindo em rate limit com backoff exponencial e jitter completo
+    (espera aleatória entre 0 e base * 2^tentativa), sem ultrapassar o prazo.
+    ao_repetir(tentativa, espera_s) é chamado antes de cada nova tentativa.
+    """
+    for tentativa in range(tentativas):
+        try:
+            return funcao()
+        except Exception as e:
+            if not eh_rate_limit(e) or tentativa == tentativas - 1:
+                raise
+            espera = random.uniform(0, base_s * (2 ** tentativa))
+            if prazo is not None and time.monotonic() + espera > prazo:
+                raise AnaliseExpirada("Tempo máximo da análise excedido aguardando rate limit do LLM") from e
+            if ao_repetir:
+                ao_repetir(tentativa + 1, espera)
+            time.sleep(espera)
@@ -4,19 +4,167 @@ Usa dados processados do banco vetorial FAISS para análise inteligente
 """
 import json # conversão de dicts JSON 
 import os # usar os para usar o .env
+import queue # Pool de crews pré-montadas
+import time # Medir preparação e execução das análises
+import logging # Logs de tempos das análises
+import threading # Streaming do relatório (chunks chegam pelo event bus do CrewAI)
+from functools import partial # Fábricas de crew por modo de execução
+import contextvars # Rastreio da análise nas threads de busca web
+from contextlib import contextmanager # Empréstimo de crews do pool
+from collections import Counter # Categorias mais frequentes entre os medicamentos encontrados
+from concurrent.futures import ThreadPoolExecutor # Buscas web em paralelo com a crew de medicamentos
 from dotenv import load_dotenv # Carregar .env
 from crewai import Agent, Task, Crew, Process, LLM # Usado para a criação dos agentes
 from crewai.tools import tool # Decorador para criar ferramentas custom para os agentes
-from crewai_tools import SerperDevTool # Ferramenta para busca web via API Serper
 import vector_database # Importa o banco vetorial do código vector_database
+from cache_analises import CacheAnalises, chave_analise # Cache persistente de análises completas
+import rastreio # Tempos, tokens e contadores por análise
+from admissao import (ControleAdmissao, AnaliseExpirada, TIMEOUT_ANALISE_S, verificar_prazo,
+                      executar_com_novas_tentativas) # Limite de concorrência, prazo e rate limit
+from cache_busca_web import FerramentaBuscaWeb, busca_web_disponivel, cache_busca_web # Busca web (Serper) com cache e modo offline
 
 # Carrega .env (chaves de API, configurações)
 load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Incrementar sempre que descrições de agentes/tarefas mudarem (invalida o cache de análises)
+VERSAO_PROMPTS = 2
+
+# Quantas crews ficam pré-montadas (cada análise simultânea usa uma com exclusividade)
+TAMANHO_POOL_CREWS = int(os.getenv('MEDAI_POOL_CREWS', '4'))
+
+# "ferramentas": o agente de medicamentos chama as ferramentas de busca/detalhes (uma ida ao LLM por chamada)
+# "prefetch": a busca vetorial e os detalhes são feitos antes, em lote, e entram prontos no contexto da tarefa
+# "paralelo": prefetch + buscas web (por especialidades previstas) rodando junto com o agente de medicamentos
+MODOS_ANALISE = ("ferramentas", "prefetch", "paralelo")
+MODO_ANALISE = os.getenv('MEDAI_MODO_ANALISE', 'prefetch')
+
+# Prefetch: quantos medicamentos entram na tabela e quantos deles recebem detalhes completos
+TOP_K_PREFETCH = 5
+DETALHES_PREFETCH = 3
+
+# Modo paralelo: especialidade sugerida por categoria terapêutica (demais categorias -> Clínico Geral)
+ESPECIALIDADES_POR_CATEGORIA = {
+    "Cardiovascular": "Cardiologista",
+    "Sistema Nervoso": "Neurologista",
+    "Gastrointestinal": "Gastroenterologista",
+    "Endocrino": "Endocrinologista",
+    "Respiratorio": "Pneumologista",
+    "Dermatologico": "Dermatologista",
+    "Oftalmico": "Oftalmologista",
+    "Antineoplasico": "Oncologista"
+}
+MAX_ESPECIALIDADES_BUSCA = 2
+RESULTADOS_POR_BUSCA_WEB = 3
+
+# Buscas web do modo paralelo (curtas e limitadas pelo I/O do Serper)
+executor_buscas_web = ThreadPoolExecutor(max_workers=TAMANHO_POOL_CREWS * 2, thread_name_prefix="busca_web")
+
+def configurar_pool_http():
+    """Reaproveita conexões HTTP (keep-alive) entre chamadas ao LLM feitas via LiteLLM"""
+    try:
+        import httpx
+        import litellm
+    except ImportError:
+        return
+    if litellm.client_session is None:
+        litellm.client_session = httpx.Client(
+            limits=httpx.Limits(max_connections=TAMANHO_POOL_CREWS * 2, max_keepalive_connections=TAMANHO_POOL_CREWS * 2),
+            timeout=httpx.Timeout(120.0, connect=10.0)
+        )
+
+configurar_pool_http()
+
+# Cliente LLM único, compartilhado por todas as crews
 llm = LLM(
     model=os.getenv('MODEL_NAME', 'gemini/gemini-2.0-flash'),
     api_key=os.getenv('GEMINI_API_KEY')
 )
 
+# Relatório final (agente de segurança) gerado em streaming, repassado token a token para o SSE das análises
+STREAM_RELATORIO = os.getenv('MEDAI_STREAM_RELATORIO', '1') == '1'
+MARCADOR_RESPOSTA_FINAL = "Final Answer:"
+
+def criar_llm_relatorio():
+    """
+    LLM próprio do agente de segurança de cada crew: os chunks de streaming do event bus do CrewAI
+    trazem o LLM de origem, e um LLM por crew identifica a análise. LLM substituído (ex.: stub de
+    benchmark) é usado como está.
+    """
+    if not STREAM_RELATORIO or not isinstance(llm, LLM):
+        return llm
+    return LLM(model=llm.model, api_key=os.getenv('GEMINI_API_KEY'), stream=True)
+
+class SaidaStream:
+    """Repassa ao_token(texto) só o que vem depois de 'Final Answer:' em cada chamada ao LLM"""
+    
+    def __init__(self, ao_token):
+        self.ao_token = ao_token
+        self._lock = threading.Lock()
+        self.reiniciar()
+    
+    def reiniciar(self):
+        self.buffer = ""
+        self.liberado = False
+    
+    def receber(self, chunk):
+        with self._lock:
+            if self.liberado:
+                self.ao_token(chunk)
+                return
+            self.buffer += chunk
+            posicao = self.buffer.find(MARCADOR_RESPOSTA_FINAL)
+            if posicao >= 0:
+                self.liberado = True
+                resto = self.buffer[posicao + len(MARCADOR_RESPOSTA_FINAL):].lstrip()
+                if resto:
+                    self.ao_token(resto)
+
+_saidas_stream = {} # id(LLM) -> SaidaStream da análise que está usando a crew
+_ouvintes_stream = {"instalados": False}
+_lock_stream = threading.Lock()
+
+def _instalar_ouvintes_stream():
+    """Registra uma vez os handlers de LLMCallStartedEvent/LLMStreamChunkEvent no event bus do CrewAI"""
+    with _lock_stream:
+        if _ouvintes_stream["instalados"]:
+            return True
+        try:
+            from crewai.events import crewai_event_bus, LLMCallStartedEvent, LLMStreamChunkEvent
+        except ImportError:
+            try:
+                from crewai.utilities.events import crewai_event_bus, LLMCallStartedEvent, LLMStreamChunkEvent
+            except ImportError:
+                logger.warning("Versão do CrewAI sem eventos de streaming; relatório será entregue só no fim")
+                return False
+        
+        @crewai_event_bus.on(LLMCallStartedEvent)
+        def _ao_iniciar_chamada(fonte, evento):
+            saida = _saidas_stream.get(id(fonte))
+            if saida:
+                saida.reiniciar()
+        
+        @crewai_event_bus.on(LLMStreamChunkEvent)
+        def _ao_receber_chunk(fonte, evento):
+            saida = _saidas_stream.get(id(fonte))
+            if saida:
+                saida.receber(evento.chunk)
+        
+        _ouvintes_stream["instalados"] = True
+        return True
+
+@contextmanager
+def transmitir_relatorio(llm_relatorio, ao_token):
+    """Durante o bloco, os chunks do LLM do relatório vão para ao_token"""
+    if ao_token is None or not getattr(llm_relatorio, 'stream', False) or not _instalar_ouvintes_stream():
+        yield
+        return
+    _saidas_stream[id(llm_relatorio)] = SaidaStream(ao_token)
+    try:
+        yield
+    finally:
+        _saidas_stream.pop(id(llm_relatorio), None)
+
 
 @tool
 def search_medicamentos_anvisa(descricao_sintomas: str, top_k: int = 5) -> str:
@@ -31,7 +179,8 @@ def search_medicamentos_anvisa(descricao_sintomas: str, top_k: int = 5) -> str:
             return json.dumps({"erro": "Descrição de sintomas muito curta"})
         
         # Buscar medicamentos usando similaridade semântica no banco vetorial FAISS
-        resultados = vector_database.vector_db.search_medicamentos(descricao_sintomas, top_k)
+        with rastreio.span("ferramenta", "search_medicamentos_anvisa"):
+            resultados = vector_database.vector_db.search_medicamentos(descricao_sintomas, top_k)
         
         # Verificar se encontrou resultados
         if not resultados:
@@ -53,7 +202,8 @@ def get_detalhes_medicamento(nome_medicamento: str) -> str:
             return json.dumps({"erro": "Banco vetorial não inicializado"})
         
         # Buscar detalhes completos no banco vetorial usando busca textual
-        detalhes = vector_database.vector_db.get_medicamento_detalhes(nome_medicamento)
+        with rastreio.span("ferramenta", "get_detalhes_medicamento"):
+            detalhes = vector_database.vector_db.get_medicamento_detalhes(nome_medicamento)
         
         # Verificar se medicamento foi encontrado
         if not detalhes:
@@ -77,43 +227,436 @@ def verificar_configuracao_agentes():
     
     return config_status
 
-"""
-O Agente Especialista em Medicamentos é responsável por encontrar medicamentos adequados aos sintomas descritos.
-Ele tem acesso às ferramentas de busca vetorial e detalhamento de medicamentos. Sua função é identificar medicamentos registrados na ANVISA que possam ser relevantes para os sintomas apresentados, considerando similaridade semântica, categoria terapêutica e disponibilidade no mercado brasileiro.
-"""
-agente_medicamentos = Agent(
-    role="Especialista em Medicamentos ANVISA",
-    goal="Identificar medicamentos adequados baseado em sintomas usando dados oficiais da ANVISA",
-    verbose=False,
-    memory=True,
-    backstory="""Você é um farmacêutico clínico com acesso aos dados oficiais da ANVISA. 
-    Analisa medicamentos registrados no Brasil e suas indicações, priorizando sempre a segurança do paciente.
-    Você classifica o nível de risco dos medicamentos e determina se requerem receita médica.""",
-    tools=[search_medicamentos_anvisa, get_detalhes_medicamento],
-    llm=llm
-)
+def criar_agente_medicamentos(com_ferramentas=True):
+    """
+    O Agente Especialista em Medicamentos é responsável por encontrar medicamentos adequados aos sintomas descritos.
+    Ele tem acesso às ferramentas de busca vetorial e detalhamento de medicamentos (no modo prefetch recebe os resultados prontos). Sua função é identificar medicamentos registrados na ANVISA que possam ser relevantes para os sintomas apresentados, considerando similaridade semântica, categoria terapêutica e disponibilidade no mercado brasileiro.
+    """
+    return Agent(
+        role="Especialista em Medicamentos ANVISA",
+        goal="Identificar medicamentos adequados baseado em sintomas usando dados oficiais da ANVISA",
+        verbose=False,
+        memory=False, # Sem memória entre análises: o contexto de cada análise vai nas tarefas
+        max_retry_limit=0, # Sem retry imediato do CrewAI: rate limit é repetido com backoff (admissao.py)
+        backstory="""Você é um farmacêutico clínico com acesso aos dados oficiais da ANVISA. 
+        Analisa medicamentos registrados no Brasil e suas indicações, priorizando sempre a segurança do paciente.
+        Você classifica o nível de risco dos medicamentos e determina se requerem receita médica.""",
+        tools=[search_medicamentos_anvisa, get_detalhes_medicamento] if com_ferramentas else [],
+        llm=llm
+    )
 
-"""
-O Agente Analista de Segurança é responsável por avaliar os riscos e a segurança dos medicamentos recomendados.
-Ele utiliza ferramentas de busca web para pesquisar informações atualizadas sobre contraindicações, efeitos 
-colaterais e orientações de segurança.
-"""
-agente_seguranca = Agent(
-    role="Analista de Segurança e Orientação Médica",
-    goal="Avaliar segurança das recomendações e fornecer orientações sobre quando consultar médicos",
-    verbose=False,
-    memory=True,
-    backstory="""Você é um especialista em farmacovigilância e telemedicina. Avalia riscos de medicamentos,
-    determina quando é essencial buscar orientação médica profissional e conhece plataformas de consulta online.
-    Você tem conhecimento sobre as principais plataformas de telemedicina no Brasil e pode recomendar
-    especialistas adequados baseado no tipo de medicamento e nível de risco.""",
-    tools=[SerperDevTool(api_key=os.getenv('SERPER_API_KEY'))] if os.getenv('SERPER_API_KEY') else [],
-    llm=llm
-)
+def criar_agente_seguranca(com_ferramentas=True):
+    """
+    O Agente Analista de Segurança é responsável por avaliar os riscos e a segurança dos medicamentos recomendados.
+    Ele utiliza ferramentas de busca web para pesquisar informações atualizadas sobre contraindicações, efeitos 
+    colaterais e orientações de segurança.
+    """
+    return Agent(
+        role="Analista de Segurança e Orientação Médica",
+        goal="Avaliar segurança das recomendações e fornecer orientações sobre quando consultar médicos",
+        verbose=False,
+        memory=False, # Sem memória entre análises: o contexto de cada análise vai nas tarefas
+        max_retry_limit=0, # Sem retry imediato do CrewAI: rate limit é repetido com backoff (admissao.py)
+        backstory="""Você é um especialista em farmacovigilância e telemedicina. Avalia riscos de medicamentos,
+        determina quando é essencial buscar orientação médica profissional e conhece plataformas de consulta online.
+        Você tem conhecimento sobre as principais plataformas de telemedicina no Brasil e pode recomendar
+        especialistas adequados baseado no tipo de medicamento e nível de risco.""",
+        tools=[FerramentaBuscaWeb()] if com_ferramentas and busca_web_disponivel() else [],
+        llm=criar_llm_relatorio() # LLM próprio por crew para o streaming do relatório
+    )
+
+# Passos 1-2 da tarefa de medicamentos em cada modo
+INSTRUCOES_BUSCA = {
+    "ferramentas": """
+        1. Use search_medicamentos_anvisa para encontrar medicamentos adequados (top 5)
+        2. Para cada medicamento encontrado, avalie:
+           - Similaridade com os sintomas (scores > 0.7 são excelentes)
+           - Categoria terapêutica e adequação
+           - Popularidade no mercado brasileiro
+           - Use get_detalhes_medicamento para medicamentos mais promissores
+        """,
+    "prefetch": """
+        1. A busca vetorial na base da ANVISA já foi feita. Resultados (não é preciso buscar de novo):
+        {contexto_medicamentos}
+        2. Para cada medicamento da tabela, avalie:
+           - Similaridade com os sintomas (scores > 0.7 são excelentes)
+           - Categoria terapêutica e adequação
+           - Popularidade no mercado brasileiro
+           - Os detalhes dos mais promissores já estão na tabela
+        """
+}
+
+INSTRUCOES_BUSCA["paralelo"] = INSTRUCOES_BUSCA["prefetch"]
+
+# Abertura e passo 3 da tarefa de segurança: no modo paralelo a análise de medicamentos e as buscas web chegam prontas
+ABERTURA_SEGURANCA = {
+    "ferramentas": """
+        Com base na análise do Especialista em Medicamentos, conduza análise completa de segurança
+        e forneça orientações sobre consultas médicas online.
+        """,
+    "paralelo": """
+        Com base na análise do Especialista em Medicamentos abaixo, conduza análise completa de segurança
+        e forneça orientações sobre consultas médicas online.
+        
+        ANÁLISE DO ESPECIALISTA EM MEDICAMENTOS:
+        {analise_medicamentos}
+        """
+}
+ABERTURA_SEGURANCA["prefetch"] = ABERTURA_SEGURANCA["ferramentas"]
+
+INSTRUCOES_LINKS = {
+    "ferramentas": """
+        3. Use busca web para encontrar:
+           - Plataformas de telemedicina adequadas (Doctoralia, Consulta do Bem, etc.)
+           - Especialistas recomendados baseado na categoria dos medicamentos
+           - Links diretos para agendamento online
+        """,
+    "paralelo": """
+        3. As buscas web por plataformas de telemedicina e especialistas já foram feitas
+           (não é preciso buscar de novo). Escolha os links mais adequados:
+        {contexto_web}
+        """
+}
+INSTRUCOES_LINKS["prefetch"] = INSTRUCOES_LINKS["ferramentas"]
+
+def entradas_crew(**valores):
+    """
+    Inputs do kickoff sem chaves: o CrewAI substitui os {placeholders} um depois do outro, então um sintoma ou
+    uma saída de agente com "{contexto_web}" receberia o contexto de outro input. Chaves viram parênteses.
+    """
+    return {chave: str(valor).replace("{", "(").replace("}", ")") for chave, valor in valores.items()}
+
+def criar_crew(modo="ferramentas"):
+    """
+    Monta agentes, tarefas e crew uma única vez; os sintomas entram como {sintomas} via kickoff(inputs=...),
+    então a mesma crew pode ser reutilizada por análises sucessivas.
+    No modo prefetch o agente de medicamentos não tem ferramentas e recebe {contexto_medicamentos} pronto.
+    No modo paralelo, além disso, as buscas web rodam junto com a crew de medicamentos e a tarefa de
+    segurança (sem ferramentas) recebe {analise_medicamentos} e {contexto_web}; devolve um PipelineParalelo.
+    """
+    agente_medicamentos = criar_agente_medicamentos(com_ferramentas=(modo == "ferramentas"))
+    agente_seguranca = criar_agente_seguranca(com_ferramentas=(modo != "paralelo"))
+    
+    """
+    A Tarefa de Busca de Medicamentos é executada pelo agente especialista utilizando o banco vetorial para encontrar medicamentos similares aos sintomas descritos,  considerando scores de confiança, categorias terapêuticas apropriadas e disponibilidade no mercado brasileiro. O agente deve usar tanto a busca semântica quanto a busca detalhada para fornecer recomendações fundamentadas nos dados da ANVISA que estão no banco vetorial
+    """
+    task_medicamentos = Task(
+        description="""
+        Analise os sintomas: "{sintomas}"
+        
+        INSTRUÇÕES DETALHADAS:""" + INSTRUCOES_BUSCA[modo] + """
+        3. NÍVEL DE RISCO (nivel_risco) e RECEITA MÉDICA (requer_receita) já vêm calculados
+           pelas regras da categoria terapêutica: repita os valores como estão, sem reclassificar.
+        
+        4. Escreva a justificativa de cada recomendação com base nos sintomas.
+        """,
+        expected_output="""
+        Lista de 3-5 medicamentos recomendados com:
+        - Nome do princípio ativo
+        - Categoria terapêutica  
+        - Score de confiança (% de similaridade)
+        - Nível de risco (BAIXO/MÉDIO/ALTO)
+        - Requer receita: SIM/NÃO
+        - Justificativa baseada nos sintomas
+        - Informações de disponibilidade
+        """,
+        agent=agente_medicamentos
+    )
+    
+    """
+    A Tarefa de Análise de Segurança é executada pelo agente de segurança dependendo dos resultados da busca de medicamentos e tem como objetivo avaliar os riscos associados às recomendações, urgência, necessidade de receita e o especialista que ele deve procurar. O agente utiliza a tool busca web para encontrar informações atualizadas sobre contraindicações, efeitos colaterais e orientações de segurança, determinando também o nível de urgência para consulta médica e fornecendo disclaimers apropriados sobre automedicação.
+    """
+    task_seguranca = Task(
+        description=ABERTURA_SEGURANCA[modo] + """
+        ANÁLISE DE SEGURANÇA:
+        1. Revise os medicamentos recomendados e seus níveis de risco
+        2. Determine urgência para consulta médica baseado em:
+           - Medicamentos de alto risco recomendados
+           - Sintomas descritos: "{sintomas}"
+           - Necessidade de receita médica
+        
+        BUSCA DE LINKS PARA CONSULTAS MÉDICAS:""" + INSTRUCOES_LINKS[modo] + """
+        4. Especialidades a considerar:
+           - Medicamentos cardiovasculares → Cardiologista
+           - Medicamentos neurológicos → Neurologista  
+           - Medicamentos gastrointestinais → Gastroenterologista
+           - Medicamentos gerais → Clínico Geral
+        
+        URGÊNCIA DA CONSULTA:
+        - URGENTE: Medicamentos de alto risco, sintomas preocupantes  
+        - RECOMENDADA: Medicamentos que requerem receita
+        - OPCIONAL: Medicamentos de baixo risco
+        """,
+        expected_output="""
+        Análise de segurança completa:
+        - Avaliação de risco para cada medicamento
+        - Nível de urgência (URGENTE/RECOMENDADA/OPCIONAL)
+        - Especialista recomendado
+        - Links para consulta médica online (2-3 opções)
+        - Orientações de segurança
+        - Disclaimers sobre automedicação
+        """,
+        agent=agente_seguranca,
+        context=None if modo == "paralelo" else [task_medicamentos]
+    )
+    
+    if modo == "paralelo":
+        # Duas crews de uma tarefa: a de segurança recebe a análise de medicamentos como {analise_medicamentos}
+        return PipelineParalelo(
+            Crew(agents=[agente_medicamentos], tasks=[task_medicamentos], verbose=False, process=Process.sequential),
+            Crew(agents=[agente_seguranca], tasks=[task_seguranca], verbose=False, process=Process.sequential)
+        )
+    
+    """
+    O Crew têm execução sequencial, onde primeiro o especialista em medicamentos busca e analisa opções terapêuticas,
+    e em seguida o analista de segurança avalia os riscos e fornece orientações de segurança.
+    """
+    return Crew(
+        agents=[agente_medicamentos, agente_seguranca],
+        tasks=[task_medicamentos, task_seguranca],
+        verbose=False,
+        process=Process.sequential
+    )
+
+class PipelineParalelo:
+    """
+    Crew de medicamentos e crew de segurança separadas, para que as buscas web rodem em paralelo
+    com a primeira. Expõe agents/tasks das duas para instalar_callbacks.
+    """
+    
+    def __init__(self, crew_medicamentos, crew_seguranca):
+        self.crew_medicamentos = crew_medicamentos
+        self.crew_seguranca = crew_seguranca
+        self.agents = crew_medicamentos.agents + crew_seguranca.agents
+        self.tasks = crew_medicamentos.tasks + crew_seguranca.tasks
+
+class PoolCrews:
+    """
+    Pool de crews pré-montadas. Cada análise pega uma crew com exclusividade e a devolve no fim,
+    então análises simultâneas nunca compartilham agentes. Se o pool estiver vazio, monta uma crew extra.
+    """
+    
+    def __init__(self, fabrica, tamanho):
+        self.fabrica = fabrica
+        self.tamanho = tamanho
+        self.livres = queue.Queue(maxsize=tamanho)
+    
+    def aquecer(self):
+        """Pré-monta as crews (chamado no startup da API, fora do caminho crítico das análises)"""
+        while not self.livres.full():
+            self.livres.put_nowait(self.fabrica())
+    
+    @contextmanager
+    def obter(self):
+        try:
+            crew = self.livres.get_nowait()
+        except queue.Empty:
+            crew = self.fabrica()
+            logger.info("Pool de crews vazio, crew extra montada")
+        try:
+            yield crew
+        finally:
+            try:
+                self.livres.put_nowait(crew)
+            except queue.Full:
+                pass # Crew extra é descartada
+    
+    def esvaziar(self):
+        """Descarta as crews montadas (ex.: depois de trocar o LLM); as próximas são montadas de novo"""
+        while True:
+            try:
+                self.livres.get_nowait()
+            except queue.Empty:
+                return
+
+# Um pool por modo: as crews dos dois modos têm agentes e tarefas diferentes
+pools_crews = {modo: PoolCrews(partial(criar_crew, modo), TAMANHO_POOL_CREWS) for modo in MODOS_ANALISE}
+pool_crews = pools_crews[MODO_ANALISE] # Pool do modo padrão, aquecido no startup da API
+controle_admissao = ControleAdmissao()
+
+def reiniciar_pools():
+    for pool in pools_crews.values():
+        pool.esvaziar()
+cache_analises = CacheAnalises()
+
+def instalar_callbacks(crew, ao_evento, prazo=None):
+    """
+    Liga os callbacks de passo/tarefa da crew à função ao_evento(tipo, **dados) desta análise
+    e registra o tempo de cada tarefa no rastreio da análise.
+    Com prazo (time.monotonic), o primeiro passo depois dele levanta AnaliseExpirada e cancela a crew.
+    Os callbacks são gravados direto em agentes e tarefas porque a crew é reutilizada pelo pool
+    (o CrewAI só copia os callbacks da crew quando eles ainda não existem).
+    """
+    emitir = ao_evento or (lambda tipo, **dados: None)
+    registro = rastreio.atual()
+    estado = {"tarefa": 0, "inicio": time.perf_counter(), "passos": 0}
+    tarefas = crew.tasks
+    
+    def ao_passo(passo):
+        verificar_prazo(prazo)
+        tarefa = tarefas[min(estado["tarefa"], len(tarefas) - 1)]
+        estado["passos"] += 1
+        ferramenta = getattr(passo, 'tool', None)
+        if ferramenta:
+            emitir("ferramenta", agente=tarefa.agent.role, ferramenta=ferramenta,
+                   entrada=str(getattr(passo, 'tool_input', ''))[:200])
+        else:
+            emitir("passo", agente=tarefa.agent.role)
+    
+    def ao_concluir_tarefa(saida):
+        verificar_prazo(prazo)
+        tarefa = tarefas[estado["tarefa"]]
+        agora = time.perf_counter()
+        if registro:
+            registro.adicionar_span("tarefa", f"tarefa_{estado['tarefa'] + 1}", estado["inicio"], agora,
+                                    agente=tarefa.agent.role, passos=estado["passos"])
+        estado.update(inicio=agora, passos=0)
+        emitir("tarefa_concluida", tarefa=estado["tarefa"] + 1, total=len(tarefas), agente=tarefa.agent.role)
+        estado["tarefa"] += 1
+        if estado["tarefa"] < len(tarefas):
+            proxima = tarefas[estado["tarefa"]]
+            emitir("tarefa_iniciada", tarefa=estado["tarefa"] + 1, total=len(tarefas), agente=proxima.agent.role)
+    
+    for agente in crew.agents:
+        agente.step_callback = ao_passo
+    for tarefa in tarefas:
+        tarefa.callback = ao_concluir_tarefa
+    
+    emitir("tarefa_iniciada", tarefa=1, total=len(tarefas), agente=tarefas[0].agent.role)
+
+def _uso_tokens(agente):
+    """Tokens acumulados pelo agente (o CrewAI conta por agente; a crew do pool é exclusiva durante a análise)"""
+    processo = getattr(agente, '_token_process', None)
+    if processo is None:
+        return {}
+    resumo = processo.get_summary()
+    return {campo: getattr(resumo, campo, 0) or 0 for campo in rastreio.CAMPOS_TOKENS}
+
+@contextmanager
+def medir_tokens(agentes):
+    """Registra no rastreio os tokens gastos por cada agente durante o bloco (diferença antes/depois)"""
+    antes = [(agente, _uso_tokens(agente)) for agente in agentes]
+    try:
+        yield
+    finally:
+        registro = rastreio.atual()
+        if registro:
+            for agente, uso_antes in antes:
+                uso_depois = _uso_tokens(agente)
+                registro.registrar_tokens(agente.role, {c: uso_depois.get(c, 0) - uso_antes.get(c, 0) for c in uso_depois})
+
+def _celula(valor, limite=80):
+    """Texto curto e sem quebras/pipes para uma célula da tabela de contexto"""
+    texto = ' '.join(str(valor or '').replace('|', '/').split())
+    return texto if len(texto) <= limite else texto[:limite - 3] + '...'
+
+def preparar_contexto_medicamentos(sintomas, top_k=TOP_K_PREFETCH, detalhes_top=DETALHES_PREFETCH):
+    """
+    Faz de uma vez a busca vetorial e os detalhes dos primeiros resultados (o que o agente faria com
+    search_medicamentos_anvisa + get_detalhes_medicamento) e devolve (tabela compacta, resultados da busca).
+    """
+    db = vector_database.vector_db
+    resultados = db.search_medicamentos(sintomas, top_k)
+    if not resultados:
+        return "Nenhum medicamento encontrado na base da ANVISA.", []
+    
+    linhas = ["| # | Princípio ativo | Categorias | Similaridade | Risco | Receita | Popularidade | Produtos | Exemplos | Empresas |",
+              "|---|---|---|---|---|---|---|---|---|---|"]
+    detalhes = []
+    for i, med in enumerate(resultados, 1):
+        linhas.append(f"| {i} | {_celula(med['principio_ativo'])} | {_celula('; '.join(med['categorias']))} | "
+                      f"{med['similaridade']:.2f} | {med['nivel_risco']} | {'SIM' if med['requer_receita'] else 'NÃO'} | {_celula(med['popularidade'])} | {med['total_produtos']} | "
+                      f"{_celula(med.get('produtos_encontrados') or med['produtos_exemplo'])} | {_celula(med['empresas_exemplo'])} |")
+        if i <= detalhes_top:
+            # Pela linha do próprio resultado: a busca por nome casa substrings e pode trazer outro princípio
+            detalhe = db.get_detalhes_por_indice(med['indice'])
+            detalhes.append(f"- {_celula(med['principio_ativo'])}: formulações {_celula(detalhe['diversidade_formulacoes'], 20)}; "
+                            f"{_celula(detalhe['texto_completo'], 300)}")
+    
+    tabela = '\n'.join(linhas)
+    if detalhes:
+        tabela += '\nDetalhes dos mais promissores:\n' + '\n'.join(detalhes)
+    return tabela, resultados
+
+def prever_especialidades(resultados, maximo=MAX_ESPECIALIDADES_BUSCA):
+    """Especialidades das categorias mais frequentes entre os medicamentos encontrados (sempre inclui Clínico Geral)"""
+    contagem = Counter(ESPECIALIDADES_POR_CATEGORIA[c] for med in resultados for c in med['categorias']
+                       if c in ESPECIALIDADES_POR_CATEGORIA)
+    return [especialidade for especialidade, _ in contagem.most_common(maximo)] + ["Clínico Geral"]
+
+def _resumir_busca_web(consulta, resultado_json):
+    """Primeiros resultados orgânicos de uma busca como linhas 'título: link - trecho'"""
+    try:
+        organicos = json.loads(resultado_json).get("organic", [])
+    except (ValueError, AttributeError):
+        return f"Busca '{consulta}': {_celula(resultado_json, 300)}"
+    linhas = [f"Busca '{consulta}':"]
+    for item in organicos[:RESULTADOS_POR_BUSCA_WEB]:
+        linhas.append(f"- {_celula(item.get('title'))}: {item.get('link', '')} - {_celula(item.get('snippet'), 150)}")
+    return '\n'.join(linhas)
+
+def iniciar_buscas_web(especialidades):
+    """Dispara as buscas de telemedicina e especialistas em background; devolve [(consulta, future)]"""
+    consultas = ["plataformas de telemedicina no Brasil"] + [f"{e} consulta online" for e in especialidades]
+    # copy_context: as buscas registram no rastreio da análise que as disparou
+    return [(consulta, executor_buscas_web.submit(contextvars.copy_context().run, cache_busca_web.buscar, consulta))
+            for consulta in consultas]
+
+def coletar_buscas_web(buscas):
+    """Espera as buscas disparadas e monta o contexto web da tarefa de segurança (falhas viram uma linha de aviso)"""
+    blocos = []
+    for consulta, futuro in buscas:
+        try:
+            blocos.append(_resumir_busca_web(consulta, futuro.result()))
+        except Exception as e:
+            blocos.append(f"Busca '{consulta}' indisponível: {e}")
+    return '\n'.join(blocos)
 
-def executar_analise_sintomas(sintomas):
-    """Análise completa de sintomas com recomendação de medicamentos e consultas médicas"""
+def executar_pipeline_paralelo(pipeline, entradas, encontrados, ao_evento=None):
+    """
+    Buscas web (telemedicina + especialidades previstas pelas categorias) rodam enquanto a crew de
+    medicamentos trabalha; depois a crew de segurança recebe as duas coisas prontas.
+    """
+    especialidades = prever_especialidades(encontrados)
+    inicio_web = time.perf_counter()
+    buscas = iniciar_buscas_web(especialidades)
+    
+    analise_medicamentos = pipeline.crew_medicamentos.kickoff(inputs=entradas)
+    
+    espera = time.perf_counter()
+    with rastreio.span("etapa", "espera_busca_web"):
+        contexto_web = coletar_buscas_web(buscas)
+    if ao_evento:
+        ao_evento("busca_web", especialidades=especialidades, consultas=len(buscas),
+                  ms=round((time.perf_counter() - inicio_web) * 1000, 1),
+                  espera_ms=round((time.perf_counter() - espera) * 1000, 1)) # tempo que a segurança esperou pela web
+    
+    return pipeline.crew_seguranca.kickoff(inputs={
+        **entradas,
+        **entradas_crew(analise_medicamentos=analise_medicamentos, contexto_web=contexto_web)
+    })
+
+def executar_analise_sintomas(sintomas, ao_evento=None, usar_cache=True, modo=None, incluir_rastreio=False):
+    """
+    Análise completa de sintomas com recomendação de medicamentos e consultas médicas.
+    ao_evento(tipo, **dados), se informado, recebe o progresso real da crew (tarefas e ferramentas).
+    usar_cache=False ignora o cache de análises (mas o resultado novo é guardado).
+    modo: "ferramentas", "prefetch" ou "paralelo" (padrão MEDAI_MODO_ANALISE).
+    incluir_rastreio=True devolve o rastreio da análise (tempos, tokens, ferramentas) em "rastreio".
+    """
+    modo = modo or MODO_ANALISE
+    with rastreio.rastrear(modo) as registro:
+        resultado = _executar_analise(sintomas, ao_evento, usar_cache, modo)
+        registro.finalizar(resultado["status"], resultado.get("cache"))
+    if incluir_rastreio:
+        resultado["rastreio"] = registro.resumo()
+    return resultado
+
+def _executar_analise(sintomas, ao_evento, usar_cache, modo):
     try:
+        if modo not in MODOS_ANALISE:
+            raise ValueError(f"Modo de análise desconhecido: {modo}. Válidos: {', '.join(MODOS_ANALISE)}")
+        
         # Verificar se banco vetorial está inicializado
         if not vector_database.vector_db:
             return {"status": "erro", "erro": "Banco vetorial não inicializado"}
@@ -123,105 +666,97 @@ def executar_analise_sintomas(sintomas):
         if not config["gemini_api_key"]:
             return {"status": "erro", "erro": "GEMINI_API_KEY não configurada"}
         
-        """
-        A Tarefa de Busca de Medicamentos é executada pelo agente especialista utilizando o banco vetorial para encontrar medicamentos similares aos sintomas descritos,  considerando scores de confiança, categorias terapêuticas apropriadas e disponibilidade no mercado brasileiro. O agente deve usar tanto a busca semântica quanto a busca detalhada para fornecer recomendações fundamentadas nos dados da ANVISA que estão no banco vetorial
-        """
-        task_medicamentos = Task(
-            description=f"""
-            Analise os sintomas: "{sintomas}"
-            
-            INSTRUÇÕES DETALHADAS:
-            1. Use search_medicamentos_anvisa para encontrar medicamentos adequados (top 5)
-            2. Para cada medicamento encontrado, avalie:
-               - Similaridade com os sintomas (scores > 0.7 são excelentes)
-               - Categoria terapêutica e adequação
-               - Popularidade no mercado brasileiro
-               - Use get_detalhes_medicamento para medicamentos mais promissores
-            
-            3. Classifique o NÍVEL DE RISCO de cada medicamento:
-               - BAIXO: Medicamentos OTC, analgésicos simples, vitaminas
-               - MÉDIO: Antibióticos, anti-inflamatórios, medicamentos respiratórios
-               - ALTO: Cardiovasculares, neurológicos, endócrinos
-            
-            4. Determine se REQUER RECEITA MÉDICA:
-               - Antibióticos, cardiovasculares, neurológicos, endócrinos = RECEITA OBRIGATÓRIA
-               - Analgésicos, antigripais simples = SEM RECEITA
-            """,
-            expected_output="""
-            Lista de 3-5 medicamentos recomendados com:
-            - Nome do princípio ativo
-            - Categoria terapêutica  
-            - Score de confiança (% de similaridade)
-            - Nível de risco (BAIXO/MÉDIO/ALTO)
-            - Requer receita: SIM/NÃO
-            - Justificativa baseada nos sintomas
-            - Informações de disponibilidade
-            """,
-            agent=agente_medicamentos
-        )
+        # Análises idênticas (após normalização) para o mesmo modelo, prompts e índice saem do cache
+        inicio = time.perf_counter()
+        chave = chave_analise(sintomas, config["model_name"], f"{VERSAO_PROMPTS}-{modo}", vector_database.vector_db.versao_indice)
+        if usar_cache:
+            em_cache = cache_analises.obter(chave)
+            if em_cache is not None:
+                duracao_ms = (time.perf_counter() - inicio) * 1000
+                if ao_evento:
+                    ao_evento("cache", status="hit")
+                return {**em_cache, "sintomas": sintomas, "configuracao": config, "cache": "hit",
+                        "tempos": {"cache_ms": round(duracao_ms, 2)}}
         
-        """
-        A Tarefa de Análise de Segurança é executada pelo agente de segurança dependendo dos resultados da busca de medicamentos e tem como objetivo avaliar os riscos associados às recomendações, urgência, necessidade de receita e o especialista que ele deve procurar. O agente utiliza a tool busca web para encontrar informações atualizadas sobre contraindicações, efeitos colaterais e orientações de segurança, determinando também o nível de urgência para consulta médica e fornecendo disclaimers apropriados sobre automedicação.
-        """
-        task_seguranca = Task(
-            description=f"""
-            Com base na análise do Especialista em Medicamentos, conduza análise completa de segurança
-            e forneça orientações sobre consultas médicas online.
-            
-            ANÁLISE DE SEGURANÇA:
-            1. Revise os medicamentos recomendados e seus níveis de risco
-            2. Determine urgência para consulta médica baseado em:
-               - Medicamentos de alto risco recomendados
-               - Sintomas descritos: "{sintomas}"
-               - Necessidade de receita médica
-            
-            BUSCA DE LINKS PARA CONSULTAS MÉDICAS:
-            3. Use busca web para encontrar:
-               - Plataformas de telemedicina adequadas (Doctoralia, Consulta do Bem, etc.)
-               - Especialistas recomendados baseado na categoria dos medicamentos
-               - Links diretos para agendamento online
-            
-            4. Especialidades a considerar:
-               - Medicamentos cardiovasculares → Cardiologista
-               - Medicamentos neurológicos → Neurologista  
-               - Medicamentos gastrointestinais → Gastroenterologista
-               - Medicamentos gerais → Clínico Geral
-            
-            URGÊNCIA DA CONSULTA:
-            - URGENTE: Medicamentos de alto risco, sintomas preocupantes  
-            - RECOMENDADA: Medicamentos que requerem receita
-            - OPCIONAL: Medicamentos de baixo risco
-            """,
-            expected_output="""
-            Análise de segurança completa:
-            - Avaliação de risco para cada medicamento
-            - Nível de urgência (URGENTE/RECOMENDADA/OPCIONAL)
-            - Especialista recomendado
-            - Links para consulta médica online (2-3 opções)
-            - Orientações de segurança
-            - Disclaimers sobre automedicação
-            """,
-            agent=agente_seguranca,
-            context=[task_medicamentos]
-        )
+        # Prazo conta a partir da chegada, incluindo a espera por vaga
+        prazo = time.monotonic() + TIMEOUT_ANALISE_S
+        inicio_espera = time.perf_counter()
+        try:
+            with controle_admissao.admitir() as espera_ms:
+                registro = rastreio.atual()
+                if registro:
+                    registro.adicionar_span("etapa", "espera_admissao", inicio_espera, time.perf_counter())
+                if ao_evento and espera_ms >= 1:
+                    ao_evento("admitida", espera_ms=round(espera_ms, 1))
+                
+                entradas = entradas_crew(sintomas=sintomas)
+                tempo_prefetch = 0.0
+                encontrados = []
+                if modo in ("prefetch", "paralelo"):
+                    inicio_prefetch = time.perf_counter()
+                    with rastreio.span("etapa", "prefetch"):
+                        contexto_medicamentos, encontrados = preparar_contexto_medicamentos(sintomas)
+                        entradas.update(entradas_crew(contexto_medicamentos=contexto_medicamentos))
+                    tempo_prefetch = time.perf_counter() - inicio_prefetch
+                    if ao_evento:
+                        ao_evento("prefetch", medicamentos=len(encontrados), ms=round(tempo_prefetch * 1000, 1))
+                
+                # Tokens do relatório final; o primeiro marca o tempo até o primeiro byte útil
+                primeiro_token = {}
+                def ao_token(texto):
+                    if not primeiro_token:
+                        primeiro_token["s"] = time.perf_counter() - inicio
+                        if registro:
+                            registro.marcar("primeiro_token")
+                    ao_evento("token", texto=texto)
+                if ao_evento is None:
+                    ao_token = None
+                
+                def ao_repetir(tentativa, espera_s):
+                    controle_admissao.registrar("novas_tentativas")
+                    rastreio.contar("llm", "novas_tentativas")
+                    logger.warning(f"Rate limit do LLM, nova tentativa {tentativa} em {espera_s:.1f}s")
+                    if ao_evento:
+                        # A crew roda de novo do início: o cliente descarta o relatório parcial já recebido
+                        if primeiro_token:
+                            ao_evento("relatorio_reiniciado")
+                        ao_evento("nova_tentativa", tentativa=tentativa, espera_s=round(espera_s, 1))
+                
+                with pools_crews[modo].obter() as crew:
+                    preparacao = time.perf_counter() - inicio
+                    
+                    def rodar():
+                        instalar_callbacks(crew, ao_evento, prazo)
+                        with medir_tokens(crew.agents), transmitir_relatorio(crew.agents[-1].llm, ao_token):
+                            if modo == "paralelo":
+                                return executar_pipeline_paralelo(crew, entradas, encontrados, ao_evento)
+                            return crew.kickoff(inputs=entradas)
+                    
+                    resultado = executar_com_novas_tentativas(rodar, prazo, ao_repetir=ao_repetir)
+        except AnaliseExpirada:
+            controle_admissao.registrar("expiradas")
+            raise
+        execucao = time.perf_counter() - inicio - preparacao
+        logger.info(f"Análise concluída ({modo}): preparação {preparacao * 1000:.1f}ms, execução {execucao:.1f}s")
+        
+        # Guardar só o conteúdo da análise (configuração e tempos são da execução atual)
+        cache_analises.guardar(chave, {"status": "sucesso", "analise": str(resultado)})
         
-        """
-        O Crew têm execução sequencial, onde primeiro o especialista em medicamentos busca e analisa opções terapêuticas,
-        e em seguida o analista de segurança avalia os riscos e fornece orientações de segurança.
-        """
-        crew = Crew(
-            agents=[agente_medicamentos, agente_seguranca],
-            tasks=[task_medicamentos, task_seguranca],
-            verbose=False,
-            process=Process.sequential
-        )
-        resultado = crew.kickoff()
         # Capturar e retornar em caso de sucesso
         return {
             "status": "sucesso",
             "sintomas": sintomas,
             "analise": str(resultado),
-            "configuracao": config
+            "configuracao": config,
+            "cache": "miss" if usar_cache else "bypass",
+            "modo": modo,
+            "tempos": {
+                "espera_admissao_ms": round(espera_ms, 2),
+                "preparacao_ms": round(preparacao * 1000, 2), # inclui espera por vaga e prefetch
+                "prefetch_ms": round(tempo_prefetch * 1000, 2),
+                "execucao_s": round(execucao, 2),
+                "primeiro_token_s": round(primeiro_token["s"], 3) if primeiro_token else None
+            }
         }
     except Exception as e:
         # Capturar e retornar erros de forma estruturada
@@ -229,4 +764,4 @@ def executar_analise_sintomas(sintomas):
             "status": "erro",
             "erro": str(e),
             "tipo_erro": type(e).__name__
-        }
\ No newline at end of file
+        }
@@ -1,22 +1,52 @@
 # api.py - API, localmente executado antes da interface
 
-from fastapi import FastAPI, HTTPException # Para gerenciar o FastAPI
+from fastapi import FastAPI, HTTPException, Query, Header # Para gerenciar o FastAPI
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse # SSE das análises, 304 e /metrics
+from fastapi.concurrency import run_in_threadpool # Rodar análises bloqueantes fora do event loop
 from pydantic import BaseModel, Field # Para validação
+from typing import List, Literal, Optional # Tipos opcionais nos modelos
 from contextlib import asynccontextmanager # Para execução
 import json # Manipular json
+import asyncio # Espera por eventos das análises assíncronas
 import os # Acessar variáveis de ambiente
 from pathlib import Path # Validar paths
 import logging # Para logs detalhados
 import traceback # Para debug de erros
+from respostas import RespostaJSON, CompressaoGzip, validar_campos, projetar, calcular_etag, etag_confere # Respostas enxutas
+import metricas # Métricas Prometheus (GET /metrics)
+from perfilamento import perfilador, MiddlewarePerfil # Perfis sob demanda das requisições
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 try:
-    from vector_database import initialize_database # Acessar banco vetorial faiss
+    from vector_database import initialize_database, caminho_corpus, TOP_ESTATISTICAS # Acessar banco vetorial faiss
+    from vector_database import CAMPOS_BUSCA, CAMPOS_DETALHES, VERSAO_BUSCA_DETALHES # Campos aceitos na projeção e versão das ETags de detalhes
     import vector_database # Importar módulo completo para acessar variável global
-    from agentes import executar_analise_sintomas # Acessar função dos agentes 
+    from categorias import NOMES_CATEGORIAS # Categorias terapêuticas multi-rótulo
+    from autocompletar import MAX_SUGESTOES # Limite de sugestões do autocomplete
+    from agentes import executar_analise_sintomas, pool_crews, cache_analises, controle_admissao # Função dos agentes, pool de crews, cache e admissão
+    from fila_analises import FilaAnalises, FilaCheia # Jobs assíncronos de análise
+    from cache_busca_web import cache_busca_web, FIXTURES_SERPER_PATH # Cache das buscas web do agente de segurança
+    import rastreio # Métricas agregadas das análises
+    fila_jobs = FilaAnalises(executar_analise_sintomas)
+    
+    # Caches, fila e admissão lidos na hora da coleta do /metrics
+    def _caches():
+        return {"analises": cache_analises.estatisticas(), "busca_web": cache_busca_web.estatisticas()}
+    def _campo_caches(campo):
+        return lambda: {(nome,): e[campo] for nome, e in _caches().items()}
+    metricas.registro.registrar(metricas.ContadorLido(
+        "medai_cache_acertos_total", "Consultas atendidas pelo cache", _campo_caches("acertos"), ("cache",)))
+    for campo, ajuda in [("entradas", "Entradas guardadas no cache"), ("taxa_acerto", "Fração das consultas atendidas pelo cache")]:
+        metricas.registro.registrar(metricas.Medidor(f"medai_cache_{campo}", ajuda, _campo_caches(campo), ("cache",)))
+    metricas.registro.registrar(metricas.Medidor(
+        "medai_analises_executando", "Análises com IA em execução", lambda: controle_admissao.estatisticas()["executando"]))
+    metricas.registro.registrar(metricas.Medidor(
+        "medai_analises_aguardando", "Análises com IA aguardando vaga", lambda: controle_admissao.estatisticas()["aguardando"]))
+    metricas.registro.registrar(metricas.Medidor(
+        "medai_jobs_aguardando", "Jobs de análise na fila", lambda: fila_jobs.estatisticas()["aguardando"]))
     logger.info("Módulos importados com sucesso")
 except Exception as e:
     logger.error(f"Erro ao importar módulos: {e}")
@@ -25,13 +55,24 @@ except Exception as e:
 # Modelos Pydantic para validação de entrada
 class SintomasInput(BaseModel):
     descricao: str = Field(..., min_length=10, max_length=500, description="Descrição dos sintomas")
+    ignorar_cache: bool = Field(default=False, description="Força nova análise mesmo se houver resultado em cache")
+    modo: Optional[Literal["ferramentas", "prefetch", "paralelo"]] = Field(default=None, description="Modo de execução dos agentes (padrão: MEDAI_MODO_ANALISE)")
+    incluir_rastreio: bool = Field(default=False, description="Inclui o rastreio da análise (tempos, tokens, ferramentas) na resposta")
 
 class MedicamentoInput(BaseModel):
     nome_medicamento: str = Field(..., min_length=3, max_length=100, description="Nome do medicamento")
+    campos: Optional[List[str]] = Field(default=None, description="Devolver só esses campos (padrão: todos)")
+
+class ConfiguracaoPerfilInput(BaseModel):
+    fracao: Optional[float] = Field(default=None, ge=0, le=1, description="Fração das requisições das rotas perfilada (0 desliga)")
+    modo: Optional[Literal["cprofile", "amostragem"]] = Field(default=None, description="Modo do cabeçalho X-MedAI-Perfil sem modo válido; a fração usa sempre amostragem")
+    rotas: Optional[List[str]] = Field(default=None, description="Rotas elegíveis à amostragem por fração")
 
 class BuscaSimplesInput(BaseModel):
     sintomas: str = Field(..., min_length=5, max_length=300, description="Sintomas para busca simples")
     top_k: int = Field(default=5, ge=1, le=10, description="Número de resultados")
+    categorias: Optional[List[str]] = Field(default=None, description="Filtrar por categorias terapêuticas (ver GET /categorias)")
+    campos: Optional[List[str]] = Field(default=None, description="Devolver só esses campos de cada medicamento (padrão: todos)")
 
 sistema_inicializado = False
 erro_inicializacao = None
@@ -58,7 +99,7 @@ def converter_tipos_python(obj):
         logger.error(f"Erro ao converter tipos: {e}")
         return obj
 
-def buscar_medicamentos_direto(sintomas: str, top_k: int = 5):
+def buscar_medicamentos_direto(sintomas: str, top_k: int = 5, categorias: Optional[List[str]] = None):
     """Busca medicamentos diretamente no banco vetorial"""
     try:
         if not vector_database.vector_db:
@@ -68,7 +109,7 @@ def buscar_medicamentos_direto(sintomas: str, top_k: int = 5):
             return {"erro": "Descrição de sintomas muito curta"}
         
         logger.info(f"Buscando medicamentos para: {sintomas[:50]}...")
-        resultados = vector_database.vector_db.search_medicamentos(sintomas, top_k)
+        resultados = vector_database.vector_db.search_medicamentos(sintomas, top_k, categorias)
         
         if not resultados:
             return {"message": "Nenhum medicamento encontrado"}
@@ -110,14 +151,27 @@ def verificar_configuracao_api():
             "serper_api_key": bool(os.getenv('SERPER_API_KEY')),
             "model_name": os.getenv('MODEL_NAME', 'gemini/gemini-2.0-flash'),
             "banco_vetorial": bool(vector_database.vector_db),
-            "arquivo_csv": Path("anvisa_medicamentos.csv").exists()
+            "arquivo_csv": Path(caminho_corpus()).exists(),
+            "corpus": os.getenv('MEDAI_CORPUS', 'principio')
         }
-        logger.info(f"Configuração verificada: {config}")
+        logger.debug(f"Configuração verificada: {config}")
         return config
     except Exception as e:
         logger.error(f"Erro ao verificar configuração: {e}")
         return {"erro": str(e)}
 
+def diagnosticar_configuracao():
+    """Configuração e problemas comuns, que estavam acontecendo durante os testes"""
+    config = verificar_configuracao_api()
+    problemas = []
+    if not config.get("arquivo_csv"):
+        problemas.append("Arquivo CSV não encontrado. Execute: python limpeza.py")
+    if not config.get("gemini_api_key"):
+        problemas.append("GEMINI_API_KEY não configurada no .env")
+    if not config.get("banco_vetorial"):
+        problemas.append("Banco vetorial não inicializado")
+    return config, problemas
+
 # O verificar_sistem verifica se o arquivo de dados processados existe e inicializa o banco vetorial FAISS se ainda não foi feito.
 def verificar_sistema():
     global sistema_inicializado, erro_inicializacao
@@ -130,8 +184,10 @@ def verificar_sistema():
         logger.info("Iniciando verificação do sistema...")
         
         # Verificar arquivo CSV
-        if not Path("anvisa_medicamentos.csv").exists():
-            erro_msg = "Arquivo anvisa_medicamentos.csv não encontrado. Execute: python limpeza.py"
+        csv_path = caminho_corpus()
+        if not Path(csv_path).exists():
+            comando = "python limpeza.py --por-produto" if csv_path.endswith("anvisa_produtos.csv") else "python limpeza.py"
+            erro_msg = f"Arquivo {csv_path} não encontrado. Execute: {comando}"
             logger.error(f"ERRO: {erro_msg}")
             erro_inicializacao = erro_msg
             raise HTTPException(status_code=500, detail=erro_msg)
@@ -140,7 +196,7 @@ def verificar_sistema():
         
         # Inicializar banco vetorial
         logger.info("Inicializando banco vetorial...")
-        initialize_database("anvisa_medicamentos.csv")
+        initialize_database(csv_path)
         logger.info("Função initialize_database executada")
         
         # Verificar se banco foi realmente inicializado
@@ -196,6 +252,13 @@ async def lifespan(app):
         logger.error(f"Traceback: {traceback.format_exc()}")
         # Não vamos impedir o startup, mas vamos logar o erro
     
+    # Pré-montar crews para tirar a montagem dos agentes do caminho crítico das análises
+    try:
+        pool_crews.aquecer()
+        logger.info(f"Pool de crews aquecido com {pool_crews.tamanho} crews")
+    except Exception as e:
+        logger.warning(f"Não foi possível aquecer o pool de crews: {e}")
+    
     logger.info("API pronta para receber requisições")
     yield  # A aplicação roda aqui
     
@@ -206,9 +269,17 @@ app = FastAPI(
     title="MedAI API",
     description="Sistema de Recomendação de Medicamentos ANVISA",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=RespostaJSON
 )
 
+# Perfil sob demanda (cabeçalho X-MedAI-Perfil ou fração das requisições); sem MEDAI_PERFIL_TOKEN só repassa
+app.add_middleware(MiddlewarePerfil)
+# gzip nas respostas grandes (busca, estatísticas); streams SSE ficam de fora
+app.add_middleware(CompressaoGzip)
+# Contagem e latência por rota (adicionado por último = mais externo, mede também a compressão)
+app.add_middleware(metricas.MiddlewareMetricas)
+
 # O endpoint root serve como ponto de verificação para confirmar que a API está funcionando corretamente.
 @app.get("/")
 async def root():
@@ -220,8 +291,18 @@ async def root():
         "endpoints": [
             "GET /docs - Documentação Swagger",
             "POST /analisar_sintomas - Análise completa com IA",
+            "POST /analises - Cria job de análise com IA (retorna job_id)",
+            "GET /analises/{job_id} - Status e resultado do job",
+            "GET /analises/{job_id}/eventos - Progresso do job em tempo real (SSE)",
             "POST /detalhes_medicamento - Detalhes de medicamento específico",
+            "GET /medicamentos/{nome} - Detalhes com ETag (If-None-Match -> 304)",
             "POST /busca_simples - Busca rápida por sintomas",
+            "GET /categorias - Categorias terapêuticas para filtro",
+            "GET /autocomplete - Sugestões de nomes de medicamentos por prefixo",
+            "GET /estatisticas - Estatísticas agregadas do corpus completo",
+            "GET /metricas/analises - Tokens, custo e tempos agregados das análises",
+            "GET /metrics - Métricas no formato Prometheus",
+            "GET /admin/perfis - Perfis de requisições (cProfile/amostragem), baixados em pstats ou speedscope",
             "GET /status - Status do sistema",
             "GET /configuracao - Verificar configurações"
         ]
@@ -238,17 +319,26 @@ async def busca_simples_endpoint(dados: BuscaSimplesInput):
                 # Tentar inicializar novamente
                 verificar_sistema()
         
-        medicamentos = buscar_medicamentos_direto(dados.sintomas, dados.top_k)
+        try:
+            validar_campos(dados.campos, CAMPOS_BUSCA)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        medicamentos = buscar_medicamentos_direto(dados.sintomas, dados.top_k, dados.categorias)
         
         if "erro" in medicamentos:
             raise HTTPException(status_code=400, detail=medicamentos["erro"])
+        if isinstance(medicamentos, list):
+            medicamentos = [projetar(med, dados.campos) for med in medicamentos]
         
-        return {
-            "status": "sucesso",
-            "sintomas": dados.sintomas,
-            "total_encontrados": len(medicamentos) if isinstance(medicamentos, list) else 0,
-            "medicamentos": medicamentos
-        }
+        # Resposta já serializável: devolvida direto, sem passar pelo jsonable_encoder
+        with metricas.etapas_busca.cronometrar(etapa="serializacao"):
+            return RespostaJSON({
+                "status": "sucesso",
+                "sintomas": dados.sintomas,
+                "total_encontrados": len(medicamentos) if isinstance(medicamentos, list) else 0,
+                "medicamentos": medicamentos
+            })
         
     except HTTPException:
         raise
@@ -275,9 +365,16 @@ async def analisar_sintomas_endpoint(sintomas: SintomasInput):
             )
         
         logger.info(f"Iniciando análise IA para: {sintomas.descricao[:50]}...")
-        resultado = executar_analise_sintomas(sintomas.descricao)
+        resultado = await run_in_threadpool(
+            executar_analise_sintomas, sintomas.descricao, usar_cache=not sintomas.ignorar_cache, modo=sintomas.modo,
+            incluir_rastreio=sintomas.incluir_rastreio
+        )
 
         if resultado["status"] == "erro":
+            if resultado.get("tipo_erro") == "AnaliseRejeitada":
+                raise HTTPException(status_code=429, detail=resultado["erro"], headers={"Retry-After": "10"})
+            if resultado.get("tipo_erro") == "AnaliseExpirada":
+                raise HTTPException(status_code=504, detail=resultado["erro"])
             if "API" in resultado.get("erro", ""):
                 raise HTTPException(
                     status_code=500, 
@@ -298,6 +395,87 @@ async def analisar_sintomas_endpoint(sintomas: SintomasInput):
             detail=f"Erro interno na análise de IA: {str(e)}"
         )
 
+# O analises cria um job de análise com IA e retorna o job_id na hora; o progresso é acompanhado pelos endpoints abaixo
+@app.post("/analises", status_code=202)
+async def criar_analise_endpoint(sintomas: SintomasInput):
+    try:
+        if not sistema_inicializado:
+            if erro_inicializacao:
+                raise HTTPException(status_code=500, detail=f"Sistema não inicializado: {erro_inicializacao}")
+            else:
+                verificar_sistema()
+        
+        config = verificar_configuracao_api()
+        if not config.get("gemini_api_key"):
+            raise HTTPException(
+                status_code=400, 
+                detail="GEMINI_API_KEY não configurada. Configure no arquivo .env"
+            )
+        
+        job = fila_jobs.submeter(sintomas.descricao, usar_cache=not sintomas.ignorar_cache, modo=sintomas.modo,
+                                 incluir_rastreio=sintomas.incluir_rastreio)
+        logger.info(f"Job {job.id} enfileirado para: {sintomas.descricao[:50]}...")
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/analises/{job.id}",
+            "eventos_url": f"/analises/{job.id}/eventos"
+        }
+    
+    except FilaCheia as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro no endpoint analises: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+# Polling do status e do resultado de um job de análise
+@app.get("/analises/{job_id}")
+async def status_analise_endpoint(job_id: str):
+    job = fila_jobs.obter(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job de análise não encontrado")
+    return job.resumo()
+
+# Stream (server-sent events) do progresso real da crew: tarefas iniciadas/concluídas e chamadas de ferramentas
+@app.get("/analises/{job_id}/eventos")
+async def eventos_analise_endpoint(job_id: str):
+    job = fila_jobs.obter(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job de análise não encontrado")
+    
+    async def gerar_eventos():
+        loop = asyncio.get_running_loop()
+        aviso = asyncio.Event()
+        job.inscrever(loop, aviso)
+        try:
+            ultimo_id = -1 # Pelo id: tokens podem sair do histórico (fim ou relatório reiniciado)
+            while True:
+                aviso.clear()
+                novos = job.eventos_desde(ultimo_id)
+                for evento in novos:
+                    yield f"event: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+                if novos:
+                    ultimo_id = novos[-1]["id"]
+                
+                if novos and novos[-1]["tipo"] == "fim":
+                    yield f"event: resultado\ndata: {json.dumps(job.resultado, ensure_ascii=False)}\n\n"
+                    break
+                
+                try:
+                    await asyncio.wait_for(aviso.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n" # Comentário SSE para manter proxies com a conexão aberta
+        finally:
+            job.desinscrever(loop, aviso)
+    
+    return StreamingResponse(
+        gerar_eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # O detalhes_medicamento busca informações detalhadas e completas sobre um medicamento específico pelo seu nome.
 @app.post("/detalhes_medicamento")
 async def detalhes_medicamento_endpoint(medicamento: MedicamentoInput):
@@ -308,6 +486,11 @@ async def detalhes_medicamento_endpoint(medicamento: MedicamentoInput):
             else:
                 verificar_sistema()
 
+        try:
+            validar_campos(medicamento.campos, CAMPOS_DETALHES)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         data = obter_detalhes_direto(medicamento.nome_medicamento)
         
         if "erro" in data:
@@ -315,7 +498,7 @@ async def detalhes_medicamento_endpoint(medicamento: MedicamentoInput):
         if "message" in data:
             return {"message": data["message"]}
         
-        return data
+        return RespostaJSON(projetar(data, medicamento.campos))
     
     except HTTPException:
         raise
@@ -323,6 +506,114 @@ async def detalhes_medicamento_endpoint(medicamento: MedicamentoInput):
         logger.error(f"Erro no endpoint detalhes_medicamento: {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
     
+# Versão GET dos detalhes, com ETag: a resposta só muda quando o índice muda, então o cliente revalida
+# com If-None-Match e recebe 304 sem corpo (e sem nova consulta ao DataFrame)
+@app.get("/medicamentos/{nome_medicamento}")
+async def medicamento_endpoint(nome_medicamento: str, campos: Optional[str] = Query(default=None, description="Campos separados por vírgula"),
+                               if_none_match: Optional[str] = Header(default=None)):
+    if not sistema_inicializado:
+        if erro_inicializacao:
+            raise HTTPException(status_code=500, detail=f"Sistema não inicializado: {erro_inicializacao}")
+        verificar_sistema()
+    
+    if len(nome_medicamento.strip()) < 3:
+        raise HTTPException(status_code=422, detail="Nome do medicamento deve ter pelo menos 3 caracteres")
+    lista_campos = [campo.strip() for campo in campos.split(",") if campo.strip()] if campos else None
+    try:
+        validar_campos(lista_campos, CAMPOS_DETALHES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    etag = calcular_etag(vector_database.vector_db.versao_indice, VERSAO_BUSCA_DETALHES, nome_medicamento.strip().lower(), lista_campos)
+    cabecalhos = {"ETag": etag, "Cache-Control": "no-cache"} # no-cache = pode guardar, mas revalida
+    if etag_confere(if_none_match, etag):
+        return Response(status_code=304, headers=cabecalhos)
+    
+    data = obter_detalhes_direto(nome_medicamento)
+    if "erro" in data:
+        raise HTTPException(status_code=500, detail=data["erro"])
+    if "message" in data:
+        raise HTTPException(status_code=404, detail=data["message"])
+    return RespostaJSON(projetar(data, lista_campos), headers=cabecalhos)
+
+# O categorias lista as categorias terapêuticas aceitas no filtro da busca simples
+@app.get("/categorias")
+async def categorias():
+    return {"categorias": NOMES_CATEGORIAS}
+
+# O autocomplete sugere princípios ativos e nomes comerciais pelo início do nome (índice de prefixos em memória)
+@app.get("/autocomplete")
+async def autocomplete(q: str = Query(..., min_length=1, max_length=100), limite: int = Query(default=8, ge=1, le=MAX_SUGESTOES)):
+    if not sistema_inicializado:
+        if erro_inicializacao:
+            raise HTTPException(status_code=500, detail=f"Sistema não inicializado: {erro_inicializacao}")
+        verificar_sistema()
+    
+    # Consulta abaixo de 1 ms: roda direto no event loop, sem threadpool
+    return {"q": q, "sugestoes": vector_database.vector_db.indice_prefixos.sugerir(q, limite)}
+
+# O estatisticas devolve os agregados do corpus inteiro, pré-calculados na carga do banco vetorial
+@app.get("/estatisticas")
+async def estatisticas(top: int = Query(default=10, ge=1, le=TOP_ESTATISTICAS)):
+    if not sistema_inicializado:
+        if erro_inicializacao:
+            raise HTTPException(status_code=500, detail=f"Sistema não inicializado: {erro_inicializacao}")
+        verificar_sistema()
+    
+    dados = vector_database.vector_db.estatisticas
+    if not dados:
+        raise HTTPException(status_code=503, detail="Estatísticas ainda não calculadas")
+    return {**dados, "top_principios": dados["top_principios"][:top], "top_empresas": dados["top_empresas"][:top]}
+
+# O metrics expõe contadores e histogramas no formato do Prometheus (rotas, etapas da busca, análises, caches, memória)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(metricas.registro.exportar(), media_type=metricas.TIPO_CONTEUDO)
+
+# O metricas/analises agrega os rastreios das análises com IA (tokens, custo, tempo por tarefa e ferramenta)
+@app.get("/metricas/analises")
+async def metricas_analises(recentes: bool = False):
+    return rastreio.agregador.estatisticas(incluir_recentes=recentes)
+
+def exigir_token_perfil(token):
+    """Endpoints de perfil só existem com MEDAI_PERFIL_TOKEN definido e exigem o mesmo token no cabeçalho"""
+    if not perfilador.habilitado:
+        raise HTTPException(status_code=404, detail="Perfilamento desabilitado (defina MEDAI_PERFIL_TOKEN)")
+    if not perfilador.token_valido(token):
+        raise HTTPException(status_code=403, detail="Token de perfil inválido")
+
+# O admin/perfis lista os perfis guardados (os mais recentes primeiro) e a configuração da amostragem
+@app.get("/admin/perfis")
+async def listar_perfis(x_medai_perfil_token: Optional[str] = Header(default=None)):
+    exigir_token_perfil(x_medai_perfil_token)
+    return {"configuracao": perfilador.configuracao(), "perfis": perfilador.listar()}
+
+# Toggle do admin: liga/desliga a amostragem de uma fração das requisições, sem reiniciar a API
+@app.put("/admin/perfis/configuracao")
+async def configurar_perfis(dados: ConfiguracaoPerfilInput, x_medai_perfil_token: Optional[str] = Header(default=None)):
+    exigir_token_perfil(x_medai_perfil_token)
+    configuracao = perfilador.configurar(fracao=dados.fracao, modo=dados.modo, rotas=dados.rotas)
+    logger.info(f"Configuração de perfis alterada: {configuracao}")
+    return configuracao
+
+# Download de um perfil: pstats (pstats.Stats, snakeviz) ou speedscope (speedscope.app, só amostragem)
+@app.get("/admin/perfis/{perfil_id}")
+async def baixar_perfil(perfil_id: str, formato: Literal["pstats", "speedscope"] = "pstats",
+                        x_medai_perfil_token: Optional[str] = Header(default=None)):
+    exigir_token_perfil(x_medai_perfil_token)
+    perfil = perfilador.obter(perfil_id)
+    if perfil is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado (o buffer guarda só os mais recentes)")
+    
+    nome_arquivo = f"perfil_{perfil.id}.{'pstats' if formato == 'pstats' else 'speedscope.json'}"
+    cabecalhos = {"Content-Disposition": f'attachment; filename="{nome_arquivo}"'}
+    if formato == "pstats":
+        return Response(perfil.pstats(), media_type="application/octet-stream", headers=cabecalhos)
+    try:
+        return RespostaJSON(perfil.speedscope(), headers=cabecalhos)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # O status fornece informações em tempo real sobre o estado operacional do sistema
 @app.get("/status")
 async def status():
@@ -340,12 +631,23 @@ async def status():
         else:
             banco_status = "erro - vector_db é None"
         
+        # Configuração junto do status: a interface faz uma chamada só por atualização
+        config, problemas = diagnosticar_configuracao()
+        
         return {
             "sistema": "ativo",
             "medicamentos_carregados": medicamentos_count,
             "banco_vetorial": banco_status,
+            "versao_indice": getattr(vector_database.vector_db, 'versao_indice', None),
             "sistema_inicializado": sistema_inicializado,
-            "erro_inicializacao": erro_inicializacao
+            "erro_inicializacao": erro_inicializacao,
+            "configuracao": config,
+            "problemas": problemas,
+            "ia_disponivel": bool(config.get("gemini_api_key") and config.get("banco_vetorial")),
+            "fila_analises": fila_jobs.estatisticas(),
+            "admissao_analises": controle_admissao.estatisticas(),
+            "cache_analises": cache_analises.estatisticas(),
+            "cache_busca_web": {**cache_busca_web.estatisticas(), "modo_fixture": bool(FIXTURES_SERPER_PATH)}
         }
     except Exception as e:
         logger.error(f"Erro no endpoint status: {e}")
@@ -360,16 +662,7 @@ async def status():
 async def configuracao():
     """Endpoint para verificar se todas as configurações necessárias estão disponíveis"""
     try:
-        config = verificar_configuracao_api()
-        
-        # Verificar problemas comuns, que estavam acontecendo durante os testes
-        problemas = []
-        if not config.get("arquivo_csv"):
-            problemas.append("Arquivo CSV não encontrado. Execute: python limpeza.py")
-        if not config.get("gemini_api_key"):
-            problemas.append("GEMINI_API_KEY não configurada no .env")
-        if not config.get("banco_vetorial"):
-            problemas.append("Banco vetorial não inicializado")
+        config, problemas = diagnosticar_configuracao()
         
         return {
             "configuracao": config,
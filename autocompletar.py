@@ -0,0 +1,108 @@
+"""
+Índice de prefixos para autocompletar nomes de medicamentos (princípio ativo e nomes comerciais).
+Chaves normalizadas em um array ordenado com busca binária (bisect); cada nome entra também a partir
+de cada palavra, então "zolp" encontra "Hemitartarato De Zolpidem". Prefixos curtos, que casam com
+muitas chaves, têm o ranking pré-calculado na construção.
+"""
+import re # Separar palavras na normalização
+import heapq # Top-k por total de produtos no intervalo de chaves
+import unicodedata # Remover acentos
+from bisect import bisect_left # Intervalo de chaves com o prefixo
+
+# Prefixos até esse tamanho têm as sugestões pré-calculadas
+TAMANHO_PREFIXO_PRE_CALCULADO = 3
+MAX_SUGESTOES = 20
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e só letras/números separados por um espaço"""
+    texto = unicodedata.normalize('NFD', str(texto))
+    texto = ''.join(c for c in texto if unicodedata.category(c) != 'Mn').lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', texto))
+
+class IndicePrefixos:
+    """Sugestões ranqueadas por total de produtos registrados (no empate: início do nome e princípio ativo primeiro)"""
+
+    def __init__(self, nomes):
+        """nomes: iterável de (nome exibido, tipo, princípio ativo, total de produtos)"""
+        self.sugestoes = [] # (nome, tipo, principio, total) sem repetição
+        vistos = set()
+        entradas = [] # (chave, ordem de ranking, id da sugestão)
+        for nome, tipo, principio, total in nomes:
+            nome = str(nome).strip()
+            normalizado = normalizar(nome)
+            if not normalizado or (normalizado, principio) in vistos:
+                continue
+            vistos.add((normalizado, principio))
+            id_sugestao = len(self.sugestoes)
+            self.sugestoes.append((nome, tipo, principio, int(total)))
+
+            palavras = normalizado.split(' ')
+            for i in range(len(palavras)):
+                entradas.append((' '.join(palavras[i:]), (-int(total), i > 0, tipo != 'principio_ativo', normalizado),
+                                 id_sugestao))
+
+        entradas.sort(key=lambda e: e[0])
+        self.chaves = [e[0] for e in entradas]
+        self.ranking = [e[1] for e in entradas]
+        self.ids = [e[2] for e in entradas]
+
+        # Prefixos curtos: ranking pronto, sem percorrer milhares de chaves por consulta
+        self.pre_calculado = {}
+        grupos = {}
+        for chave, ranking, id_sugestao in entradas:
+            for n in range(1, TAMANHO_PREFIXO_PRE_CALCULADO + 1):
+                if len(chave) >= n:
+                    grupos.setdefault(chave[:n], []).append((ranking, id_sugestao))
+        for prefixo, candidatos in grupos.items():
+            self.pre_calculado[prefixo] = self._melhores(candidatos, MAX_SUGESTOES)
+
+    @staticmethod
+    def _melhores(candidatos, limite):
+        """Ids das melhores sugestões, sem repetir a mesma sugestão casada por palavras diferentes"""
+        ids, vistos = [], set()
+        for _, id_sugestao in sorted(candidatos):
+            if id_sugestao not in vistos:
+                vistos.add(id_sugestao)
+                ids.append(id_sugestao)
+                if len(ids) == limite:
+                    break
+        return ids
+
+    def sugerir(self, prefixo, limite=8):
+        """Até `limite` sugestões cujo nome (ou alguma palavra dele em diante) começa com o prefixo"""
+        limite = min(limite, MAX_SUGESTOES)
+        prefixo = normalizar(prefixo)
+        if not prefixo:
+            return []
+
+        if len(prefixo) <= TAMANHO_PREFIXO_PRE_CALCULADO:
+            ids = self.pre_calculado.get(prefixo, [])[:limite]
+        else:
+            inicio = bisect_left(self.chaves, prefixo)
+            fim = bisect_left(self.chaves, prefixo + '\x7f', inicio) # '\x7f' vem depois de qualquer caractere normalizado
+            # Uma sugestão aparece no máximo uma vez por palavra: pegar um pouco a mais cobre as repetições
+            candidatos = heapq.nsmallest(limite * 3, ((self.ranking[i], self.ids[i]) for i in range(inicio, fim)))
+            ids = self._melhores(candidatos, limite)
+
+        return [{"nome": nome, "tipo": tipo, "principio_ativo": principio, "total_produtos": total}
+                for nome, tipo, principio, total in (self.sugestoes[i] for i in ids)]
+
+def construir_indice_prefixos(df, por_produto=False):
+    """Índice a partir do corpus: princípios ativos e nomes comerciais (nome_produto ou produtos_principais)"""
+    totais = df['total_produtos_registrados'].fillna(0).astype(int)
+    principios = df['principio_ativo_limpo'].fillna('')
+
+    if por_produto and 'nome_produto' in df.columns:
+        marcas = df['nome_produto']
+    else:
+        marcas = df['produtos_principais'].fillna('').str.split('; ')
+
+    def gerar():
+        for principio, total in zip(principios, totais):
+            yield principio, 'principio_ativo', principio, total
+        for nomes, principio, total in zip(marcas, principios, totais):
+            for nome in ([nomes] if isinstance(nomes, str) else nomes if isinstance(nomes, list) else []):
+                if nome:
+                    yield nome, 'produto', principio, total
+
+    return IndicePrefixos(gerar())
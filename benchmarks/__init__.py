@@ -0,0 +1,3 @@
+"""
+Benchmarks do MedAI. Executar a partir da raiz do projeto, ex: python -m benchmarks.corpus
+"""
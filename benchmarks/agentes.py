@@ -0,0 +1,94 @@
+"""
+Benchmark dos modos de execução dos agentes (ferramentas x prefetch x paralelo) com LLM falso e busca web offline
+
+Mede, por análise: chamadas ao LLM, ações de ferramenta, tamanho dos prompts (tokens estimados)
+e tempo total. Exemplo:
+    python -m benchmarks.agentes --latencia-llm 0.3 --latencia-serper 0.5 --saida bench_agentes.json
+"""
+import os # Modo offline da busca web antes de importar os agentes
+import argparse # Argumentos de linha de comando
+import json # Saída dos resultados
+import time # Tempo de cada análise
+from benchmarks.comum import CSV_PADRAO, carregar_encoder, percentis_ms
+
+FIXTURES_PADRAO = os.path.join(os.path.dirname(__file__), 'fixtures_serper.json')
+
+CONSULTAS = [
+    "dor de cabeça forte e febre",
+    "infecção bacteriana na garganta",
+    "pressão alta e palpitações",
+    "azia e má digestão",
+    "tosse seca e falta de ar"
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark modos de execução dos agentes")
+    parser.add_argument('--csv', default=CSV_PADRAO)
+    parser.add_argument('--modos', nargs='+', default=['ferramentas', 'prefetch', 'paralelo'])
+    parser.add_argument('--modelo', default='hash', help="'hash' (offline) ou nome do SentenceTransformer")
+    parser.add_argument('--latencia-llm', type=float, default=0.0, help="Segundos por chamada ao LLM falso")
+    parser.add_argument('--latencia-serper', type=float, default=0.0, help="Segundos por busca web (fixture)")
+    parser.add_argument('--manter-cache-web', action='store_true', help="Não zera o cache de buscas web entre análises")
+    parser.add_argument('--tokens-resposta', type=int, default=200)
+    parser.add_argument('--repeticoes', type=int, default=2, help="Passadas sobre as consultas por modo")
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    # Tudo offline: busca web por fixture e chave falsa só para passar na verificação de configuração
+    os.environ.setdefault('MEDAI_SERPER_FIXTURES', FIXTURES_PADRAO)
+    os.environ.setdefault('GEMINI_API_KEY', 'stub')
+
+    import vector_database
+    import agentes
+    import cache_busca_web
+    from benchmarks.stubs import LLMStub
+
+    # Busca web com latência simulada; sem cache por padrão, para medir o custo real em cada modo
+    cache_busca_web.cache_busca_web.buscar_externo = cache_busca_web.criar_busca_fixture(
+        os.environ['MEDAI_SERPER_FIXTURES'], args.latencia_serper)
+    if not args.manter_cache_web:
+        cache_busca_web.cache_busca_web.ttl = 0
+
+    db = vector_database.AnvisaVectorDB(model=carregar_encoder(args.modelo))
+    db.load_data(args.csv)
+    vector_database.vector_db = db
+
+    stub = LLMStub(latencia=args.latencia_llm, tokens_resposta=args.tokens_resposta)
+    agentes.llm = stub
+    agentes.reiniciar_pools()
+
+    resultados = []
+    for modo in args.modos:
+        duracoes, chamadas, acoes, caracteres = [], [], [], []
+        for _ in range(args.repeticoes):
+            for consulta in CONSULTAS:
+                stub.zerar()
+                inicio = time.perf_counter()
+                resultado = agentes.executar_analise_sintomas(consulta, usar_cache=False, modo=modo)
+                duracoes.append(time.perf_counter() - inicio)
+                if resultado["status"] != "sucesso":
+                    raise RuntimeError(f"Análise falhou ({modo}): {resultado.get('erro')}")
+                chamadas.append(stub.metricas["chamadas"])
+                acoes.append(stub.metricas["acoes"])
+                caracteres.append(stub.metricas["caracteres_prompt"])
+
+        n = len(duracoes)
+        resultados.append({
+            "modo": modo,
+            "analises": n,
+            "chamadas_llm_por_analise": round(sum(chamadas) / n, 2),
+            "acoes_ferramenta_por_analise": round(sum(acoes) / n, 2),
+            "tokens_prompt_por_analise": round(sum(caracteres) / n / 4), # ~4 caracteres por token
+            "analise": percentis_ms(duracoes)
+        })
+
+    saida = json.dumps({"latencia_llm_s": args.latencia_llm, "latencia_serper_s": args.latencia_serper,
+                        "resultados": resultados}, indent=2)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(saida)
+    else:
+        print(saida)
+
+if __name__ == "__main__":
+    main()
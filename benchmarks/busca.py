@@ -0,0 +1,158 @@
+"""
+Suíte de latência e vazão da pilha de busca, offline e sem GPU
+
+Para o corpus do CSV e corpus sintéticos por produto de tamanhos crescentes mede: construção do índice,
+memória, busca unitária, busca em lote (search_medicamentos_lote), get_medicamento_detalhes e
+vazão ponta a ponta do POST /busca_simples com clientes concorrentes (httpx + ASGITransport, em processo).
+A saída é JSON, para comparar execuções. Exemplo:
+    python -m benchmarks.busca --tamanhos 10000 100000 1000000 --saida bench_busca.json
+"""
+import argparse # Argumentos de linha de comando
+import asyncio # Clientes concorrentes no teste ponta a ponta
+import gc # Liberar o índice anterior antes de medir memória
+import json # Saída dos resultados
+import logging # Silenciar logs por requisição durante a medição
+import time # Construção do índice e vazão
+import pandas as pd # Leitura do CSV
+import vector_database # Banco vetorial avaliado (e instância global usada pela API)
+from vector_database import AnvisaVectorDB
+from metricas import memoria_rss_bytes # RSS do processo
+from benchmarks.comum import CSV_PADRAO, carregar_encoder, corpus_produtos_sintetico, percentis_ms, cronometrar
+
+CONSULTAS = [
+    "dor de cabeça forte e febre",
+    "infecção bacteriana na garganta",
+    "pressão alta e palpitações",
+    "ansiedade e insônia",
+    "azia e má digestão",
+    "tosse seca e falta de ar",
+    "Nuwiq",
+    "coceira e manchas na pele"
+]
+
+def em_rodizio(itens):
+    """Função que devolve o próximo item a cada chamada"""
+    contador = {"i": 0}
+    def proximo():
+        item = itens[contador["i"] % len(itens)]
+        contador["i"] += 1
+        return item
+    return proximo
+
+def medir_ponta_a_ponta(db, concorrencias, requisicoes, top_k):
+    """Vazão e latência do POST /busca_simples com N clientes concorrentes, sem rede (ASGI em processo)"""
+    import httpx # Cliente ASGI em processo
+    import api # App FastAPI; sem a lifespan, o banco é injetado abaixo
+
+    vector_database.vector_db = db
+    api.sistema_inicializado = True
+
+    async def rodar(concorrencia):
+        transporte = httpx.ASGITransport(app=api.app)
+        latencias = []
+        proxima = em_rodizio(CONSULTAS)
+        restantes = {"n": requisicoes}
+
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+            async def cliente_loop():
+                while restantes["n"] > 0:
+                    restantes["n"] -= 1
+                    inicio = time.perf_counter()
+                    resposta = await cliente.post("/busca_simples", json={"sintomas": proxima(), "top_k": top_k})
+                    latencias.append(time.perf_counter() - inicio)
+                    if resposta.status_code != 200:
+                        raise RuntimeError(f"/busca_simples respondeu {resposta.status_code}: {resposta.text[:200]}")
+
+            await cliente.post("/busca_simples", json={"sintomas": CONSULTAS[0], "top_k": top_k}) # aquecimento
+            inicio = time.perf_counter()
+            await asyncio.gather(*(cliente_loop() for _ in range(concorrencia)))
+            duracao = time.perf_counter() - inicio
+
+        return {"concorrencia": concorrencia, "requisicoes": len(latencias),
+                "vazao_rps": round(len(latencias) / duracao, 1), "latencia": percentis_ms(latencias)}
+
+    return [asyncio.run(rodar(c)) for c in concorrencias]
+
+def verificar_detalhes_exatos(db, nomes):
+    """O nome exato de um princípio ativo (em qualquer caixa) tem que trazer os detalhes desse princípio"""
+    for nome in nomes:
+        for consulta in (nome, nome.lower(), nome.upper()):
+            detalhe = db.get_medicamento_detalhes(consulta)
+            if detalhe is None or detalhe["principio_ativo"] != nome:
+                encontrado = detalhe and detalhe["principio_ativo"]
+                raise RuntimeError(f"get_medicamento_detalhes({consulta!r}) devolveu {encontrado!r}, esperado {nome!r}")
+
+def medir(df, encoder, tipo_indice, args):
+    gc.collect()
+    memoria_antes = memoria_rss_bytes()
+    db = AnvisaVectorDB(model=encoder, tipo_indice=tipo_indice)
+    inicio = time.perf_counter()
+    db.load_dataframe(df)
+    tempo_construcao = time.perf_counter() - inicio
+    memoria_depois = memoria_rss_bytes()
+
+    consulta = em_rodizio(CONSULTAS)
+    lote = [CONSULTAS[i % len(CONSULTAS)] for i in range(args.lote)]
+    duracoes_lote = cronometrar(lambda: db.search_medicamentos_lote(lote, args.top_k), max(1, args.repeticoes // 10))
+    amostra_nomes = df['principio_ativo_limpo'].drop_duplicates().sample(
+        min(200, df['principio_ativo_limpo'].nunique()), random_state=42).tolist()
+    verificar_detalhes_exatos(db, amostra_nomes)
+    nomes = em_rodizio(amostra_nomes)
+
+    resultado = {
+        "linhas": len(df),
+        "por_produto": db.por_produto,
+        "indice": tipo_indice,
+        "construcao_s": round(tempo_construcao, 3),
+        "memoria_rss_mb": round((memoria_depois - memoria_antes) / 2**20, 1),
+        "embeddings_mb": round(db.embeddings.nbytes / 2**20, 1),
+        "busca_unitaria": percentis_ms(cronometrar(lambda: db.search_medicamentos(consulta(), args.top_k), args.repeticoes)),
+        "busca_lote": {
+            "tamanho_lote": args.lote,
+            "por_lote": percentis_ms(duracoes_lote),
+            "consultas_por_s": round(args.lote * len(duracoes_lote) / sum(duracoes_lote), 1)
+        },
+        "detalhes": percentis_ms(cronometrar(lambda: db.get_medicamento_detalhes(nomes()), args.repeticoes))
+    }
+    if args.concorrencias:
+        resultado["busca_simples_http"] = medir_ponta_a_ponta(db, args.concorrencias, args.requisicoes, args.top_k)
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description="Suíte de latência/vazão da busca")
+    parser.add_argument('--csv', default=CSV_PADRAO, help="CSV do corpus por princípio")
+    parser.add_argument('--tamanhos', type=int, nargs='*', default=[10000, 100000],
+                        help="Tamanhos do corpus sintético por produto (1000000 pede ~4 GB de RAM)")
+    parser.add_argument('--indices', nargs='+', default=['flat'])
+    parser.add_argument('--modelo', default='hash', help="'hash' (offline) ou nome do SentenceTransformer")
+    parser.add_argument('--repeticoes', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--lote', type=int, default=32, help="Consultas por chamada de search_medicamentos_lote")
+    parser.add_argument('--concorrencias', type=int, nargs='*', default=[1, 8, 32],
+                        help="Clientes simultâneos no /busca_simples (vazio desliga o teste ponta a ponta)")
+    parser.add_argument('--requisicoes', type=int, default=400, help="Requisições por nível de concorrência")
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    # Logs por requisição distorcem a latência medida
+    for nome in ('api', 'httpx', 'vector_database'):
+        logging.getLogger(nome).setLevel(logging.WARNING)
+
+    encoder = carregar_encoder(args.modelo)
+    df_principios = pd.read_csv(args.csv)
+
+    resultados = []
+    for tipo_indice in args.indices:
+        resultados.append(medir(df_principios, encoder, tipo_indice, args))
+        for tamanho in args.tamanhos:
+            resultados.append(medir(corpus_produtos_sintetico(df_principios, tamanho), encoder, tipo_indice, args))
+
+    saida = json.dumps({"modelo": args.modelo, "top_k": args.top_k, "resultados": resultados}, indent=2)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(saida)
+    else:
+        print(saida)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Teste de carga do POST /analisar_sintomas com LLM falso e busca web offline (sem rede)
+
+agentes.llm vira o LLMStub e a busca web usa as fixtures do Serper, ambos com latência configurável;
+o resto do pipeline (admissão, pool de crews, prefetch, CrewAI, rastreio, API) é o real. Para cada
+nível de concorrência mede vazão, rejeições (429), espera na admissão, lag do event loop da API,
+crescimento de memória e o tempo de cada etapa do rastreio. A API roda em processo (httpx + ASGITransport),
+então o lag medido é o do mesmo event loop que atende as requisições. Exemplo:
+    python -m benchmarks.carga_ia --concorrencias 1 4 8 16 --analises 40 --latencia-llm 0.2 --saida bench_carga_ia.json
+Com latências zeradas, o tempo medido é a sobrecarga do próprio pipeline.
+"""
+import os # Modo offline da busca web antes de importar os agentes
+import argparse # Argumentos de linha de comando
+import asyncio # Clientes concorrentes e monitor do event loop
+import gc # Coletar lixo antes de medir memória
+import json # Saída dos resultados
+import logging # Silenciar logs por análise durante a medição
+import time # Vazão e lag do event loop
+from benchmarks.comum import CSV_PADRAO, carregar_encoder, percentis_ms
+
+FIXTURES_PADRAO = os.path.join(os.path.dirname(__file__), 'fixtures_serper.json')
+
+CONSULTAS = [
+    "dor de cabeça forte e febre há dois dias",
+    "infecção bacteriana na garganta com pus",
+    "pressão alta e palpitações ao subir escadas",
+    "azia e má digestão depois das refeições",
+    "tosse seca e falta de ar à noite",
+    "ansiedade e insônia há algumas semanas"
+]
+
+async def monitorar(parar, intervalo_s, amostras_lag, amostras_fila, admissao, fila_jobs):
+    """Atraso de um sleep curto (lag do event loop) e ocupação da admissão, até parar ser sinalizado"""
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo_s)
+        amostras_lag.append(max(0.0, time.perf_counter() - inicio - intervalo_s))
+        estado = admissao.estatisticas()
+        amostras_fila.append((estado["executando"], estado["aguardando"], fila_jobs.estatisticas()["aguardando"]))
+
+def tempos_por_etapa(respostas):
+    """Amostras (segundos) de cada etapa do rastreio: etapas, tarefas por agente e ferramentas"""
+    etapas = {}
+    for resposta in respostas:
+        rastreio = resposta.get("rastreio") or {}
+        for etapa in rastreio.get("etapas", []):
+            etapas.setdefault(f"etapa:{etapa['nome']}", []).append(etapa["duracao_ms"] / 1000)
+        for tarefa in rastreio.get("tarefas", []):
+            agente = tarefa.get("agente", tarefa["nome"])
+            etapas.setdefault(f"tarefa:{agente}", []).append(tarefa["duracao_ms"] / 1000)
+            etapas.setdefault(f"llm_aprox:{agente}", []).append(tarefa["llm_ms_aprox"] / 1000)
+        for nome, uso in rastreio.get("ferramentas", {}).items():
+            etapas.setdefault(f"ferramenta:{nome}", []).append(uso["total_ms"] / 1000)
+    return {nome: percentis_ms(amostras) for nome, amostras in sorted(etapas.items())}
+
+def rodar_nivel(api, agentes, stub, memoria_rss_bytes, concorrencia, modo, args):
+    """Dispara args.analises análises com `concorrencia` clientes simultâneos e resume o nível"""
+    import httpx # Cliente ASGI em processo
+
+    async def rodar():
+        transporte = httpx.ASGITransport(app=api.app)
+        latencias, respostas, status = [], [], {}
+        amostras_lag, amostras_fila = [], []
+        restantes = {"n": args.analises, "i": 0}
+        parar = asyncio.Event()
+
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=None) as cliente:
+            async def cliente_loop():
+                while restantes["n"] > 0:
+                    restantes["n"] -= 1
+                    consulta = CONSULTAS[restantes["i"] % len(CONSULTAS)]
+                    restantes["i"] += 1
+                    inicio = time.perf_counter()
+                    resposta = await cliente.post("/analisar_sintomas", json={
+                        "descricao": consulta, "ignorar_cache": True, "modo": modo, "incluir_rastreio": True})
+                    status[resposta.status_code] = status.get(resposta.status_code, 0) + 1
+                    if resposta.status_code == 200:
+                        latencias.append(time.perf_counter() - inicio)
+                        respostas.append(resposta.json())
+                    elif resposta.status_code != 429:
+                        raise RuntimeError(f"/analisar_sintomas respondeu {resposta.status_code}: {resposta.text[:200]}")
+
+            monitor = asyncio.create_task(monitorar(parar, args.intervalo_lag, amostras_lag, amostras_fila,
+                                                    agentes.controle_admissao, api.fila_jobs))
+            inicio = time.perf_counter()
+            await asyncio.gather(*(cliente_loop() for _ in range(concorrencia)))
+            duracao = time.perf_counter() - inicio
+            parar.set()
+            await monitor
+
+        return duracao, latencias, respostas, status, amostras_lag, amostras_fila
+
+    gc.collect()
+    memoria_antes = memoria_rss_bytes()
+    admissao_antes = agentes.controle_admissao.estatisticas()
+    stub.zerar()
+    duracao, latencias, respostas, status, amostras_lag, amostras_fila = asyncio.run(rodar())
+    gc.collect()
+    memoria_depois = memoria_rss_bytes()
+    admissao = agentes.controle_admissao.estatisticas()
+
+    concluidas = len(respostas)
+    chamadas_llm = stub.metricas["chamadas"] / concluidas if concluidas else 0.0
+    analise = percentis_ms(latencias) if latencias else None
+    return {
+        "concorrencia": concorrencia,
+        "modo": modo,
+        "analises": args.analises,
+        "concluidas": concluidas,
+        "status_http": {str(codigo): n for codigo, n in sorted(status.items())},
+        "vazao_analises_por_s": round(concluidas / duracao, 2),
+        "analise": analise,
+        "espera_admissao": percentis_ms([r["tempos"]["espera_admissao_ms"] / 1000 for r in respostas]) if respostas else None,
+        "fila": {
+            "executando_max": max((e for e, _, _ in amostras_fila), default=0),
+            "aguardando_max": max((a for _, a, _ in amostras_fila), default=0),
+            "jobs_aguardando_max": max((j for _, _, j in amostras_fila), default=0),
+            "rejeitadas": (admissao["rejeitadas_fila_cheia"] + admissao["rejeitadas_espera"]
+                           - admissao_antes["rejeitadas_fila_cheia"] - admissao_antes["rejeitadas_espera"])
+        },
+        "lag_event_loop": {**percentis_ms(amostras_lag), "max_ms": round(max(amostras_lag, default=0.0) * 1000, 3)},
+        "memoria": {
+            "rss_mb": round(memoria_depois / 2**20, 1),
+            "crescimento_mb": round((memoria_depois - memoria_antes) / 2**20, 2),
+            "crescimento_kb_por_analise": round((memoria_depois - memoria_antes) / 1024 / max(1, concluidas), 1)
+        },
+        "chamadas_llm_por_analise": round(chamadas_llm, 2),
+        # Tempo que não é espera simulada do LLM: pipeline, ferramentas, busca web (fixture) e fila
+        "sobrecarga_media_ms": round(analise["media_ms"] - chamadas_llm * args.latencia_llm * 1000, 2) if analise else None,
+        "etapas": tempos_por_etapa(respostas)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do /analisar_sintomas com LLM e busca web falsos")
+    parser.add_argument('--csv', default=CSV_PADRAO)
+    parser.add_argument('--modelo', default='hash', help="'hash' (offline) ou nome do SentenceTransformer")
+    parser.add_argument('--modos', nargs='+', default=['prefetch'], help="ferramentas, prefetch e/ou paralelo")
+    parser.add_argument('--concorrencias', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--analises', type=int, default=24, help="Análises por nível de concorrência")
+    parser.add_argument('--latencia-llm', type=float, default=0.2, help="Segundos por chamada ao LLM falso")
+    parser.add_argument('--latencia-serper', type=float, default=0.3, help="Segundos por busca web (fixture)")
+    parser.add_argument('--tokens-resposta', type=int, default=200, help="Palavras da resposta final do LLM falso")
+    parser.add_argument('--max-simultaneas', type=int, help="Sobrescreve o limite de análises simultâneas da admissão")
+    parser.add_argument('--fila-admissao', type=int, help="Sobrescreve o tamanho da fila de admissão")
+    parser.add_argument('--manter-cache-web', action='store_true', help="Não zera o cache de buscas web entre análises")
+    parser.add_argument('--intervalo-lag', type=float, default=0.01, help="Período (s) da sonda de lag do event loop")
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    # Tudo offline: busca web por fixture e chave falsa só para passar na verificação de configuração
+    os.environ.setdefault('MEDAI_SERPER_FIXTURES', FIXTURES_PADRAO)
+    os.environ.setdefault('GEMINI_API_KEY', 'stub')
+
+    import vector_database
+    import agentes
+    import cache_busca_web
+    import api # App FastAPI; sem a lifespan, o banco é injetado abaixo
+    from metricas import memoria_rss_bytes # RSS do processo
+    from benchmarks.stubs import LLMStub
+
+    for nome in ('api', 'agentes', 'httpx', 'vector_database', 'cache_busca_web'):
+        logging.getLogger(nome).setLevel(logging.WARNING)
+
+    cache_busca_web.cache_busca_web.buscar_externo = cache_busca_web.criar_busca_fixture(
+        os.environ['MEDAI_SERPER_FIXTURES'], args.latencia_serper)
+    if not args.manter_cache_web:
+        cache_busca_web.cache_busca_web.ttl = 0
+
+    db = vector_database.AnvisaVectorDB(model=carregar_encoder(args.modelo))
+    db.load_data(args.csv)
+    vector_database.vector_db = db
+    api.sistema_inicializado = True
+
+    stub = LLMStub(latencia=args.latencia_llm, tokens_resposta=args.tokens_resposta)
+    agentes.llm = stub
+    agentes.reiniciar_pools()
+    if args.max_simultaneas:
+        agentes.controle_admissao.max_concorrentes = args.max_simultaneas
+    if args.fila_admissao is not None:
+        agentes.controle_admissao.tamanho_fila = args.fila_admissao
+
+    resultados = []
+    for modo in args.modos:
+        agentes.pools_crews[modo].aquecer() # Montagem das crews fora da medição, como no startup da API
+        for concorrencia in args.concorrencias:
+            resultados.append(rodar_nivel(api, agentes, stub, memoria_rss_bytes, concorrencia, modo, args))
+
+    saida = json.dumps({
+        "latencia_llm_s": args.latencia_llm,
+        "latencia_serper_s": args.latencia_serper,
+        "tokens_resposta": args.tokens_resposta,
+        "max_simultaneas": agentes.controle_admissao.max_concorrentes,
+        "fila_admissao": agentes.controle_admissao.tamanho_fila,
+        "resultados": resultados
+    }, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(saida)
+    else:
+        print(saida)
+
+if __name__ == "__main__":
+    main()
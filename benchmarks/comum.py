@@ -0,0 +1,69 @@
+"""
+Utilitários compartilhados pelos benchmarks: encoder offline, corpus sintético e percentis
+"""
+import re # Tokenização simples do encoder offline
+import time # Medição de tempo
+import zlib # Hash estável para o encoder offline
+import numpy as np # Vetores e percentis
+import pandas as pd # Corpus sintético
+
+CSV_PADRAO = 'anvisa_medicamentos.csv'
+
+class EncoderHash:
+    """
+    Encoder determinístico e offline (hashing de palavras em 384 dimensões).
+    Não mede qualidade semântica, só permite medir FAISS/materialização sem baixar o modelo.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, textos, **kwargs):
+        vetores = np.zeros((len(textos), self.dim), dtype=np.float32)
+        for i, texto in enumerate(textos):
+            for palavra in re.findall(r'\w+', str(texto).lower()):
+                vetores[i, zlib.crc32(palavra.encode('utf-8')) % self.dim] += 1.0
+        normas = np.linalg.norm(vetores, axis=1, keepdims=True)
+        return vetores / np.maximum(normas, 1e-12)
+
+def carregar_encoder(modelo):
+    """'hash' usa o encoder offline; qualquer outro valor carrega o SentenceTransformer com esse nome"""
+    if modelo == 'hash':
+        return EncoderHash()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(modelo)
+
+def corpus_produtos_sintetico(df_principios, n_linhas, seed=42):
+    """Expande o corpus por princípio em n_linhas de produtos sintéticos (formato do limpeza.py --por-produto)"""
+    rng = np.random.default_rng(seed)
+    base = df_principios.iloc[rng.integers(0, len(df_principios), n_linhas)].reset_index(drop=True)
+    sufixo = pd.Series(np.arange(n_linhas)).astype(str)
+    produto = base['produtos_principais'].fillna('').str.split(';').str[0].str.strip()
+
+    base['numero_registro'] = (100000000 + np.arange(n_linhas)).astype(str)
+    base['nome_produto'] = produto + ' ' + sufixo
+    base['empresa_produto'] = base['empresas_principais'].fillna('').str.split(';').str[0].str.strip()
+    base['texto_completo_busca'] = 'Produto: ' + base['nome_produto'] + ' | ' + base['texto_completo_busca'].fillna('')
+    return base
+
+def percentis_ms(amostras_s):
+    """Resumo de latências (recebe segundos, devolve milissegundos)"""
+    amostras = np.asarray(amostras_s) * 1000
+    return {
+        "n": int(len(amostras)),
+        "p50_ms": round(float(np.percentile(amostras, 50)), 3),
+        "p90_ms": round(float(np.percentile(amostras, 90)), 3),
+        "p99_ms": round(float(np.percentile(amostras, 99)), 3),
+        "media_ms": round(float(amostras.mean()), 3)
+    }
+
+def cronometrar(funcao, repeticoes, aquecimento=5):
+    """Executa funcao() repetidas vezes e devolve a lista de durações em segundos"""
+    for _ in range(aquecimento):
+        funcao()
+    duracoes = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        duracoes.append(time.perf_counter() - inicio)
+    return duracoes
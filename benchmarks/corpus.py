@@ -0,0 +1,76 @@
+"""
+Benchmark de tamanho do corpus x latência de busca (p50/p99)
+
+Compara o corpus agregado por princípio com corpus por produto de tamanhos crescentes,
+com índice flat e HNSW. Exemplo:
+    python -m benchmarks.corpus --tamanhos 10000 50000 --saida bench_corpus.json
+"""
+import argparse # Argumentos de linha de comando
+import json # Saída dos resultados
+import time # Tempo de construção do índice
+import pandas as pd # Leitura do CSV
+from vector_database import AnvisaVectorDB # Banco vetorial avaliado
+from benchmarks.comum import CSV_PADRAO, carregar_encoder, corpus_produtos_sintetico, percentis_ms, cronometrar
+
+CONSULTAS = [
+    "dor de cabeça forte e febre",
+    "infecção bacteriana na garganta",
+    "pressão alta e palpitações",
+    "ansiedade e insônia",
+    "azia e má digestão",
+    "tosse seca e falta de ar",
+    "Nuwiq",
+    "coceira e manchas na pele"
+]
+
+def medir(df, encoder, tipo_indice, repeticoes, top_k):
+    """Constrói o índice e mede latência de search_medicamentos (com agrupamento por princípio se houver)"""
+    db = AnvisaVectorDB(model=encoder, tipo_indice=tipo_indice)
+    inicio = time.perf_counter()
+    db.load_dataframe(df)
+    tempo_construcao = time.perf_counter() - inicio
+
+    contador = {"i": 0}
+    def consulta():
+        db.search_medicamentos(CONSULTAS[contador["i"] % len(CONSULTAS)], top_k)
+        contador["i"] += 1
+
+    return {
+        "linhas": len(df),
+        "por_produto": db.por_produto,
+        "indice": tipo_indice,
+        "construcao_s": round(tempo_construcao, 3),
+        "busca": percentis_ms(cronometrar(consulta, repeticoes))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tamanho do corpus x latência de busca")
+    parser.add_argument('--csv', default=CSV_PADRAO, help="CSV do corpus por princípio")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[10000, 50000, 100000],
+                        help="Tamanhos do corpus sintético por produto")
+    parser.add_argument('--indices', nargs='+', default=['flat', 'hnsw'])
+    parser.add_argument('--modelo', default='hash', help="'hash' (offline) ou nome do SentenceTransformer")
+    parser.add_argument('--repeticoes', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    encoder = carregar_encoder(args.modelo)
+    df_principios = pd.read_csv(args.csv)
+
+    resultados = []
+    for tipo_indice in args.indices:
+        resultados.append(medir(df_principios, encoder, tipo_indice, args.repeticoes, args.top_k))
+        for tamanho in args.tamanhos:
+            df_produtos = corpus_produtos_sintetico(df_principios, tamanho)
+            resultados.append(medir(df_produtos, encoder, tipo_indice, args.repeticoes, args.top_k))
+
+    saida = json.dumps({"modelo": args.modelo, "top_k": args.top_k, "resultados": resultados}, indent=2)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(saida)
+    else:
+        print(saida)
+
+if __name__ == "__main__":
+    main()
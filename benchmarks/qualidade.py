@@ -0,0 +1,142 @@
+"""
+Avaliação offline da qualidade da busca (recall@k, MRR, nDCG@k) junto com a latência
+
+Roda as consultas rotuladas de benchmarks/consultas_avaliacao.json contra search_medicamentos para cada
+combinação de encoder e índice, para comparar velocidade e qualidade no mesmo relatório. Relevância
+graduada de cada resultado: 2 se o princípio ativo casa um termo esperado, 1 se só alguma das categorias
+(multi-rótulo) é esperada, 0 caso contrário. Exemplo:
+    python -m benchmarks.qualidade --modelos hash all-MiniLM-L6-v2 --indices flat hnsw --saida bench_qualidade.json
+O encoder 'hash' é só lexical: serve de linha de base, não de medida da qualidade semântica.
+"""
+import argparse # Argumentos de linha de comando
+import json # Consultas rotuladas e saída dos resultados
+import logging # Silenciar logs por consulta durante a medição
+import math # log2 do nDCG
+import os # Caminho padrão das consultas
+import time # Latência de cada consulta
+import pandas as pd # Leitura do CSV
+from vector_database import AnvisaVectorDB # Banco vetorial avaliado
+from autocompletar import normalizar # Mesma normalização de nomes do autocompletar
+from benchmarks.comum import CSV_PADRAO, carregar_encoder, corpus_produtos_sintetico, percentis_ms
+
+CONSULTAS_PADRAO = os.path.join(os.path.dirname(__file__), 'consultas_avaliacao.json')
+
+def carregar_consultas(caminho):
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)['consultas']
+
+def casa_principio(principio, termos):
+    """Termo esperado que casa o princípio ativo por palavras inteiras ('dipirona' casa 'Dipirona Monoidratada')"""
+    nome = f" {normalizar(principio)} "
+    for termo in termos:
+        if f" {normalizar(termo)} " in nome:
+            return termo
+    return None
+
+def relevancias(resultados, consulta):
+    """Relevância graduada e termo casado de cada resultado, na ordem do ranking"""
+    categorias_esperadas = set(consulta.get('categorias', []))
+    avaliados = []
+    for med in resultados:
+        termo = casa_principio(med['principio_ativo'], consulta['principios'])
+        if termo:
+            avaliados.append((2, termo))
+        elif categorias_esperadas & set(med.get('categorias') or [med.get('categoria_terapeutica')]):
+            avaliados.append((1, None))
+        else:
+            avaliados.append((0, None))
+    return avaliados
+
+def ndcg(ganhos, ideais, k):
+    dcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ganhos[:k]))
+    idcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ideais[:k]))
+    return dcg / idcg if idcg else 0.0
+
+def avaliar_consulta(avaliados, consulta, ks):
+    """
+    recall@k: fração dos termos esperados encontrados no top-k; MRR: inverso da posição do primeiro princípio
+    esperado; nDCG@k contra o ranking ideal (todos os princípios esperados primeiro, depois resultados só da
+    categoria), assumindo que o corpus tem resultados da categoria suficientes para completar o top-k.
+    """
+    ganhos = [g for g, _ in avaliados]
+    n_esperados = len(consulta['principios'])
+    ideais = [2] * n_esperados + ([1] if consulta.get('categorias') else [0]) * max(ks)
+    primeiro = next((i for i, g in enumerate(ganhos) if g == 2), None)
+
+    metricas = {"mrr": 1 / (primeiro + 1) if primeiro is not None else 0.0}
+    for k in ks:
+        encontrados = {termo for _, termo in avaliados[:k] if termo}
+        metricas[f"recall@{k}"] = len(encontrados) / n_esperados
+        metricas[f"ndcg@{k}"] = ndcg(ganhos, ideais, k)
+        metricas[f"acerto@{k}"] = 1.0 if encontrados else 0.0
+    return metricas
+
+def sobreposicao(rankings, referencia, k):
+    """Recall do índice aproximado: fração do top-k do índice exato (flat) que ele reproduz"""
+    return round(sum(len(set(r[:k]) & set(ref[:k])) / max(1, len(ref[:k]))
+                     for r, ref in zip(rankings, referencia)) / len(referencia), 4)
+
+def avaliar(db, consultas, ks):
+    """Métricas médias sobre as consultas, latência de cada busca e as consultas em que nada esperado apareceu"""
+    top_k = max(ks)
+    db.search_medicamentos(consultas[0]['consulta'], top_k) # aquecimento
+    por_consulta, latencias, falhas, rankings = [], [], [], []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        resultados = db.search_medicamentos(consulta['consulta'], top_k)
+        latencias.append(time.perf_counter() - inicio)
+        rankings.append([m['principio_ativo'] for m in resultados])
+
+        metricas = avaliar_consulta(relevancias(resultados, consulta), consulta, ks)
+        por_consulta.append(metricas)
+        if not metricas[f"acerto@{top_k}"]:
+            falhas.append({"consulta": consulta['consulta'],
+                           "retornados": [m['principio_ativo'] for m in resultados[:3]]})
+
+    medias = {nome: round(sum(m[nome] for m in por_consulta) / len(por_consulta), 4) for nome in por_consulta[0]}
+    return {"qualidade": medias, "latencia": percentis_ms(latencias), "sem_acerto": falhas}, rankings
+
+def main():
+    parser = argparse.ArgumentParser(description="Avaliação offline de qualidade (recall@k, MRR, nDCG) e latência da busca")
+    parser.add_argument('--csv', default=CSV_PADRAO, help="CSV do corpus por princípio")
+    parser.add_argument('--consultas', default=CONSULTAS_PADRAO, help="JSON com as consultas rotuladas")
+    parser.add_argument('--modelos', nargs='+', default=['hash'], help="'hash' (offline) e/ou nomes de SentenceTransformer")
+    parser.add_argument('--indices', nargs='+', default=['flat', 'hnsw'])
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 3, 5, 10])
+    parser.add_argument('--tamanhos', type=int, nargs='*', default=[],
+                        help="Também avalia corpus sintéticos por produto desses tamanhos (ANN em escala)")
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    logging.getLogger('vector_database').setLevel(logging.WARNING)
+
+    consultas = carregar_consultas(args.consultas)
+    ks = sorted(set(args.k))
+    df_principios = pd.read_csv(args.csv)
+    corpora = [df_principios] + [corpus_produtos_sintetico(df_principios, n) for n in args.tamanhos]
+
+    resultados = []
+    for modelo in args.modelos:
+        encoder = carregar_encoder(modelo)
+        referencia = {} # linhas do corpus -> rankings do índice flat (exato)
+        for tipo_indice in sorted(args.indices, key=lambda t: t != 'flat'):
+            for df in corpora:
+                db = AnvisaVectorDB(model=encoder, tipo_indice=tipo_indice)
+                db.load_dataframe(df)
+                avaliacao, rankings = avaliar(db, consultas, ks)
+                if tipo_indice == 'flat':
+                    referencia[len(df)] = rankings
+                elif len(df) in referencia:
+                    avaliacao["sobreposicao_flat"] = {f"@{k}": sobreposicao(rankings, referencia[len(df)], k) for k in ks}
+                resultados.append({"modelo": modelo, "indice": tipo_indice, "linhas": len(df),
+                                   "por_produto": db.por_produto, **avaliacao})
+
+    saida = json.dumps({"consultas": len(consultas), "k": ks, "resultados": resultados}, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(saida)
+    else:
+        print(saida)
+
+if __name__ == "__main__":
+    main()
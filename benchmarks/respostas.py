@@ -0,0 +1,95 @@
+"""
+Benchmark do tamanho e do tempo de serialização das respostas de busca e detalhes
+
+Compara resposta completa x projetada (campos da interface), sem compressão x gzip, e a serialização
+padrão do FastAPI (jsonable_encoder + json) x RespostaJSON (orjson quando instalado). Exemplo:
+    python -m benchmarks.respostas --top-k 10 --saida bench_respostas.json
+"""
+import argparse # Argumentos de linha de comando
+import gzip # Tamanho comprimido (mesmo nível do GZipMiddleware)
+import json # Serialização padrão e saída dos resultados
+from fastapi.encoders import jsonable_encoder # Caminho padrão do FastAPI para dicts
+from vector_database import AnvisaVectorDB # Banco vetorial avaliado
+from respostas import RespostaJSON, projetar, orjson # Resposta enxuta da API
+from benchmarks.comum import CSV_PADRAO, carregar_encoder, cronometrar, percentis_ms
+
+CONSULTAS = [
+    "dor de cabeça forte e febre",
+    "infecção bacteriana na garganta",
+    "pressão alta e palpitações",
+    "ansiedade e insônia",
+    "azia e má digestão",
+    "tosse seca e falta de ar"
+]
+NOMES = ["paracetamol", "ibuprofeno", "amoxicilina", "dipirona", "losartana", "omeprazol"]
+
+# Mesmos campos pedidos pelo interface.py
+CAMPOS_BUSCA = ["principio_ativo", "similaridade", "categoria_terapeutica", "categorias", "popularidade",
+                "total_produtos", "nivel_risco", "requer_receita", "empresas_exemplo", "produtos_exemplo"]
+CAMPOS_DETALHES = ["principio_ativo", "categoria_terapeutica", "popularidade_mercado", "total_produtos",
+                   "diversidade_formulacoes", "empresas_exemplo", "texto_completo"]
+
+def serializar_padrao(conteudo):
+    """O que o FastAPI faz com um dict devolvido pelo endpoint (JSONResponse)"""
+    return json.dumps(jsonable_encoder(conteudo), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+def serializar_rapido(conteudo):
+    return RespostaJSON(conteudo).body
+
+def medir(nome, payloads, repeticoes):
+    """Tamanho médio (bruto e gzip) e tempo de serialização dos payloads"""
+    brutos = [serializar_rapido(p) for p in payloads]
+    contador = {"i": 0}
+
+    def proximo():
+        conteudo = payloads[contador["i"] % len(payloads)]
+        contador["i"] += 1
+        return conteudo
+
+    return {
+        "payload": nome,
+        "bytes_medio": round(sum(len(b) for b in brutos) / len(brutos)),
+        "bytes_gzip_medio": round(sum(len(gzip.compress(b, compresslevel=9)) for b in brutos) / len(brutos)),
+        "serializacao_padrao": percentis_ms(cronometrar(lambda: serializar_padrao(proximo()), repeticoes)),
+        "serializacao_resposta_json": percentis_ms(cronometrar(lambda: serializar_rapido(proximo()), repeticoes))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tamanho e serialização das respostas da API")
+    parser.add_argument('--csv', default=CSV_PADRAO)
+    parser.add_argument('--modelo', default='hash', help="'hash' (offline) ou nome do SentenceTransformer")
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--repeticoes', type=int, default=2000)
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    db = AnvisaVectorDB(model=carregar_encoder(args.modelo))
+    db.load_data(args.csv)
+
+    # Mesmo formato do /busca_simples e do /detalhes_medicamento
+    buscas = [db.search_medicamentos(consulta, args.top_k) for consulta in CONSULTAS]
+    respostas_busca = [{"status": "sucesso", "sintomas": c, "total_encontrados": len(m), "medicamentos": m}
+                       for c, m in zip(CONSULTAS, buscas)]
+    respostas_busca_projetadas = [{**r, "medicamentos": [projetar(m, CAMPOS_BUSCA) for m in r["medicamentos"]]}
+                                  for r in respostas_busca]
+    detalhes = [d for d in (db.get_medicamento_detalhes(nome) for nome in NOMES) if d]
+
+    resultados = [
+        medir("busca_completa", respostas_busca, args.repeticoes),
+        medir("busca_campos_interface", respostas_busca_projetadas, args.repeticoes),
+        medir("detalhes_completo", detalhes, args.repeticoes),
+        medir("detalhes_campos_interface", [projetar(d, CAMPOS_DETALHES) for d in detalhes], args.repeticoes)
+    ]
+    # Revalidação com ETag igual: 304 sem corpo
+    resultados.append({"payload": "detalhes_304_etag", "bytes_medio": 0, "bytes_gzip_medio": 0})
+
+    saida = json.dumps({"top_k": args.top_k, "orjson": orjson is not None, "resultados": resultados}, indent=2)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(saida)
+    else:
+        print(saida)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+LLM falso para benchmarks dos agentes: responde no formato ReAct do CrewAI sem rede,
+com latência e tamanho de resposta configuráveis, e conta chamadas e tamanho dos prompts.
+"""
+import re # Extração de sintomas/princípios das mensagens
+import json # Action Input das ferramentas
+import time # Latência simulada
+import threading # Contadores compartilhados entre análises simultâneas
+from crewai import BaseLLM # Interface de LLM customizado do CrewAI
+
+PALAVRAS_RESPOSTA = ("paciente", "medicamento", "orientação", "risco", "consulta", "sintomas", "receita", "segurança")
+
+class LLMStub(BaseLLM):
+    """
+    Cada agente chama suas ferramentas em sequência (busca -> detalhes -> resposta final, ou
+    busca web -> resposta final) e depois responde com ~tokens_resposta palavras.
+    """
+
+    def __init__(self, latencia=0.0, tokens_resposta=200, detalhes_por_analise=2):
+        super().__init__(model="stub/medai")
+        self.latencia = latencia
+        self.tokens_resposta = tokens_resposta
+        self.detalhes_por_analise = detalhes_por_analise
+        self._lock = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        with self._lock:
+            self.metricas = {"chamadas": 0, "caracteres_prompt": 0, "acoes": 0}
+
+    def supports_function_calling(self):
+        return False
+
+    def supports_stop_words(self):
+        return True
+
+    def get_context_window_size(self):
+        return 128000
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        conteudos = [str(m.get("content", "")) for m in messages]
+        texto = '\n'.join(conteudos)
+        acoes_feitas = sum(1 for m in messages if m.get("role") == "assistant" and "Action:" in str(m.get("content", "")))
+
+        with self._lock:
+            self.metricas["chamadas"] += 1
+            self.metricas["caracteres_prompt"] += len(texto)
+        if self.latencia:
+            time.sleep(self.latencia)
+
+        acao = self._proxima_acao(texto, acoes_feitas)
+        if acao:
+            with self._lock:
+                self.metricas["acoes"] += 1
+            ferramenta, entrada = acao
+            return f"Thought: Preciso consultar {ferramenta}\nAction: {ferramenta}\nAction Input: {json.dumps(entrada, ensure_ascii=False)}"
+
+        corpo = ' '.join(PALAVRAS_RESPOSTA[i % len(PALAVRAS_RESPOSTA)] for i in range(self.tokens_resposta))
+        return f"Thought: I now know the final answer\nFinal Answer: {corpo}"
+
+    def _proxima_acao(self, texto, acoes_feitas):
+        """(ferramenta, argumentos) da próxima chamada de ferramenta deste agente, ou None para responder"""
+        if "Tool Name: search_medicamentos_anvisa" in texto:
+            if acoes_feitas == 0:
+                sintomas = re.search(r'Analise os sintomas: "([^"]*)"', texto)
+                return "search_medicamentos_anvisa", {"descricao_sintomas": sintomas.group(1) if sintomas else texto[:100], "top_k": 5}
+            principios = re.findall(r'"principio_ativo":\s*"([^"]+)"', texto)
+            if acoes_feitas <= self.detalhes_por_analise and len(principios) >= acoes_feitas:
+                return "get_detalhes_medicamento", {"nome_medicamento": principios[acoes_feitas - 1]}
+            return None
+        if "Tool Name: Search the internet with Serper" in texto and acoes_feitas == 0:
+            return "Search the internet with Serper", {"search_query": "plataformas de telemedicina no Brasil"}
+        return None
@@ -0,0 +1,94 @@
+"""
+Cache persistente (SQLite) de análises completas com IA.
+A chave combina sintomas normalizados, modelo LLM, versão dos prompts e versão do índice vetorial,
+então qualquer mudança em um deles invalida naturalmente as entradas antigas.
+"""
+import os # Configurações via .env
+import re # Normalização de pontuação
+import json # Serialização dos resultados
+import time # TTL e ordem de acesso
+import hashlib # Chave do cache
+import sqlite3 # Armazenamento local
+import threading # Uma conexão compartilhada entre threads
+from categorias import clean_text # Mesma normalização de texto do pré-processamento
+
+CACHE_ANALISES_PATH = os.getenv('MEDAI_CACHE_ANALISES', 'data/cache_analises.sqlite')
+TTL_CACHE_ANALISES = int(os.getenv('MEDAI_CACHE_ANALISES_TTL', str(7 * 24 * 3600))) # 7 dias
+MAX_ENTRADAS_CACHE_ANALISES = int(os.getenv('MEDAI_CACHE_ANALISES_MAX', '1000'))
+
+def normalizar_sintomas(sintomas):
+    """Minúsculas, sem acentos/pontuação extra e espaços únicos: 'Dor de Cabeça!!' == 'dor de cabeca'"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', clean_text(sintomas).lower()).split())
+
+def chave_analise(sintomas, modelo, versao_prompts, versao_indice):
+    """Chave determinística do cache para uma análise"""
+    partes = [normalizar_sintomas(sintomas), modelo, str(versao_prompts), str(versao_indice)]
+    return hashlib.sha256('\x1f'.join(partes).encode('utf-8')).hexdigest()
+
+class CacheAnalises:
+    """Cache com TTL e limite de entradas (remove as menos acessadas recentemente)"""
+
+    def __init__(self, caminho=CACHE_ANALISES_PATH, ttl=TTL_CACHE_ANALISES, max_entradas=MAX_ENTRADAS_CACHE_ANALISES):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("""
+            CREATE TABLE IF NOT EXISTS analises (
+                chave TEXT PRIMARY KEY,
+                resultado TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL
+            )
+        """)
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_acessado ON analises (acessado_em)")
+        self._conexao.commit()
+
+    def obter(self, chave):
+        """Resultado guardado ou None (entradas vencidas são removidas)"""
+        agora = time.time()
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT resultado, criado_em FROM analises WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None or agora - linha[1] > self.ttl:
+                if linha is not None:
+                    self._conexao.execute("DELETE FROM analises WHERE chave = ?", (chave,))
+                    self._conexao.commit()
+                self.falhas += 1
+                return None
+            self._conexao.execute("UPDATE analises SET acessado_em = ? WHERE chave = ?", (agora, chave))
+            self._conexao.commit()
+            self.acertos += 1
+        return json.loads(linha[0])
+
+    def guardar(self, chave, resultado):
+        """Guarda o resultado e remove as entradas mais antigas acima do limite"""
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO analises (chave, resultado, criado_em, acessado_em) VALUES (?, ?, ?, ?)",
+                (chave, json.dumps(resultado, ensure_ascii=False), agora, agora)
+            )
+            self._conexao.execute("""
+                DELETE FROM analises WHERE chave IN (
+                    SELECT chave FROM analises ORDER BY acessado_em DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entradas,))
+            self._conexao.commit()
+
+    def estatisticas(self):
+        with self._lock:
+            entradas = self._conexao.execute("SELECT COUNT(*) FROM analises").fetchone()[0]
+        total = self.acertos + self.falhas
+        return {
+            "entradas": entradas,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": round(self.acertos / total, 3) if total else 0.0
+        }
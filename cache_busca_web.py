@@ -0,0 +1,147 @@
+"""
+Busca web (Serper) com cache para o agente de segurança.
+Consultas repetidas ("cardiologista consulta online", "Doctoralia"...) saem do cache, consultas
+idênticas simultâneas fazem uma única chamada (single-flight) e o modo fixture roda sem rede.
+"""
+import os # Configurações via .env
+import json # Serialização dos resultados e fixtures
+import time # TTL e latência simulada
+import threading # Single-flight entre análises simultâneas
+from collections import OrderedDict # Cache LRU
+from typing import Type # Tipo do schema de argumentos
+from pydantic import BaseModel, Field # Schema de argumentos da ferramenta
+from crewai.tools import BaseTool # Classe base de ferramentas do CrewAI
+from cache_analises import normalizar_sintomas # Mesma normalização de texto das chaves de cache
+import rastreio # Contagem de buscas por análise
+
+TTL_CACHE_BUSCA_WEB = int(os.getenv('MEDAI_CACHE_BUSCA_WEB_TTL', str(24 * 3600))) # 24 horas
+MAX_ENTRADAS_CACHE_BUSCA_WEB = int(os.getenv('MEDAI_CACHE_BUSCA_WEB_MAX', '2000'))
+
+# Arquivo JSON {consulta: resultado}; quando definido, nenhuma chamada real ao Serper é feita
+FIXTURES_SERPER_PATH = os.getenv('MEDAI_SERPER_FIXTURES')
+
+class CacheBuscaWeb:
+    """Cache em memória com TTL, LRU, single-flight e métricas de acerto"""
+
+    def __init__(self, buscar, ttl=TTL_CACHE_BUSCA_WEB, max_entradas=MAX_ENTRADAS_CACHE_BUSCA_WEB):
+        self.buscar_externo = buscar # função(consulta) -> str
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict() # chave -> (instante, resultado)
+        self._em_andamento = {} # chave -> [threading.Event, resultado, erro]
+        self._lock = threading.Lock()
+        self.metricas = {"consultas": 0, "acertos": 0, "deduplicadas": 0, "chamadas_externas": 0, "erros": 0}
+
+    def buscar(self, consulta):
+        chave = normalizar_sintomas(consulta)
+        with self._lock:
+            self.metricas["consultas"] += 1
+            entrada = self._entradas.get(chave)
+            if entrada and time.time() - entrada[0] <= self.ttl:
+                self._entradas.move_to_end(chave)
+                self.metricas["acertos"] += 1
+                rastreio.contar("buscas_web", "cache")
+                return entrada[1]
+
+            # Mesma consulta já em andamento em outra análise: espera o resultado dela
+            voo = self._em_andamento.get(chave)
+            lider = voo is None
+            if lider:
+                voo = [threading.Event(), None, None]
+                self._em_andamento[chave] = voo
+            else:
+                self.metricas["deduplicadas"] += 1
+
+        if not lider:
+            rastreio.contar("buscas_web", "deduplicadas")
+            voo[0].wait()
+            if voo[2] is not None:
+                raise voo[2]
+            return voo[1]
+
+        try:
+            rastreio.contar("buscas_web", "externas")
+            resultado = self.buscar_externo(consulta)
+            with self._lock:
+                self.metricas["chamadas_externas"] += 1
+                self._entradas[chave] = (time.time(), resultado)
+                self._entradas.move_to_end(chave)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+            voo[1] = resultado
+            return resultado
+        except Exception as e:
+            with self._lock:
+                self.metricas["erros"] += 1
+            voo[2] = e
+            raise
+        finally:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+            voo[0].set()
+
+    def estatisticas(self):
+        with self._lock:
+            metricas = dict(self.metricas)
+            metricas["entradas"] = len(self._entradas)
+        consultas = metricas["consultas"]
+        metricas["taxa_acerto"] = round(metricas["acertos"] / consultas, 3) if consultas else 0.0
+        # Fração das consultas que não chegou ao Serper (cache + deduplicação)
+        metricas["taxa_economia"] = round((metricas["acertos"] + metricas["deduplicadas"]) / consultas, 3) if consultas else 0.0
+        return metricas
+
+def criar_busca_serper(api_key):
+    """Busca real via SerperDevTool"""
+    from crewai_tools import SerperDevTool
+    serper = SerperDevTool(api_key=api_key)
+
+    def buscar(consulta):
+        resultado = serper.run(search_query=consulta)
+        return resultado if isinstance(resultado, str) else json.dumps(resultado, ensure_ascii=False)
+    return buscar
+
+def criar_busca_fixture(caminho, latencia=0.0):
+    """Busca offline a partir de um JSON {consulta: resultado}; a chave "*" é usada para consultas sem fixture"""
+    with open(caminho, encoding='utf-8') as f:
+        fixtures = {normalizar_sintomas(k) if k != '*' else '*': v for k, v in json.load(f).items()}
+
+    def buscar(consulta):
+        if latencia:
+            time.sleep(latencia) # Simula latência da API para benchmarks
+        resultado = fixtures.get(normalizar_sintomas(consulta), fixtures.get('*', {"organic": []}))
+        return resultado if isinstance(resultado, str) else json.dumps(resultado, ensure_ascii=False)
+    return buscar
+
+def busca_web_disponivel():
+    return bool(FIXTURES_SERPER_PATH or os.getenv('SERPER_API_KEY'))
+
+_busca_serper = None
+
+def _buscar_serper_padrao(consulta):
+    """SerperDevTool criado uma vez e só quando a primeira busca real acontece"""
+    global _busca_serper
+    if _busca_serper is None:
+        _busca_serper = criar_busca_serper(os.getenv('SERPER_API_KEY'))
+    return _busca_serper(consulta)
+
+# Cache compartilhado por todas as crews do processo
+cache_busca_web = CacheBuscaWeb(
+    criar_busca_fixture(FIXTURES_SERPER_PATH) if FIXTURES_SERPER_PATH else _buscar_serper_padrao
+)
+
+class EntradaBuscaWeb(BaseModel):
+    """Argumentos da busca web (mesmo formato do SerperDevTool)"""
+    search_query: str = Field(..., description="Consulta para buscar na internet")
+
+class FerramentaBuscaWeb(BaseTool):
+    """Substitui o SerperDevTool nos agentes, passando pelo cache_busca_web"""
+    name: str = "Search the internet with Serper"
+    description: str = "Busca na internet (Google via Serper) e retorna os resultados mais relevantes para a consulta."
+    args_schema: Type[BaseModel] = EntradaBuscaWeb
+
+    def _run(self, search_query: str, **kwargs) -> str:
+        try:
+            with rastreio.span("ferramenta", self.name):
+                return cache_busca_web.buscar(search_query)
+        except Exception as e:
+            return json.dumps({"erro": f"Erro na busca web: {str(e)}"}, ensure_ascii=False)
@@ -0,0 +1,153 @@
+"""
+Categorias terapêuticas multi-rótulo (máscaras de bits) e regras de risco/receita por categoria.
+Usado pelo pré-processamento (limpeza.py) e em tempo de execução pela API e pelo banco vetorial,
+sem puxar as dependências do pipeline de ETL.
+"""
+import re # Regex para limpeza de texto e palavras-chave
+import json # Versões das tabelas
+import zlib # Versão das tabelas de categorias e de risco
+import unicodedata # Normalização de caracteres especiais/acentos
+import numpy as np # Máscaras de categorias (bitsets)
+import pandas as pd # Séries de classes e máscaras
+
+def clean_text(text):
+    """Limpa e normaliza texto, tirando acentos, caracteres especiais, espaços duplos e das bordas"""
+    if pd.isna(text) or text == '':
+        return ''
+    
+    # Remove acentos usando normalização Unicode
+    text = unicodedata.normalize('NFD', str(text))
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+    
+    # Remove caracteres especiais mantendo apenas letras, números, espaços e pontuação básica
+    text = re.sub(r'[^\w\s\-\.\,\(\)]', ' ', text)
+    text = re.sub(r'\s+', ' ', text).strip() # Remove espaços duplos e das bordas
+    
+    return text
+
+# Tabela de categorias terapêuticas: a posição na lista é o bit da categoria na máscara
+# (categorias_mask) e também a prioridade para a categoria principal. As palavras-chave
+# casam com o início de palavras da classe terapêutica normalizada (sem acentos, minúscula).
+CATEGORIAS_TERAPEUTICAS = [
+    ('antibiotico', ['antibiotico', 'antimicrobiano', 'bactericida', 'antibacteriano', 'antinfeccioso',
+                     'antiinfeccioso', 'anti-infeccioso', 'cefalosporina', 'penicilina', 'fenoxipenicilina',
+                     'macrolideo', 'quinolona', 'aminoglicosideo', 'tetraciclina', 'sulfa', 'rifampicina',
+                     'tuberculostatico', 'hansenostatico', 'nitrofuranico', 'cloranfenicol']),
+    ('analgesico', ['analgesico', 'dor', 'enxaqueca', 'antienxaqueca', 'gripe']),
+    ('anti_inflamatorio', ['anti-inflamatorio', 'antinflamatorio', 'antiinflamatorio', 'antireumati',
+                           'antirreumati', 'glicocorticoide', 'corticosteroide', 'antigotoso']),
+    ('cardiovascular', ['cardiovascular', 'cardiaco', 'hipertensao', 'pressao', 'anti-hipertensivo',
+                        'antihipertensivo', 'hipertensor', 'vasodilatador', 'antiarritmico', 'antianginoso',
+                        'betabloqueador', 'diuretico', 'antilipemico', 'anticoagulante', 'antitrombotico',
+                        'antiagregante', 'miocardio', 'nitrato', 'angiotensina']),
+    ('sistema_nervoso', ['neurologico', 'psiquiatrico', 'antidepressivo', 'ansiedade', 'ansiolitico',
+                         'anticonvulsivante', 'antiepileptico', 'neuroleptico', 'antipsicotico', 'hipnotico',
+                         'sedativo', 'antiparkinsoniano', 'sistema nervoso', 'psicoanaletico',
+                         'psicoanaleptico', 'neuropsicoestimulante', 'antivertiginoso']),
+    ('gastrointestinal', ['gastrico', 'digestivo', 'estomago', 'intestinal', 'gastrintestinal', 'antiacido',
+                          'antiulceroso', 'ulcera', 'laxante', 'antidiarreico', 'antiemetico', 'antinauseante',
+                          'antiespasmodico', 'gastresofagico', 'colagogo', 'hepatoprotetor', 'biliar', 'enema']),
+    ('respiratorio', ['respiratorio', 'pulmonar', 'bronco', 'asma', 'antiasmatico', 'expectorante',
+                      'mucolitico', 'antitussigeno', 'nasal', 'nasais', 'vias aereas', 'gripe']),
+    ('endocrino', ['hormon', 'diabetes', 'tiroide', 'tireoide', 'endocrino', 'antidiabetico', 'hipoglicemiante',
+                   'insulina', 'antitireoideano', 'estrogeno', 'progestageno', 'androgeno', 'anticoncepcional']),
+    ('dermatologico', ['dermatologico', 'pele', 'topico', 'anti-acne', 'antiacne', 'cicatrizante', 'escabicida',
+                       'ceratolitico', 'desmelanizante', 'melanizante', 'antialopecia']),
+    ('oftalmico', ['oftalm', 'ocular', 'olho', 'antiglaucomatoso', 'aparelho visual', 'midriatico', 'miotico']),
+    ('vitaminas', ['vitamina', 'vitaminico', 'polivitaminico', 'monovitamina', 'suplemento', 'mineral',
+                   'eletrolito', 'reidratante', 'antianemico']),
+    ('antiviral', ['antivirotico', 'antiviral', 'antiretroviral', 'antirretroviral']),
+    ('antifungico', ['antimicotico', 'antifungico', 'anti-fungico']),
+    ('antineoplasico', ['antineoplasico', 'citotoxico', 'citostatico', 'imunossupressor', 'imunosupressor',
+                        'imunomodulador', 'anticorpos monoclonais', 'quinase']),
+    ('imunologico', ['vacina', 'imunoglobulina', 'soro', 'imunoprotetor', 'alergeno', 'antialergico',
+                     'anti-histaminico', 'imunoestimulante'])
+]
+
+# Nomes de exibição na ordem dos bits (ex: 'anti_inflamatorio' -> 'Anti Inflamatorio')
+NOMES_CATEGORIAS = [nome.replace('_', ' ').title() for nome, _ in CATEGORIAS_TERAPEUTICAS]
+
+# Muda quando a tabela muda, para o modo incremental saber que precisa reprocessar tudo
+VERSAO_CATEGORIAS = format(zlib.crc32(json.dumps(CATEGORIAS_TERAPEUTICAS).encode('utf-8')), '08x')
+
+def categorizar_classes(classes):
+    """
+    Calcula a máscara multi-rótulo (bit i = CATEGORIAS_TERAPEUTICAS[i]) de uma Series de classes
+    terapêuticas. A tabela é aplicada uma vez por classe distinta e o resultado mapeado de volta.
+    """
+    unicas = pd.Series(classes.dropna().unique())
+    normalizadas = unicas.map(clean_text).str.lower()
+    
+    mascaras = np.zeros(len(unicas), dtype=np.uint16)
+    for bit, (_, keywords) in enumerate(CATEGORIAS_TERAPEUTICAS):
+        padrao = r'\b(?:' + '|'.join(re.escape(k) for k in keywords) + ')'
+        casou = normalizadas.str.contains(padrao, regex=True, na=False).to_numpy()
+        mascaras[casou] |= np.uint16(1 << bit)
+    
+    mapa = dict(zip(unicas, mascaras))
+    return classes.map(mapa).fillna(0).astype(np.uint16)
+
+def nomes_da_mascara(mascara):
+    """Lista de nomes de categorias presentes na máscara, em ordem de prioridade"""
+    return [nome for bit, nome in enumerate(NOMES_CATEGORIAS) if int(mascara) & (1 << bit)]
+
+def mascara_de_nomes(nomes):
+    """Máscara com os bits das categorias informadas (nomes de exibição, sem diferenciar maiúsculas)"""
+    indices = {nome.lower(): bit for bit, nome in enumerate(NOMES_CATEGORIAS)}
+    mascara = 0
+    for nome in nomes:
+        mascara |= 1 << indices[nome.strip().lower()] # KeyError para categoria desconhecida
+    return mascara
+
+def categoria_principal(mascara, classe_presente=True):
+    """Categoria de maior prioridade na máscara ('Outros' sem categoria, 'Não Classificado' sem classe)"""
+    if not classe_presente:
+        return 'Não Classificado'
+    nomes = nomes_da_mascara(mascara)
+    return nomes[0] if nomes else 'Outros'
+
+# Nível de risco e necessidade de receita por categoria (mesmos critérios que antes ficavam no prompt do agente)
+NIVEIS_RISCO = ['BAIXO', 'MÉDIO', 'ALTO']
+REGRAS_RISCO = {
+    'antibiotico': ('MÉDIO', True),
+    'analgesico': ('BAIXO', False),
+    'anti_inflamatorio': ('MÉDIO', False),
+    'cardiovascular': ('ALTO', True),
+    'sistema_nervoso': ('ALTO', True),
+    'gastrointestinal': ('BAIXO', False),
+    'respiratorio': ('MÉDIO', False),
+    'endocrino': ('ALTO', True),
+    'dermatologico': ('BAIXO', False),
+    'oftalmico': ('MÉDIO', True),
+    'vitaminas': ('BAIXO', False),
+    'antiviral': ('MÉDIO', True),
+    'antifungico': ('MÉDIO', False),
+    'antineoplasico': ('ALTO', True),
+    'imunologico': ('MÉDIO', True)
+}
+# Sem categoria reconhecida: conservador
+RISCO_PADRAO = ('MÉDIO', True)
+
+VERSAO_REGRAS_RISCO = format(zlib.crc32(json.dumps([REGRAS_RISCO, RISCO_PADRAO], sort_keys=True).encode('utf-8')), '08x')
+
+def risco_da_mascara(mascara):
+    """(nível de risco, requer receita) de uma máscara: vale a categoria mais arriscada e qualquer uma que exija receita"""
+    regras = [REGRAS_RISCO[nome] for bit, (nome, _) in enumerate(CATEGORIAS_TERAPEUTICAS) if int(mascara) & (1 << bit)]
+    if not regras:
+        return RISCO_PADRAO
+    nivel = max((nivel for nivel, _ in regras), key=NIVEIS_RISCO.index)
+    return nivel, any(receita for _, receita in regras)
+
+def classificar_risco(mascaras):
+    """Colunas (nivel_risco, requer_receita) de uma Series de máscaras, calculadas uma vez por máscara distinta"""
+    regras = {m: risco_da_mascara(m) for m in mascaras.unique()}
+    niveis = mascaras.map({m: nivel for m, (nivel, _) in regras.items()})
+    receitas = mascaras.map({m: receita for m, (_, receita) in regras.items()}).astype(bool)
+    return niveis, receitas
+
+def categorize_therapeutic_class(classe):
+    """Categoriza classe terapêutica em grupos principais para facilitar busca"""
+    if pd.isna(classe):
+        return 'Não Classificado'
+    mascara = categorizar_classes(pd.Series([classe]))[0]
+    return categoria_principal(mascara)
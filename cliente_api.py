@@ -0,0 +1,130 @@
+"""
+Cliente da API para a interface Streamlit: conexões reaproveitadas e respostas em cache entre reruns.
+Cada interação com um widget reexecuta o interface.py inteiro; com este módulo um rerun faz no máximo
+uma requisição (o /status combinado, quando o TTL expira) em vez de sondar hosts e abrir conexões novas.
+"""
+import os # URL da API e TTLs via .env
+import streamlit as st # Cache entre reruns
+import requests # Sessão HTTP com pool de conexões
+from requests.adapters import HTTPAdapter # Tamanho do pool
+
+# URLs testadas em ordem quando MEDAI_API_URL não está definida
+URLS_API = [
+    "http://medai-api:8000",  # Nome do serviço Docker
+    "http://localhost:8000"   # Execução local
+]
+URL_API_PADRAO = "http://localhost:8000"
+
+TTL_STATUS_S = int(os.getenv('MEDAI_UI_TTL_STATUS_S', '15'))
+CONEXOES_POR_HOST = 10
+MAX_DETALHES_GUARDADOS = 200
+
+@st.cache_resource(show_spinner=False)
+def sessao():
+    """Sessão HTTP única do processo: mantém as conexões TCP abertas entre reruns"""
+    s = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=len(URLS_API), pool_maxsize=CONEXOES_POR_HOST)
+    s.mount("http://", adaptador)
+    s.mount("https://", adaptador)
+    return s
+
+@st.cache_resource(show_spinner=False)
+def _descobrir_api_url():
+    """Sonda os hosts uma vez por processo; exceções não ficam em cache, então a sondagem é refeita até achar a API"""
+    for url in URLS_API:
+        try:
+            # Timeout curto para não travar
+            if sessao().get(f"{url}/", timeout=2).status_code == 200:
+                return url
+        except requests.exceptions.RequestException:
+            continue
+    raise ConnectionError("Nenhuma URL da API respondeu")
+
+def api_url():
+    """URL da API: MEDAI_API_URL, ou detecção automática entre Docker e local"""
+    if os.getenv('MEDAI_API_URL'):
+        return os.getenv('MEDAI_API_URL').rstrip('/')
+    try:
+        return _descobrir_api_url()
+    except ConnectionError:
+        return URL_API_PADRAO
+
+def get(caminho, **kwargs):
+    return sessao().get(f"{api_url()}{caminho}", **kwargs)
+
+def post(caminho, **kwargs):
+    return sessao().post(f"{api_url()}{caminho}", **kwargs)
+
+@st.cache_data(ttl=TTL_STATUS_S, show_spinner=False)
+def _status():
+    response = get("/status", timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def obter_status():
+    """
+    Status, configuração e disponibilidade da IA em uma chamada só, em cache por TTL_STATUS_S.
+    Falhas não entram no cache: o próximo rerun tenta de novo.
+    """
+    try:
+        return True, _status()
+    except requests.exceptions.HTTPError as e:
+        return False, {"erro": f"API retornou status {e.response.status_code}"}
+    except Exception as e:
+        return False, {"erro": f"Não conseguiu conectar à API: {str(e)}"}
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def obter_estatisticas(versao_indice, top=10):
+    """
+    Estatísticas do corpus; a chave do cache é a versão do índice (vinda do /status),
+    então só há nova requisição quando o índice muda
+    """
+    response = get("/estatisticas", params={"top": top}, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(ttl=300, max_entries=1000, show_spinner=False)
+def _sugestoes(prefixo, versao_indice, limite):
+    response = get("/autocomplete", params={"q": prefixo, "limite": limite}, timeout=3)
+    response.raise_for_status()
+    return response.json()["sugestoes"]
+
+def sugerir_nomes(prefixo, versao_indice, limite=6):
+    """Sugestões do autocomplete; prefixos repetidos (cada rerun) vêm do cache, sem requisição"""
+    try:
+        return _sugestoes(prefixo.lower(), versao_indice, limite)
+    except Exception:
+        return []
+
+@st.cache_resource(show_spinner=False)
+def _detalhes_guardados():
+    return {} # nome -> (ETag, dados)
+
+def detalhes_medicamento(nome, campos=None):
+    """
+    (status HTTP, dados) dos detalhes pelo GET com ETag: um detalhe já visto é revalidado com
+    If-None-Match e, sem mudança no índice, volta 304 sem corpo e os dados guardados são reaproveitados
+    """
+    guardados = _detalhes_guardados()
+    chave = (nome.strip().lower(), tuple(campos or ()))
+    cabecalhos = {"If-None-Match": guardados[chave][0]} if chave in guardados else {}
+    params = {"campos": ",".join(campos)} if campos else None
+    response = get(f"/medicamentos/{requests.utils.quote(nome.strip(), safe='')}", params=params,
+                   headers=cabecalhos, timeout=10)
+    
+    if response.status_code == 304:
+        return 200, guardados[chave][1]
+    if response.status_code == 200 and response.headers.get("ETag"):
+        if len(guardados) >= MAX_DETALHES_GUARDADOS:
+            guardados.pop(next(iter(guardados)))
+        guardados[chave] = (response.headers["ETag"], response.json())
+        return 200, guardados[chave][1]
+    try:
+        return response.status_code, response.json()
+    except ValueError:
+        return response.status_code, {}
+
+def limpar_cache():
+    """Descarta status e estatísticas em cache (ex.: botão de atualizar)"""
+    _status.clear()
+    obter_estatisticas.clear()
@@ -0,0 +1,152 @@
+"""
+Fila de análises assíncronas: o cliente recebe um job_id na hora e acompanha o progresso
+por polling ou por stream de eventos (SSE), sem manter a conexão presa durante toda a análise
+"""
+import os # Configurações via .env
+import time # Marcação de tempo dos eventos
+import uuid # Identificador dos jobs
+import threading # Proteção do estado compartilhado entre workers
+from bisect import bisect_right # Eventos novos a partir do último id enviado
+from collections import OrderedDict # Jobs guardados em ordem de criação
+from concurrent.futures import ThreadPoolExecutor # Workers que executam as análises
+
+# Análises executando ao mesmo tempo e quantas podem esperar na fila
+WORKERS_ANALISE = int(os.getenv('MEDAI_WORKERS_ANALISE', '2'))
+TAMANHO_FILA_ANALISE = int(os.getenv('MEDAI_FILA_ANALISE', '20'))
+
+# Quantos jobs finalizados ficam guardados para consulta
+MAX_JOBS_GUARDADOS = 200
+
+# Tokens do relatório saem do histórico quando o job termina (o texto completo fica no resultado)
+# ou quando o relatório recomeça numa nova tentativa
+EVENTOS_DESCARTAM_TOKENS = ("fim", "relatorio_reiniciado")
+
+class FilaCheia(Exception):
+    """Fila de análises sem vaga; a API responde 429"""
+
+class JobAnalise:
+    """Estado de uma análise: status, eventos de progresso e resultado"""
+
+    def __init__(self, sintomas, opcoes=None):
+        self.id = uuid.uuid4().hex
+        self.sintomas = sintomas
+        self.opcoes = opcoes or {} # argumentos extras repassados para a função de análise
+        self.status = "na_fila" # na_fila -> executando -> concluido | erro
+        self.criado_em = time.time()
+        self.iniciado_em = None
+        self.concluido_em = None
+        self.primeiro_token_em = None # Tempo até o primeiro byte útil do relatório (inclui a fila)
+        self.resultado = None
+        self.eventos = [] # cada evento tem um id crescente; streams acompanham pelo id, não pela posição
+        self._proximo_id = 0
+        self._inscritos = [] # (loop asyncio, asyncio.Event) de quem acompanha o stream
+        self._lock = threading.Lock()
+
+    @property
+    def finalizado(self):
+        return self.status in ("concluido", "erro")
+
+    def registrar_evento(self, tipo, **dados):
+        """Adiciona evento de progresso e acorda os streams SSE (chamado pelos workers)"""
+        if tipo == "token" and self.primeiro_token_em is None:
+            self.primeiro_token_em = time.time()
+        with self._lock:
+            evento = {"id": self._proximo_id, "tipo": tipo, "t": round(time.time() - self.criado_em, 3), **dados}
+            self._proximo_id += 1
+            if tipo in EVENTOS_DESCARTAM_TOKENS:
+                self.eventos = [e for e in self.eventos if e["tipo"] != "token"]
+            self.eventos.append(evento)
+            inscritos = list(self._inscritos)
+        for loop, aviso in inscritos:
+            loop.call_soon_threadsafe(aviso.set)
+
+    def eventos_desde(self, ultimo_id):
+        """Eventos com id maior que ultimo_id (-1 para todos), em ordem"""
+        with self._lock:
+            return self.eventos[bisect_right(self.eventos, ultimo_id, key=lambda e: e["id"]):]
+
+    def inscrever(self, loop, aviso):
+        with self._lock:
+            self._inscritos.append((loop, aviso))
+
+    def desinscrever(self, loop, aviso):
+        with self._lock:
+            self._inscritos.remove((loop, aviso))
+
+    def resumo(self):
+        """Representação JSON do job para o endpoint de polling"""
+        dados = {
+            "job_id": self.id,
+            "status": self.status,
+            "criado_em": self.criado_em,
+            "iniciado_em": self.iniciado_em,
+            "concluido_em": self.concluido_em,
+            "ttfb_s": round(self.primeiro_token_em - self.criado_em, 3) if self.primeiro_token_em else None,
+            "ultimo_evento": self.eventos[-1] if self.eventos else None
+        }
+        if self.finalizado:
+            dados["resultado"] = self.resultado
+        return dados
+
+class FilaAnalises:
+    """Executa análises em um número fixo de workers com fila limitada"""
+
+    def __init__(self, executar, workers=WORKERS_ANALISE, tamanho_fila=TAMANHO_FILA_ANALISE):
+        self.executar = executar # função(sintomas, ao_evento, **opcoes) -> dict de resultado
+        self.workers = workers
+        self.tamanho_fila = tamanho_fila
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analise")
+        self.jobs = OrderedDict()
+        self._pendentes = 0 # jobs na fila ou executando
+        self._lock = threading.Lock()
+
+    def submeter(self, sintomas, **opcoes):
+        """Enfileira uma análise e retorna o job imediatamente (FilaCheia se não houver vaga)"""
+        with self._lock:
+            if self._pendentes >= self.workers + self.tamanho_fila:
+                raise FilaCheia(f"Fila de análises cheia ({self.tamanho_fila} aguardando)")
+            self._pendentes += 1
+            job = JobAnalise(sintomas, opcoes)
+            self.jobs[job.id] = job
+            self._descartar_antigos()
+            # Posição lida junto com o incremento: outro submeter ou fim de job não muda a contagem no meio
+            job.registrar_evento("na_fila", posicao=max(0, self._pendentes - self.workers))
+
+        self.executor.submit(self._rodar, job)
+        return job
+
+    def obter(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _rodar(self, job):
+        job.status = "executando"
+        job.iniciado_em = time.time()
+        job.registrar_evento("iniciado")
+        try:
+            job.resultado = self.executar(job.sintomas, ao_evento=job.registrar_evento, **job.opcoes)
+            job.status = "concluido" if job.resultado.get("status") == "sucesso" else "erro"
+        except Exception as e:
+            job.resultado = {"status": "erro", "erro": str(e), "tipo_erro": type(e).__name__}
+            job.status = "erro"
+        finally:
+            job.concluido_em = time.time()
+            with self._lock:
+                self._pendentes -= 1
+            job.registrar_evento("fim", status=job.status)
+
+    def _descartar_antigos(self):
+        """Remove os jobs finalizados mais antigos acima do limite guardado"""
+        excedente = len(self.jobs) - MAX_JOBS_GUARDADOS
+        for job_id in [j for j, job in self.jobs.items() if job.finalizado][:max(0, excedente)]:
+            del self.jobs[job_id]
+
+    def estatisticas(self):
+        with self._lock:
+            pendentes = self._pendentes
+        return {
+            "workers": self.workers,
+            "tamanho_fila": self.tamanho_fila,
+            "executando": min(pendentes, self.workers),
+            "aguardando": max(0, pendentes - self.workers),
+            "jobs_guardados": len(self.jobs)
+        }
@@ -8,38 +8,13 @@ import plotly.express as px # criação de gráficos
 from pathlib import Path # Para verificação de existência de arquivos
 from dotenv import load_dotenv # carregar .env
 import os # acessar ambiente do sistema
-import requests # Para conectar com a API 
-import time # Para simulação de progresso
+import requests # Exceções das chamadas à API
+import cliente_api # Sessão HTTP reaproveitada e cache entre reruns
+import html # Escapar textos dos eventos exibidos como HTML
 
 # Carregar variáveis .env
 load_dotenv()
 
-# URL da API - detecta automaticamente se está rodando em Docker ou local
-def get_api_url():
-    """
-    Detecta automaticamente se está rodando em Docker ou local
-    Tenta conectar via nome do serviço Docker primeiro, depois localhost
-    """
-    # URLs para testar (ordem de prioridade)
-    urls_to_try = [
-        "http://medai-api:8000",  # Nome do serviço Docker
-        "http://localhost:8000"   # Execução local
-    ]
-    
-    for url in urls_to_try:
-        try:
-            # Testar conexão com timeout curto para não travar
-            response = requests.get(f"{url}/", timeout=2)
-            if response.status_code == 200:
-                return url
-        except:
-            continue
-    
-    # Se nenhuma funcionar, usar localhost como padrão
-    return "http://localhost:8000"
-
-API_URL = get_api_url()
-
 # Configuração da página Streamlit
 st.set_page_config(
     page_title="Sistema MedAI", # Título na aba do navegador
@@ -47,6 +22,15 @@ st.set_page_config(
     layout="wide" # Layout amplo
 )
 
+# Campos que a interface exibe: a API devolve só esses (respostas menores)
+CAMPOS_BUSCA_INTERFACE = ["principio_ativo", "similaridade", "categoria_terapeutica", "categorias", "popularidade",
+                          "total_produtos", "nivel_risco", "requer_receita", "empresas_exemplo", "produtos_exemplo"]
+CAMPOS_DETALHES_INTERFACE = ["principio_ativo", "categoria_terapeutica", "popularidade_mercado", "total_produtos",
+                             "diversidade_formulacoes", "empresas_exemplo", "texto_completo"]
+
+# URL da API - MEDAI_API_URL ou detecção automática entre Docker e local (sondada uma vez por processo)
+API_URL = cliente_api.api_url()
+
 # CSS com animações
 st.markdown("""
 <style>
@@ -177,69 +161,76 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def verificar_api():
-    """Verifica se a API está funcionando e retorna status"""
-    try:
-        response = requests.get(f"{API_URL}/status", timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return True, data
-        else:
-            return False, {"erro": f"API retornou status {response.status_code}"}
-    except Exception as e:
-        return False, {"erro": f"Não conseguiu conectar à API: {str(e)}"}
-
-def verificar_configuracao_ia():
-    """Verifica se a configuração de IA está funcionando"""
-    try:
-        response = requests.get(f"{API_URL}/configuracao", timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return True, data
-        else:
-            return False, {"erro": f"Erro ao verificar configuração: {response.status_code}"}
-    except Exception as e:
-        return False, {"erro": f"Erro de conexão: {str(e)}"}
+def eventos_sse(resposta):
+    """Lê um stream SSE (requests com stream=True) e gera (evento, dados)"""
+    evento, dados = None, []
+    for linha in resposta.iter_lines(decode_unicode=True):
+        if not linha:
+            if dados:
+                yield evento or "message", json.loads("\n".join(dados))
+            evento, dados = None, []
+        elif linha.startswith("event:"):
+            evento = linha[len("event:"):].strip()
+        elif linha.startswith("data:"):
+            dados.append(linha[len("data:"):].strip())
+        # Linhas de comentário (": keep-alive") são ignoradas
 
-def mostrar_progresso_ia(etapas):
-    """Mostra progresso das etapas da análise de IA"""
-    progress_container = st.empty()
+def atualizar_etapas(etapas, evento, dados):
+    """Atualiza a lista de etapas da análise com um evento real do job (SSE); retorna False se não mudou nada"""
+    def concluir_ativa():
+        for etapa in etapas:
+            if etapa["estado"] == "active":
+                etapa["estado"] = "completed"
     
-    for i, etapa in enumerate(etapas):
-        progress_html = "<div style='margin: 1rem 0;'>"
-        
-        for j, step_name in enumerate(etapas):
-            if j < i:
-                class_name = "progress-step completed"
-                icon = "✅"
-            elif j == i:
-                class_name = "progress-step active"
-                icon = "🔄"
-            else:
-                class_name = "progress-step"
-                icon = "⏳"
-            
-            progress_html += f"""
-            <div class="{class_name}">
-                {icon} {step_name}
-            </div>
-            """
-        
-        progress_html += "</div>"
-        progress_container.markdown(progress_html, unsafe_allow_html=True)
-        
-        time.sleep(1)  # Simular tempo de processamento
-    
-    # Mostrar conclusão
-    final_html = "<div style='margin: 1rem 0;'>"
-    for step_name in etapas:
-        final_html += f"""
-        <div class="progress-step completed">
-            ✅ {step_name}
+    if evento == "na_fila":
+        etapas.append({"estado": "active", "texto": f"Na fila de análises (posição {dados.get('posicao', 0) + 1})"})
+    elif evento == "iniciado":
+        concluir_ativa()
+        etapas.append({"estado": "active", "texto": "Análise iniciada"})
+    elif evento == "cache":
+        concluir_ativa()
+        etapas.append({"estado": "completed", "texto": "⚡ Resultado reaproveitado de uma análise anterior"})
+    elif evento == "admitida":
+        etapas.append({"estado": "completed", "texto": f"Aguardou vaga para análise ({dados['espera_ms'] / 1000:.1f}s)"})
+    elif evento == "prefetch":
+        concluir_ativa()
+        etapas.append({"estado": "completed",
+                       "texto": f"📚 {dados['medicamentos']} medicamentos consultados na base ANVISA ({dados['ms']:.0f} ms)"})
+    elif evento == "busca_web":
+        etapas.append({"estado": "completed",
+                       "texto": f"🌐 {dados['consultas']} buscas web ({', '.join(dados['especialidades']) or 'geral'}) em {dados['ms'] / 1000:.1f}s"})
+    elif evento == "nova_tentativa":
+        etapas.append({"estado": "completed",
+                       "texto": f"⏳ Limite de requisições do LLM: tentativa {dados['tentativa'] + 1} em {dados['espera_s']:.1f}s"})
+    elif evento == "tarefa_iniciada":
+        concluir_ativa()
+        etapas.append({"estado": "active", "texto": f"{dados['agente']} ({dados['tarefa']}/{dados['total']})"})
+    elif evento == "ferramenta":
+        # Chamada de ferramenta aparece logo abaixo da tarefa em andamento
+        etapas.append({"estado": "completed", "texto": f"↳ 🔧 {dados['ferramenta']}: {dados.get('entrada', '')[:80]}"})
+    elif evento == "tarefa_concluida":
+        for etapa in reversed(etapas):
+            if etapa["estado"] == "active":
+                etapa["estado"] = "completed"
+                break
+    elif evento == "fim":
+        concluir_ativa()
+    else:
+        return False
+    return True
+
+def mostrar_etapas(container, etapas):
+    """Mostra as etapas da análise de IA (concluídas, em andamento)"""
+    icones = {"completed": "✅", "active": "🔄"}
+    progress_html = "<div style='margin: 1rem 0;'>"
+    for etapa in etapas:
+        progress_html += f"""
+        <div class="progress-step {etapa['estado']}">
+            {icones.get(etapa['estado'], '⏳')} {html.escape(etapa['texto'])}
         </div>
         """
-    final_html += "</div>"
-    progress_container.markdown(final_html, unsafe_allow_html=True)
+    progress_html += "</div>"
+    container.markdown(progress_html, unsafe_allow_html=True)
 
 # Header principal
 st.markdown("""
@@ -255,9 +246,11 @@ st.sidebar.title("⚙️ Status do Sistema")
 # Configurações
 top_k = st.sidebar.slider("Número de resultados", 3, 10, 5)
 
-# Verificar status da API 
-api_ok, status_data = verificar_api()
-config_ok, config_data = verificar_configuracao_ia()
+# Status e configuração da IA em uma chamada só, em cache entre reruns
+if st.sidebar.button("🔄 Atualizar status", use_container_width=True):
+    cliente_api.limpar_cache()
+api_ok, status_data = cliente_api.obter_status()
+config_ok, config_data = api_ok, status_data
 
 # Status do sistema
 if api_ok and status_data.get("medicamentos_carregados", 0) > 0:
@@ -325,9 +318,9 @@ with tab1:
             with st.spinner("🔍 Buscando medicamentos..."):
                 try:
                     # Chamar API 
-                    response = requests.post(
-                        f"{API_URL}/busca_simples",
-                        json={"sintomas": sintomas, "top_k": top_k},
+                    response = cliente_api.post(
+                        "/busca_simples",
+                        json={"sintomas": sintomas, "top_k": top_k, "campos": CAMPOS_BUSCA_INTERFACE},
                         timeout=15
                     )
                     
@@ -357,8 +350,11 @@ with tab1:
                                     
                                     with col_med1:
                                         st.write(f"**🏷️ Categoria:** {med.get('categoria_terapeutica', 'N/A')}")
+                                        if len(med.get('categorias', [])) > 1:
+                                            st.write(f"**🗂️ Outras categorias:** {', '.join(med['categorias'][1:])}")
                                         st.write(f"**📊 Popularidade:** {med.get('popularidade', 'N/A')}")
                                         st.write(f"**📦 Produtos:** {med.get('total_produtos', 'N/A')}")
+                                        st.write(f"**⚠️ Risco:** {med.get('nivel_risco', 'N/A')} | **📝 Receita:** {'SIM' if med.get('requer_receita') else 'NÃO'}")
                                     
                                     with col_med2:
                                         st.write(f"**🏢 Empresas:** {med.get('empresas_exemplo', 'N/A')}")
@@ -381,41 +377,58 @@ with tab1:
                 with progress_container:
                     st.info("🤖 **Iniciando análise com Inteligência Artificial...**")
                     
-                    # Etapas do progresso
-                    etapas = [
-                        "Inicializando agentes especializados",
-                        "Analisando sintomas com banco vetorial",
-                        "Consultando base de medicamentos ANVISA",
-                        "Avaliando segurança e riscos",
-                        "Buscando orientações médicas online",
-                        "Gerando relatório final"
-                    ]
-                    
-                    # Mostrar progresso simulado
+                    # Progresso e relatório vêm dos eventos reais do job (SSE): nenhuma espera artificial
                     progress_bar = st.progress(0)
                     status_text = st.empty()
+                    etapas_container = st.empty()
+                    relatorio_stream = st.empty()
                     
                     try:
-                        # Fazer requisição para análise IA
-                        response = requests.post(
-                            f"{API_URL}/analisar_sintomas",
+                        # Criar job de análise IA e acompanhar pelo stream de eventos
+                        response = cliente_api.post(
+                            "/analises",
                             json={"descricao": sintomas},
-                            timeout=180  # 3 minutos
+                            timeout=30
                         )
                         
-                        # Simular progresso enquanto processa
-                        for i, etapa in enumerate(etapas):
-                            progress_bar.progress((i + 1) / len(etapas))
-                            status_text.text(f"🔄 {etapa}...")
-                            time.sleep(0.5)
-                        
-                        if response.status_code == 200:
-                            resultado_completo = response.json()
+                        if response.status_code == 202:
+                            job = response.json()
+                            resultado_completo = None
+                            texto_relatorio = ""
+                            etapas = []
+                            duracao_s = None
                             
+                            with cliente_api.get(job['eventos_url'], stream=True, timeout=(10, 300)) as stream:
+                                stream.encoding = "utf-8"
+                                for evento, dados in eventos_sse(stream):
+                                    if evento == "token":
+                                        # Relatório final chegando token a token
+                                        texto_relatorio += dados["texto"]
+                                        relatorio_stream.markdown(texto_relatorio + " ▌")
+                                        continue
+                                    if evento == "relatorio_reiniciado":
+                                        # Nova tentativa após rate limit: o relatório recomeça do zero
+                                        texto_relatorio = ""
+                                        relatorio_stream.empty()
+                                        continue
+                                    if evento == "resultado":
+                                        resultado_completo = dados
+                                        continue
+                                    
+                                    if evento == "tarefa_iniciada":
+                                        status_text.text(f"🔄 {dados['agente']} ({dados['tarefa']}/{dados['total']})...")
+                                    elif evento == "tarefa_concluida":
+                                        progress_bar.progress(dados["tarefa"] / dados["total"])
+                                    elif evento == "fim":
+                                        duracao_s = dados["t"] # Tempo do job no servidor
+                                    if atualizar_etapas(etapas, evento, dados):
+                                        mostrar_etapas(etapas_container, etapas)
+                            
+                            relatorio_stream.empty()
                             progress_bar.progress(1.0)
-                            status_text.text("✅ Análise concluída!")
+                            status_text.text(f"✅ Análise concluída em {duracao_s:.1f}s!" if duracao_s is not None else "✅ Análise concluída!")
                             
-                            if resultado_completo["status"] == "sucesso":
+                            if resultado_completo and resultado_completo["status"] == "sucesso":
                                 with result_container:
                                     st.success("🎉 **Análise com IA concluída com sucesso!**")
                                     
@@ -438,6 +451,7 @@ with tab1:
                                         with st.expander("🔧 **Informações Técnicas da Análise**"):
                                             st.json(resultado_completo["configuracao"])
                             else:
+                                resultado_completo = resultado_completo or {"erro": "Stream de eventos encerrado sem resultado"}
                                 progress_bar.empty()
                                 status_text.empty()
                                 st.error(f"❌ **Erro na análise:** {resultado_completo.get('erro', 'Erro desconhecido')}")
@@ -451,6 +465,10 @@ with tab1:
                                 st.write("• Verifique se a GEMINI_API_KEY está configurada")
                                 st.write("• Reinicie a API se necessário")
                                 st.write("• Tente novamente em alguns segundos")
+                        elif response.status_code == 429:
+                            progress_bar.empty()
+                            status_text.empty()
+                            st.warning("⏳ **Muitas análises em andamento.** Tente novamente em alguns segundos.")
                         else:
                             progress_bar.empty()
                             status_text.empty()
@@ -514,27 +532,48 @@ with tab1:
 with tab2:
     st.header("💊 Detalhes do Medicamento")
 
+    def escolher_sugestao(principio_ativo):
+        """Preenche o campo com o princípio ativo da sugestão e já busca os detalhes"""
+        st.session_state["nome_medicamento"] = principio_ativo
+        st.session_state["buscar_detalhes"] = True
+
     # Campo de entrada de nome do medicamento
     nome_medicamento = st.text_input(
         "Digite o nome do medicamento:",
+        key="nome_medicamento",
         placeholder="Ex: paracetamol, ibuprofeno, amoxicilina...",  # Exemplos para orientar usuário
         help="Digite o nome do princípio ativo ou nome comercial"
     )
+    
+    # Sugestões pelo início do nome (princípios e nomes comerciais, mais registrados primeiro)
+    if len(nome_medicamento.strip()) >= 2:
+        sugestoes = cliente_api.sugerir_nomes(nome_medicamento.strip(), status_data.get("versao_indice"))
+        if sugestoes:
+            st.caption("💡 Sugestões:")
+            colunas = st.columns(min(len(sugestoes), 3))
+            for i, sugestao in enumerate(sugestoes):
+                rotulo = sugestao["nome"]
+                if sugestao["tipo"] == "produto":
+                    rotulo += f" ({sugestao['principio_ativo']})"
+                colunas[i % len(colunas)].button(
+                    f"{rotulo} · {sugestao['total_produtos']} produtos",
+                    key=f"sugestao_{i}",
+                    on_click=escolher_sugestao,
+                    args=(sugestao["principio_ativo"],),
+                    use_container_width=True
+                )
 
-    if st.button("🔍 Buscar Detalhes", use_container_width=True) and nome_medicamento:
+    buscar_detalhes = st.button("🔍 Buscar Detalhes", use_container_width=True) or st.session_state.pop("buscar_detalhes", False)
+    if buscar_detalhes and nome_medicamento:
         # Validação 
         if len(nome_medicamento.strip()) >= 3:
             with st.spinner("🔍 Buscando detalhes..."):
                 try:
                     
-                    response = requests.post(
-                        f"{API_URL}/detalhes_medicamento",
-                        json={"nome_medicamento": nome_medicamento},
-                        timeout=10
-                    )
+                    # GET com ETag: detalhes já vistos voltam 304 e são reaproveitados
+                    status_code, data = cliente_api.detalhes_medicamento(nome_medicamento, CAMPOS_DETALHES_INTERFACE)
                     
-                    if response.status_code == 200:
-                        data = response.json()  # Convertendo a resposta para dicionário
+                    if status_code == 200:
                         
                         # Verificando erros ou a ausência de resultados
                         if "erro" in data:
@@ -563,11 +602,11 @@ with tab2:
                                     height=200,
                                     disabled=True
                                 )  # Exibindo todas as informações do medicamento
-                    elif response.status_code == 404:
+                    elif status_code == 404:
                         st.error("❌ **Medicamento não encontrado**")
                         st.info("💡 **Dica:** Tente usar o nome do princípio ativo ou verifique a grafia")
                     else:
-                        st.error(f"❌ **Erro na API:** Código {response.status_code}")
+                        st.error(f"❌ **Erro na API:** Código {status_code}")
                         
                 except Exception as e:
                     st.error(f"❌ **Erro de conexão:** {e}")
@@ -579,110 +618,140 @@ with tab2:
 with tab3:
     st.header("📈 Estatísticas do Sistema")
     
-    # Usar dados da API 
+    # Agregados do corpus completo, pré-calculados pela API na carga do banco vetorial (uma chamada)
     try:
-        # Buscar alguns medicamentos para gerar estatísticas básicas
-        response = requests.post(
-            f"{API_URL}/busca_simples",
-            json={"sintomas": "medicamento", "top_k": 10},
-            timeout=10
-        )
+        # Em cache pela versão do índice: só busca de novo quando o índice muda
+        stats = cliente_api.obter_estatisticas(status_data.get("versao_indice"), top=10)
         
-        if response.status_code == 200:
-            data = response.json()
-            medicamentos = data.get("medicamentos", [])
+        if stats:
             
-            if medicamentos:
-                # Converter para DataFrame para análise
-                df_stats = pd.DataFrame(medicamentos)
-                
-                # Métricas principais baseadas na amostra
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    st.metric(
-                        "📊 Amostra Analisada", 
-                        len(df_stats),
-                        help="Número de medicamentos na amostra atual"
-                    ) # Contagem da amostra
-                
-                with col2:
-                    if 'categoria_terapeutica' in df_stats.columns:
-                        st.metric(
-                            "🏷️ Categorias", 
-                            df_stats['categoria_terapeutica'].nunique(),
-                            help="Número de categorias terapêuticas únicas"
-                        ) # Categorias únicas na amostra
-                    else:
-                        st.metric("🏷️ Categorias", "N/A")
-                
-                with col3:
-                    if 'total_produtos' in df_stats.columns:
-                        total_produtos = pd.to_numeric(df_stats['total_produtos'], errors='coerce').sum()
-                        st.metric(
-                            "📦 Total Produtos", 
-                            int(total_produtos) if not pd.isna(total_produtos) else 0,
-                            help="Soma total de produtos registrados"
-                        ) # Soma de produtos na amostra
-                    else:
-                        st.metric("📦 Total Produtos", "N/A")
-                
-                with col4:
-                    if 'total_produtos' in df_stats.columns:
-                        avg_products = pd.to_numeric(df_stats['total_produtos'], errors='coerce').mean()
-                        st.metric(
-                            "📊 Média Produtos", 
-                            f"{avg_products:.1f}" if not pd.isna(avg_products) else "N/A",
-                            help="Média de produtos por medicamento"
-                        ) # Média de produtos por medicamento na amostra
-                    else:
-                        st.metric("📊 Média Produtos", "N/A")
-                
-                # Gráficos baseados na amostra
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    # Top categorias terapêuticas da amostra
-                    if 'categoria_terapeutica' in df_stats.columns:
-                        cat_counts = df_stats['categoria_terapeutica'].value_counts().head(5)
-                        if not cat_counts.empty:
-                            fig1 = px.bar(
-                                x=cat_counts.values,
-                                y=cat_counts.index,
-                                orientation='h',
-                                title="🏆 Top 5 Categorias na Amostra",
-                                labels={'x': 'Quantidade', 'y': 'Categoria'}
-                            )
-                            fig1.update_layout(height=400)
-                            st.plotly_chart(fig1, use_container_width=True)
-                        else:
-                            st.info("📊 Dados de categoria não disponíveis para gráfico")
-                    else:
-                        st.info("📊 Dados de categoria não disponíveis")
-                
-                with col2:
-                    # Distribuição popularidade do mercado da amostra
-                    if 'popularidade' in df_stats.columns:
-                        pop_counts = df_stats['popularidade'].value_counts()
-                        if not pop_counts.empty:
-                            fig2 = px.pie(
-                                values=pop_counts.values,
-                                names=pop_counts.index,
-                                title="📈 Distribuição por Popularidade na Amostra"
-                            )
-                            fig2.update_layout(height=400)
-                            st.plotly_chart(fig2, use_container_width=True)
-                        else:
-                            st.info("📊 Dados de popularidade não disponíveis para gráfico")
-                    else:
-                        st.info("📊 Dados de popularidade não disponíveis")
-                        
-                st.info("📊 **Nota:** Estatísticas baseadas em amostra de medicamentos. Para dados completos, acesse a API diretamente.")
-            else:
-                st.warning("⚠️ Não foi possível carregar dados para estatísticas")
+            # Métricas principais do corpus
+            col1, col2, col3, col4 = st.columns(4)
+            
+            with col1:
+                st.metric(
+                    "💊 Princípios Ativos", 
+                    f"{stats['total_principios']:,}".replace(',', '.'),
+                    help="Princípios ativos no banco vetorial"
+                ) # Total de princípios
+            
+            with col2:
+                st.metric(
+                    "🏷️ Categorias", 
+                    len(stats['por_categoria_multirrotulo']),
+                    help="Categorias terapêuticas com pelo menos um princípio ativo"
+                ) # Categorias presentes
+            
+            with col3:
+                st.metric(
+                    "📦 Total Produtos", 
+                    f"{stats['total_produtos_registrados']:,}".replace(',', '.'),
+                    help="Soma dos produtos registrados na ANVISA"
+                ) # Soma de produtos
+            
+            with col4:
+                st.metric(
+                    "📊 Média Produtos", 
+                    f"{stats['produtos_por_principio']['media']:.1f}",
+                    help=f"Média de produtos por princípio ativo (mediana {stats['produtos_por_principio']['mediana']:.0f}, "
+                         f"máximo {stats['produtos_por_principio']['max']})"
+                ) # Média de produtos por princípio
+            
+            # Categorias e popularidade
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                multirrotulo = st.checkbox("Contar todas as categorias de cada princípio (multi-rótulo)", value=False)
+                por_categoria = stats['por_categoria_multirrotulo'] if multirrotulo else stats['por_categoria']
+                if por_categoria:
+                    fig1 = px.bar(
+                        x=list(por_categoria.values()),
+                        y=list(por_categoria.keys()),
+                        orientation='h',
+                        title="🏆 Princípios Ativos por Categoria",
+                        labels={'x': 'Princípios ativos', 'y': 'Categoria'}
+                    )
+                    fig1.update_layout(height=500, yaxis={'categoryorder': 'total ascending'})
+                    st.plotly_chart(fig1, use_container_width=True)
+                else:
+                    st.info("📊 Dados de categoria não disponíveis")
+            
+            with col2:
+                if stats['por_popularidade']:
+                    fig2 = px.pie(
+                        values=list(stats['por_popularidade'].values()),
+                        names=list(stats['por_popularidade'].keys()),
+                        title="📈 Distribuição por Popularidade no Mercado"
+                    )
+                    fig2.update_layout(height=500)
+                    st.plotly_chart(fig2, use_container_width=True)
+                else:
+                    st.info("📊 Dados de popularidade não disponíveis")
+            
+            # Formulações e risco
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                if stats['por_diversidade_formulacoes']:
+                    fig3 = px.pie(
+                        values=list(stats['por_diversidade_formulacoes'].values()),
+                        names=list(stats['por_diversidade_formulacoes'].keys()),
+                        title="🧪 Diversidade de Formulações"
+                    )
+                    fig3.update_layout(height=400)
+                    st.plotly_chart(fig3, use_container_width=True)
+            
+            with col2:
+                if stats['por_nivel_risco']:
+                    fig4 = px.bar(
+                        x=list(stats['por_nivel_risco'].keys()),
+                        y=list(stats['por_nivel_risco'].values()),
+                        title="⚠️ Princípios Ativos por Nível de Risco",
+                        labels={'x': 'Nível de risco', 'y': 'Princípios ativos'}
+                    )
+                    fig4.update_layout(height=400)
+                    st.plotly_chart(fig4, use_container_width=True)
+                st.caption(f"📋 {stats['requer_receita']} de {stats['total_principios']} princípios ativos exigem receita")
+            
+            # Rankings
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.subheader("💊 Princípios com Mais Produtos")
+                if stats['top_principios']:
+                    st.dataframe(
+                        pd.DataFrame(stats['top_principios']).rename(columns={
+                            'principio_ativo': 'Princípio Ativo',
+                            'categoria_terapeutica': 'Categoria',
+                            'total_produtos': 'Produtos'
+                        }),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+            
+            with col2:
+                st.subheader("🏭 Principais Fabricantes")
+                if stats['top_empresas']:
+                    st.dataframe(
+                        pd.DataFrame(stats['top_empresas']).rename(columns={
+                            'empresa': 'Empresa',
+                            'cnpj': 'CNPJ',
+                            'total': 'Princípios/Registros'
+                        }),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+            
+            st.info(f"📊 **Nota:** Estatísticas do corpus completo ({stats['total_linhas_indice']} linhas no índice, "
+                    f"versão {stats['versao_indice']})")
         else:
-            st.error("❌ Erro ao carregar dados para estatísticas")
+            st.warning("⚠️ Não foi possível carregar dados para estatísticas")
             
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 503:
+            st.warning("⚠️ Estatísticas ainda não calculadas, aguarde a carga do banco vetorial")
+        else:
+            st.error(f"❌ Erro ao carregar dados para estatísticas: {e.response.status_code}")
     except Exception as e:
         st.error(f"❌ Erro ao gerar estatísticas: {e}")
         st.info(f"💡 **Dica:** Verifique se a API está rodando em {API_URL}")
@@ -3,60 +3,32 @@ Antes de realizar qualquer operação envolvendo o banco vetorial é necessário
 Pré-processamento para criação de embeddings para enviar para o banco vetorial
 """
 import pandas as pd # Manipulação de dados em tabelas
-import re # Regex para limpeza de texto
-import unicodedata # Normalização de caracteres especiais/acentos
 import os # Operações do sistema operacional
+import json # Estado incremental e changeset
+import gzip # Compactar arquivo de estado
+import argparse # Argumentos de linha de comando
+import numpy as np # União das máscaras de categorias por princípio
+from datetime import datetime # Data de geração do changeset
 from tqdm import tqdm # Barra de progresso visual
+from categorias import clean_text, categorizar_classes, categoria_principal, nomes_da_mascara # Categorias multi-rótulo
+from categorias import VERSAO_CATEGORIAS # Versão da tabela (estado incremental)
 
 # Paths de origem e destino dos dados
 ANVISA_CSV_PATH = 'data/DADOS_ABERTOS_MEDICAMENTOS.csv'
 OUTPUT_FILE = 'anvisa_medicamentos.csv'
+OUTPUT_FILE_PRODUTOS = 'anvisa_produtos.csv' # Corpus opcional com uma linha por registro de produto
 
-def clean_text(text):
-    """Limpa e normaliza texto, tirando acentos, caracteres especiais, espaços duplos e das bordas"""
-    if pd.isna(text) or text == '':
-        return ''
-    
-    # Remove acentos usando normalização Unicode
-    text = unicodedata.normalize('NFD', str(text))
-    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
-    
-    # Remove caracteres especiais mantendo apenas letras, números, espaços e pontuação básica
-    text = re.sub(r'[^\w\s\-\.\,\(\)]', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip() # Remove espaços duplos e das bordas
-    
-    return text
+# Arquivos do modo incremental
+ESTADO_FILE = 'data/anvisa_estado.json.gz' # Hashes por registro + agregados por princípio
+CHANGESET_FILE = 'anvisa_changeset.json' # Princípios adicionados/atualizados/removidos na última execução
+VERSAO_ESTADO = 1 # Incrementar quando o formato dos hashes ou dos agregados por princípio mudar
 
-def categorize_therapeutic_class(classe):
-    """Categoriza classe terapêutica em grupos principais para facilitar busca"""
-    if pd.isna(classe):
-        return 'Não Classificado'
-    
-    classe_lower = classe.lower()
-    
-    # Mapeamento de categorias com palavras-chave associadas
-    categories = {
-        'antibiotico': ['antibiotico', 'antimicrobiano', 'bactericida'],
-        'analgesico': ['analgesico', 'dor', 'anti-inflamatorio'],
-        'cardiovascular': ['cardiovascular', 'cardiaco', 'hipertensao', 'pressao'],
-        'sistema_nervoso': ['neurologico', 'psiquiatrico', 'antidepressivo', 'ansiedade'],
-        'gastrointestinal': ['gastrico', 'digestivo', 'estomago', 'intestinal'],
-        'respiratorio': ['respiratorio', 'pulmonar', 'bronco', 'asma'],
-        'endocrino': ['hormonio', 'diabetes', 'tiroide', 'endocrino'],
-        'dermatologico': ['dermatologico', 'pele', 'topico'],
-        'oftalmico': ['oftalmico', 'ocular', 'olho'],
-        'vitaminas': ['vitamina', 'suplemento', 'mineral']
-    }
-    
-    # Procura primeira categoria que contenha alguma palavra-chave
-    for category, keywords in categories.items():
-        if any(keyword in classe_lower for keyword in keywords):
-            return category.replace('_', ' ').title()
-    
-    return 'Outros'
+# Colunas que influenciam o agregado final (mudanças em outras colunas são ignoradas)
+COLUNAS_HASH = ['NUMERO_REGISTRO_PRODUTO', 'PRINCIPIO_ATIVO', 'CLASSE_TERAPEUTICA', 
+                'NOME_PRODUTO', 'EMPRESA_DETENTORA_REGISTRO']
 
-def process_anvisa_data():
-    """Processa dados transformando em formato adequado para banco vetorial"""
+def carregar_registros_validos():
+    """Carrega o CSV bruto da ANVISA e mantém apenas registros válidos/ativos já categorizados"""
     
     # 1. Carregar dados da ANVISA
     df_raw = pd.read_csv(
@@ -76,31 +48,42 @@ def process_anvisa_data():
          (df_raw['SITUACAO_REGISTRO'].str.contains('ATIVO', na=False, case=False)))    # Ou ativo
     ].copy()
     
-    # 3. Aplicar categorização terapêutica padronizada
-    df_valid['categoria_terapeutica'] = df_valid['CLASSE_TERAPEUTICA'].apply(categorize_therapeutic_class)
+    # 3. Aplicar categorização terapêutica padronizada (multi-rótulo, uma vez por classe distinta)
+    df_valid['categorias_mask'] = categorizar_classes(df_valid['CLASSE_TERAPEUTICA'])
+    nomes_por_mascara = {m: categoria_principal(m) for m in df_valid['categorias_mask'].unique()}
+    df_valid['categoria_terapeutica'] = df_valid['categorias_mask'].map(nomes_por_mascara)
+    df_valid.loc[df_valid['CLASSE_TERAPEUTICA'].isna(), 'categoria_terapeutica'] = 'Não Classificado'
+    
+    return df_valid
+
+def agregar_por_principio(df_valid):
+    """Agrupa registros por princípio ativo e monta os dicionários prontos para embeddings"""
     
     # 4. Agrupar por princípio ativo para evitar duplicações
     grouped = df_valid.groupby('PRINCIPIO_ATIVO').agg({ # pega sempre as primeiras
         'CLASSE_TERAPEUTICA': 'first', 
         'categoria_terapeutica': 'first', 
+        'categorias_mask': lambda x: int(np.bitwise_or.reduce(x.to_numpy())), # União das categorias dos registros
         'NOME_PRODUTO': lambda x: list(x.dropna().unique()), # Lista única 
         'EMPRESA_DETENTORA_REGISTRO': lambda x: list(x.dropna().unique()), # Lista única 
         'NUMERO_REGISTRO_PRODUTO': 'count' # Conta total
     }).reset_index()
     
     # 5. Criar dataset final estruturado para embeddings
-    medicamentos_final = []
+    medicamentos_final = {}
     
     for idx, row in tqdm(grouped.iterrows(), total=len(grouped), desc="Processando medicamentos"):
-        
         # Limpar e padronizar nome do princípio ativo
         nome_limpo = clean_text(row['PRINCIPIO_ATIVO']).title()
+        categorias = '; '.join(nomes_da_mascara(row['categorias_mask'])) or row['categoria_terapeutica']
         
         # Estruturar dados do medicamento
         medicamento = {
             # Identificação principal
             'principio_ativo_limpo': nome_limpo,
             'categoria_terapeutica': row['categoria_terapeutica'],
+            'categorias_terapeuticas': categorias, # Todas as categorias, separadas por "; "
+            'categorias_mask': row['categorias_mask'], # Bitset das categorias (bit i = CATEGORIAS_TERAPEUTICAS[i])
             
             # Métricas de mercado
             'total_produtos_registrados': row['NUMERO_REGISTRO_PRODUTO'],
@@ -122,7 +105,7 @@ def process_anvisa_data():
             f"Medicamento: {nome_limpo}",
             f"Principio Ativo: {row['PRINCIPIO_ATIVO']}",
             f"Classe Terapeutica: {row['CLASSE_TERAPEUTICA']}",
-            f"Categoria: {row['categoria_terapeutica']}",
+            f"Categoria: {categorias}",
             f"Produtos Comerciais: {'; '.join(row['NOME_PRODUTO'][:3])}",
             f"Total de Produtos: {row['NUMERO_REGISTRO_PRODUTO']}"
         ]
@@ -133,21 +116,198 @@ def process_anvisa_data():
         # Texto resumido para exibição rápida
         medicamento['texto_resumo_busca'] = f"{nome_limpo} - {row['categoria_terapeutica']}"
         
-        medicamentos_final.append(medicamento)
+        medicamentos_final[row['PRINCIPIO_ATIVO']] = medicamento
     
     return medicamentos_final
 
-def save_anvisa_medicamentos(medicamentos):
+def process_anvisa_data():
+    """Processa dados transformando em formato adequado para banco vetorial"""
+    df_valid = carregar_registros_validos()
+    medicamentos = agregar_por_principio(df_valid)
+    return list(medicamentos.values())
+
+def agregar_por_registro(df_valid, principios):
+    """
+    Monta o corpus por produto: uma linha por NUMERO_REGISTRO_PRODUTO, com nome comercial e empresa
+    próprios, mais os campos agregados do princípio ativo para deduplicação na busca
+    """
+    registros = df_valid.groupby('NUMERO_REGISTRO_PRODUTO').agg({
+        'PRINCIPIO_ATIVO': 'first',
+        'CLASSE_TERAPEUTICA': 'first',
+        'categoria_terapeutica': 'first',
+        'categorias_mask': lambda x: int(np.bitwise_or.reduce(x.to_numpy())),
+        'NOME_PRODUTO': 'first',
+        'EMPRESA_DETENTORA_REGISTRO': 'first'
+    }).reset_index()
+    
+    # Campos do princípio ativo (mesmos do corpus agregado)
+    df_principios = pd.DataFrame.from_dict(principios, orient='index')
+    df_principios = df_principios.drop(columns=['categoria_terapeutica', 'categorias_terapeuticas', 'categorias_mask',
+                                                'texto_completo_busca', 'texto_resumo_busca'])
+    registros = registros.merge(df_principios, left_on='PRINCIPIO_ATIVO', right_index=True, how='inner')
+    
+    nome_produto = registros['NOME_PRODUTO'].fillna('').map(clean_text)
+    nomes_por_mascara = {m: '; '.join(nomes_da_mascara(m)) for m in registros['categorias_mask'].unique()}
+    registros['categorias_terapeuticas'] = registros['categorias_mask'].map(nomes_por_mascara)
+    registros['categorias_terapeuticas'] = registros['categorias_terapeuticas'].where(
+        registros['categorias_terapeuticas'] != '', registros['categoria_terapeutica'])
+    empresa = registros['EMPRESA_DETENTORA_REGISTRO'].fillna('')
+    
+    # Textos montados de forma vetorizada sobre as colunas
+    registros['texto_completo_busca'] = (
+        'Produto: ' + nome_produto +
+        ' | Medicamento: ' + registros['principio_ativo_limpo'] +
+        ' | Principio Ativo: ' + registros['PRINCIPIO_ATIVO'] +
+        ' | Classe Terapeutica: ' + registros['CLASSE_TERAPEUTICA'].fillna('') +
+        ' | Categoria: ' + registros['categorias_terapeuticas'] +
+        ' | Empresa: ' + empresa
+    )
+    registros['texto_resumo_busca'] = (
+        nome_produto + ' (' + registros['principio_ativo_limpo'] + ') - ' + registros['categoria_terapeutica']
+    )
+    
+    registros = registros.rename(columns={
+        'NUMERO_REGISTRO_PRODUTO': 'numero_registro',
+        'NOME_PRODUTO': 'nome_produto',
+        'EMPRESA_DETENTORA_REGISTRO': 'empresa_produto'
+    }).drop(columns=['PRINCIPIO_ATIVO', 'CLASSE_TERAPEUTICA'])
+    
+    # Mantém produtos do mesmo princípio juntos, como no corpus agregado
+    return registros.sort_values(['principio_ativo_limpo', 'nome_produto'], kind='stable').to_dict('records')
+
+def process_anvisa_produtos():
+    """Processa dados no modo por produto (uma linha por registro) para buscas por nome comercial"""
+    df_valid = carregar_registros_validos()
+    principios = agregar_por_principio(df_valid)
+    return agregar_por_registro(df_valid, principios)
+
+def save_anvisa_medicamentos(medicamentos, output_file=OUTPUT_FILE):
     """Salva dataset processado em CSV pronto para uso pelo banco vetorial"""
     # Converter para DataFrame
     df_final = pd.DataFrame(medicamentos)
     
     # Salvar
-    df_final.to_csv(OUTPUT_FILE, index=False, encoding='utf-8')
+    df_final.to_csv(output_file, index=False, encoding='utf-8')
+    
+    return output_file
+
+def calcular_hashes_registros(df_valid):
+    """Calcula um hash por NUMERO_REGISTRO_PRODUTO e os princípios ativos de cada registro"""
+    df_hash = df_valid[COLUNAS_HASH].fillna('')
+    
+    # Hash por linha vetorizado; soma por registro não depende da ordem das linhas
+    hashes_linhas = pd.util.hash_pandas_object(df_hash, index=False)
+    hashes = hashes_linhas.groupby(df_hash['NUMERO_REGISTRO_PRODUTO'].values).sum()
+    principios = df_hash.groupby('NUMERO_REGISTRO_PRODUTO')['PRINCIPIO_ATIVO'].agg(lambda x: sorted(x.unique()))
+    
+    return {
+        registro: [format(int(hashes[registro]), '016x'), principios[registro]]
+        for registro in hashes.index
+    }
+
+def carregar_estado():
+    """Carrega o estado da última execução incremental (None se ainda não existir)"""
+    if not os.path.exists(ESTADO_FILE):
+        return None
+    with gzip.open(ESTADO_FILE, 'rt', encoding='utf-8') as f:
+        estado = json.load(f)
+    
+    # Formato do estado ou tabela de categorias mudou: agregados antigos não servem, processamento completo
+    # (com changeset completo, inclusive princípios cujos registros sumiram nesta mesma execução)
+    if estado.get('versao') != VERSAO_ESTADO or estado.get('versao_categorias') != VERSAO_CATEGORIAS:
+        return None
+    return estado
+
+def salvar_estado(registros, principios):
+    """Salva hashes por registro e agregados por princípio em JSON compactado"""
+    os.makedirs(os.path.dirname(ESTADO_FILE) or '.', exist_ok=True)
+    estado = {'versao': VERSAO_ESTADO, 'versao_categorias': VERSAO_CATEGORIAS, 'registros': registros, 'principios': principios}
+    with gzip.open(ESTADO_FILE, 'wt', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False, separators=(',', ':'), default=int) # default=int converte np.int64
+
+def process_anvisa_incremental():
+    """
+    Reprocessa apenas os princípios ativos tocados por registros novos, alterados ou removidos
+    desde a última execução. Retorna (medicamentos, changeset).
+    """
+    df_valid = carregar_registros_validos()
+    registros_novos = calcular_hashes_registros(df_valid)
+    estado = carregar_estado()
     
-    return OUTPUT_FILE
+    # Sem estado anterior: processamento completo, tudo entra como adicionado
+    if estado is None:
+        principios = agregar_por_principio(df_valid)
+        principios = json.loads(json.dumps(principios, default=int)) # Normaliza tipos numpy como no estado salvo
+        changeset = {
+            'adicionados': sorted(m['principio_ativo_limpo'] for m in principios.values()),
+            'atualizados': [],
+            'removidos': []
+        }
+    else:
+        registros_antigos = estado['registros']
+        principios = estado['principios']
+        
+        # Princípios tocados = princípios antigos e novos de todo registro alterado, novo ou removido
+        tocados = set()
+        for registro in set(registros_antigos) | set(registros_novos):
+            antigo = registros_antigos.get(registro)
+            novo = registros_novos.get(registro)
+            if antigo is None or novo is None or antigo[0] != novo[0]:
+                tocados.update(antigo[1] if antigo else [])
+                tocados.update(novo[1] if novo else [])
+        
+        # Reagrega somente os princípios tocados
+        df_tocados = df_valid[df_valid['PRINCIPIO_ATIVO'].isin(tocados)]
+        reprocessados = json.loads(json.dumps(agregar_por_principio(df_tocados), default=int))
+        
+        changeset = {'adicionados': [], 'atualizados': [], 'removidos': []}
+        for principio in sorted(tocados):
+            anterior = principios.get(principio)
+            atual = reprocessados.get(principio)
+            if anterior is None and atual is not None:
+                changeset['adicionados'].append(atual['principio_ativo_limpo'])
+            elif anterior is not None and atual is None:
+                changeset['removidos'].append(anterior['principio_ativo_limpo'])
+            elif anterior != atual:
+                changeset['atualizados'].append(atual['principio_ativo_limpo'])
+            
+            if atual is None:
+                principios.pop(principio, None)
+            else:
+                principios[principio] = atual
+    
+    salvar_estado(registros_novos, principios)
+    
+    changeset['gerado_em'] = datetime.now().isoformat(timespec='seconds')
+    with open(CHANGESET_FILE, 'w', encoding='utf-8') as f:
+        json.dump(changeset, f, ensure_ascii=False, indent=2)
+    
+    # Mesma ordem do groupby do processamento completo
+    medicamentos = [principios[p] for p in sorted(principios)]
+    return medicamentos, changeset
 
 def main():
+    parser = argparse.ArgumentParser(description="Processa dados abertos da ANVISA para o banco vetorial")
+    parser.add_argument('--incremental', action='store_true',
+                        help=f"Reprocessa só princípios alterados usando {ESTADO_FILE} e gera {CHANGESET_FILE}")
+    parser.add_argument('--por-produto', action='store_true',
+                        help=f"Gera também {OUTPUT_FILE_PRODUTOS} com uma linha por registro de produto")
+    args = parser.parse_args()
+    
+    if args.por_produto:
+        produtos = process_anvisa_produtos()
+        save_anvisa_medicamentos(produtos, OUTPUT_FILE_PRODUTOS)
+        print(f"Corpus por produto salvo em {OUTPUT_FILE_PRODUTOS} ({len(produtos)} registros)")
+    
+    if args.incremental:
+        medicamentos, changeset = process_anvisa_incremental()
+        save_anvisa_medicamentos(medicamentos)
+        print(f"Processamento incremental concluído! "
+              f"{len(changeset['adicionados'])} adicionados, "
+              f"{len(changeset['atualizados'])} atualizados, "
+              f"{len(changeset['removidos'])} removidos")
+        return
+    
     medicamentos = process_anvisa_data()
     save_anvisa_medicamentos(medicamentos)
     print("Processamento concluído!")
@@ -0,0 +1,183 @@
+"""
+Métricas no formato de texto do Prometheus (GET /metrics), sem dependência externa.
+Contadores e histogramas com rótulos; cada observação custa um lock e uma busca binária nos limites,
+então a instrumentação pode ficar ligada em produção.
+"""
+import os # RSS do processo via /proc
+import time # Cronômetro dos histogramas
+import threading # Observações vindas de várias threads
+from bisect import bisect_left # Bucket de cada observação
+from contextlib import contextmanager # Cronômetro como bloco
+
+# Limites (segundos) dos histogramas de latência: de 0,5 ms (etapas da busca) até minutos (análises com IA)
+LIMITES_LATENCIA_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores)) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{nome}="{escapar(valor)}"' for nome, valor in pares) + "}"
+
+def _formatar_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class Contador:
+    """Valor que só cresce (requisições, acertos de cache)"""
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(rotulos.get(r, "") for r in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def exportar(self):
+        with self._lock:
+            valores = dict(self._valores)
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(v)}" for chave, v in valores.items()]
+
+class Histograma:
+    """Distribuição de durações em buckets cumulativos, com soma e contagem"""
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_LATENCIA_S):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.limites = tuple(limites)
+        self._series = {} # rótulos -> [contagens por bucket (+Inf no fim), soma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(rotulos.get(r, "") for r in self.rotulos)
+        posicao = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][posicao] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def exportar(self):
+        with self._lock:
+            series = {chave: (list(contagens), soma) for chave, (contagens, soma) in self._series.items()}
+        linhas = []
+        for chave, (contagens, soma) in series.items():
+            acumulado = 0
+            for limite, n in zip(self.limites + (float("inf"),), contagens):
+                acumulado += n
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, ('le', _formatar_numero(limite)))} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(self.rotulos, chave)} {acumulado}")
+        return linhas
+
+class Medidor:
+    """Valor lido na hora da coleta: funcao() devolve um número ou {(valores dos rótulos): número}"""
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, funcao, rotulos=()):
+        self.nome, self.ajuda, self.rotulos, self.funcao = nome, ajuda, tuple(rotulos), funcao
+
+    def exportar(self):
+        valores = self.funcao()
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(v)}"
+                for chave, v in valores.items() if v is not None]
+
+class ContadorLido(Medidor):
+    """Contador mantido por outro módulo (acertos de cache), lido na hora da coleta como o Medidor"""
+    tipo = "counter"
+
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, metrica):
+        """Registra (ou devolve a já registrada com o mesmo nome, para reimportações do módulo)"""
+        with self._lock:
+            return self._metricas.setdefault(metrica.nome, metrica)
+
+    def exportar(self):
+        """Todas as métricas no formato de texto do Prometheus; um medidor com erro não derruba a coleta"""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        for metrica in metricas:
+            try:
+                amostras = metrica.exportar()
+            except Exception:
+                continue
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(amostras)
+        return "\n".join(linhas) + "\n"
+
+registro = RegistroMetricas()
+
+def memoria_rss_bytes():
+    """RSS atual do processo (Linux: /proc/self/statm); em outros sistemas, o pico via resource"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource # Fallback fora do Linux (ru_maxrss em KB no Linux, bytes no macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# Métricas compartilhadas pelos módulos (API, banco vetorial, análises)
+requisicoes_http = registro.registrar(Contador(
+    "medai_http_requisicoes_total", "Requisições HTTP por rota e status", ("metodo", "rota", "status")))
+duracao_http = registro.registrar(Histograma(
+    "medai_http_duracao_segundos", "Latência das requisições HTTP por rota", ("metodo", "rota")))
+etapas_busca = registro.registrar(Histograma(
+    "medai_busca_etapa_segundos", "Tempo de cada etapa da busca (encode, faiss, materializacao, serializacao)", ("etapa",)))
+duracao_analises = registro.registrar(Histograma(
+    "medai_analise_duracao_segundos", "Duração das análises com IA por modo e status", ("modo", "status")))
+tokens_analises = registro.registrar(Contador(
+    "medai_analise_tokens_total", "Tokens gastos pelas análises com IA", ("tipo",)))
+registro.registrar(Medidor(
+    "medai_processo_memoria_rss_bytes", "Memória residente do processo", memoria_rss_bytes))
+
+class MiddlewareMetricas:
+    """Conta requisições e mede latência por rota (o template da rota, não o caminho, para não explodir rótulos)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        estado = {"status": 500}
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                estado["status"] = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            rota = scope.get("route")
+            rota = getattr(rota, "path", None) or "nao_encontrada"
+            metodo = scope.get("method", "")
+            requisicoes_http.inc(metodo=metodo, rota=rota, status=str(estado["status"]))
+            duracao_http.observar(time.perf_counter() - inicio, metodo=metodo, rota=rota)
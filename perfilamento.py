@@ -0,0 +1,265 @@
+"""
+Perfilamento sob demanda das requisições: cProfile ou amostragem de pilhas (estilo py-spy) de uma requisição
+pedida pelo cabeçalho X-MedAI-Perfil, ou de uma fração das requisições das rotas configuradas (sempre por
+amostragem: o cProfile registra tudo o que roda na thread do event loop, inclusive outras requisições).
+Os perfis ficam num buffer circular e saem pelos endpoints /admin/perfis em pstats ou speedscope.
+Desligado (sem MEDAI_PERFIL_TOKEN), o middleware só repassa a requisição.
+"""
+import os # Configurações via .env
+import sys # Pilhas de todas as threads (sys._current_frames)
+import hmac # Comparação do token em tempo constante
+import time # Duração e intervalo da amostragem
+import uuid # Id dos perfis
+import random # Amostragem de uma fração das requisições
+import marshal # Formato binário do pstats (mesmo do Stats.dump_stats)
+import cProfile # Perfil determinístico da thread do event loop
+import threading # Thread de amostragem e buffer compartilhado
+from collections import Counter, deque # Pilhas amostradas e buffer circular
+
+TOKEN_PERFIL = os.getenv('MEDAI_PERFIL_TOKEN', '')
+FRACAO_AMOSTRAGEM = float(os.getenv('MEDAI_PERFIL_FRACAO', '0'))
+MODO_PERFIL = os.getenv('MEDAI_PERFIL_MODO', 'amostragem')
+ROTAS_AMOSTRADAS = tuple(r.strip() for r in os.getenv('MEDAI_PERFIL_ROTAS', '/busca_simples,/analisar_sintomas').split(',') if r.strip())
+MAX_PERFIS = int(os.getenv('MEDAI_PERFIL_MAX', '20'))
+INTERVALO_AMOSTRAGEM_MS = float(os.getenv('MEDAI_PERFIL_INTERVALO_MS', '5'))
+
+# cProfile só enxerga a thread do event loop (endpoints async como o /busca_simples), mas enxerga todas as
+# corrotinas dela: o que outras requisições concorrentes executam no loop durante a captura entra no perfil.
+# A amostragem pega todas as threads, inclusive as do threadpool onde rodam as análises com IA
+MODOS_PERFIL = ("cprofile", "amostragem")
+DESCRICAO_MODOS = {
+    "cprofile": "Só pelo cabeçalho; perfila a thread do event loop inteira (inclui outras requisições concorrentes)",
+    "amostragem": "Pilhas de todas as threads; único modo usado na fração das requisições"
+}
+CABECALHO_PERFIL = b"x-medai-perfil"
+CABECALHO_TOKEN = b"x-medai-perfil-token"
+PREFIXO_ADMIN = "/admin/perfis"
+
+class Perfil:
+    """Perfil de uma requisição: stats do cProfile ou contagem de pilhas amostradas"""
+
+    def __init__(self, modo, metodo, rota, origem, intervalo_ms=INTERVALO_AMOSTRAGEM_MS):
+        self.id = uuid.uuid4().hex[:12]
+        self.modo, self.metodo, self.rota, self.origem = modo, metodo, rota, origem
+        self.criado_em = time.time()
+        self.status = None
+        self.duracao_ms = None
+        self.stats = None # cProfile: {(arquivo, linha, função): (cc, nc, tt, ct, chamadores)}
+        self.pilhas = None # amostragem: Counter {(thread, (arquivo, linha, função), ...): amostras}
+        self.intervalo_s = intervalo_ms / 1000
+
+    def resumo(self):
+        return {
+            "id": self.id, "modo": self.modo, "metodo": self.metodo, "rota": self.rota, "origem": self.origem,
+            "status": self.status, "duracao_ms": self.duracao_ms,
+            "criado_em": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.criado_em)),
+            "amostras": sum(self.pilhas.values()) if self.pilhas is not None else None
+        }
+
+    def _stats_amostragem(self):
+        """pstats a partir das pilhas: tempo próprio na folha, acumulado uma vez por pilha em cada função"""
+        stats = {}
+        for (_, *quadros), n in self.pilhas.items():
+            tempo = n * self.intervalo_s
+            for i, quadro in enumerate(quadros):
+                cc, nc, tt, ct, chamadores = stats.get(quadro, (0, 0, 0.0, 0.0, {}))
+                folha = i == len(quadros) - 1
+                if quadro not in quadros[i + 1:]: # recursão conta uma vez
+                    cc, nc, ct = cc + n, nc + n, ct + tempo
+                if folha:
+                    tt += tempo
+                if i:
+                    anterior = chamadores.get(quadros[i - 1], (0, 0, 0.0, 0.0))
+                    chamadores[quadros[i - 1]] = (anterior[0] + n, anterior[1] + n,
+                                                  anterior[2] + (tempo if folha else 0.0), anterior[3] + tempo)
+                stats[quadro] = (cc, nc, tt, ct, chamadores)
+        return stats
+
+    def pstats(self):
+        """Arquivo .pstats (abra com pstats.Stats, snakeviz ou tuna)"""
+        return marshal.dumps(self.stats if self.modo == "cprofile" else self._stats_amostragem())
+
+    def speedscope(self):
+        """Perfil amostrado no formato do speedscope.app, um perfil por thread"""
+        if self.modo != "amostragem":
+            raise ValueError("Perfis cProfile não têm pilhas completas; baixe em formato pstats")
+        quadros, indices = [], {}
+        por_thread = {}
+        for (thread, *pilha), n in self.pilhas.items():
+            amostra = []
+            for arquivo, linha, funcao in pilha:
+                chave = (arquivo, linha, funcao)
+                if chave not in indices:
+                    indices[chave] = len(quadros)
+                    quadros.append({"name": funcao, "file": arquivo, "line": linha})
+                amostra.append(indices[chave])
+            por_thread.setdefault(thread, []).append((amostra, n * self.intervalo_s * 1000))
+
+        perfis = []
+        for thread, amostras in sorted(por_thread.items()):
+            total = sum(peso for _, peso in amostras)
+            perfis.append({"type": "sampled", "name": thread, "unit": "milliseconds", "startValue": 0,
+                           "endValue": total, "samples": [a for a, _ in amostras], "weights": [p for _, p in amostras]})
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.metodo} {self.rota} ({self.id})",
+            "exporter": "medai",
+            "activeProfileIndex": 0,
+            "shared": {"frames": quadros},
+            "profiles": perfis
+        }
+
+class Amostrador(threading.Thread):
+    """Lê as pilhas de todas as threads a cada intervalo e conta pilhas iguais"""
+
+    def __init__(self, intervalo_s):
+        super().__init__(name="perfil_amostragem", daemon=True)
+        self.intervalo_s = intervalo_s
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        proprio = threading.get_ident()
+        while True: # Primeira amostra na hora: requisições curtas ainda saem com alguma pilha
+            nomes = {t.ident: t.name for t in threading.enumerate()}
+            for ident, quadro in sys._current_frames().items():
+                if ident == proprio:
+                    continue
+                pilha = []
+                while quadro is not None:
+                    codigo = quadro.f_code
+                    pilha.append((codigo.co_filename, codigo.co_firstlineno, codigo.co_name))
+                    quadro = quadro.f_back
+                self.pilhas[(nomes.get(ident, str(ident)), *reversed(pilha))] += 1
+            if self._parar.wait(self.intervalo_s):
+                break
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+class Perfilador:
+    """Configuração, buffer circular dos perfis e captura (uma de cada vez, para limitar o custo)"""
+
+    def __init__(self, token=TOKEN_PERFIL, fracao=FRACAO_AMOSTRAGEM, modo=MODO_PERFIL, rotas=ROTAS_AMOSTRADAS,
+                 max_perfis=MAX_PERFIS, intervalo_ms=INTERVALO_AMOSTRAGEM_MS):
+        self.token = token
+        self.perfis = deque(maxlen=max_perfis)
+        self.intervalo_ms = intervalo_ms
+        self._lock = threading.Lock()
+        self._capturando = threading.Lock()
+        self.configurar(fracao=fracao, modo=modo, rotas=rotas)
+
+    @property
+    def habilitado(self):
+        return bool(self.token)
+
+    def token_valido(self, token):
+        return self.habilitado and bool(token) and hmac.compare_digest(str(token), self.token)
+
+    def configurar(self, fracao=None, modo=None, rotas=None):
+        """Toggle do admin: fração das requisições perfiladas, modo padrão do cabeçalho e rotas elegíveis à amostragem"""
+        if fracao is not None:
+            if not 0 <= fracao <= 1:
+                raise ValueError("A fração deve estar entre 0 e 1")
+            self.fracao = fracao
+        if modo is not None:
+            if modo not in MODOS_PERFIL:
+                raise ValueError(f"Modo de perfil desconhecido: {modo}. Válidos: {', '.join(MODOS_PERFIL)}")
+            self.modo = modo
+        if rotas is not None:
+            self.rotas = tuple(rotas)
+        return self.configuracao()
+
+    def configuracao(self):
+        return {"habilitado": self.habilitado, "fracao": self.fracao, "modo": self.modo, "rotas": list(self.rotas),
+                "intervalo_ms": self.intervalo_ms, "max_perfis": self.perfis.maxlen, "modos": DESCRICAO_MODOS}
+
+    def decidir(self, scope):
+        """
+        (modo, origem) se esta requisição deve ser perfilada, senão None. O modo configurado vale só para o
+        cabeçalho sem modo válido; a fração das requisições usa sempre amostragem, porque um cProfile ligado no
+        event loop mistura no perfil as corrotinas de todas as requisições atendidas durante a captura.
+        """
+        caminho = scope["path"]
+        if caminho.startswith(PREFIXO_ADMIN):
+            return None
+        pedido = token = None
+        for nome, valor in scope["headers"]:
+            if nome == CABECALHO_PERFIL:
+                pedido = valor.decode("latin-1").strip().lower()
+            elif nome == CABECALHO_TOKEN:
+                token = valor.decode("latin-1")
+        if pedido and self.token_valido(token):
+            return (pedido if pedido in MODOS_PERFIL else self.modo), "cabecalho"
+        if self.fracao and caminho in self.rotas and random.random() < self.fracao:
+            return "amostragem", "amostragem"
+        return None
+
+    def guardar(self, perfil):
+        with self._lock:
+            self.perfis.append(perfil)
+
+    def listar(self):
+        with self._lock:
+            return [p.resumo() for p in reversed(self.perfis)]
+
+    def obter(self, perfil_id):
+        with self._lock:
+            return next((p for p in self.perfis if p.id == perfil_id), None)
+
+perfilador = Perfilador()
+
+class MiddlewarePerfil:
+    """
+    Perfila a requisição inteira (roteamento, endpoint e envio da resposta) e devolve X-MedAI-Perfil-Id.
+    No modo cprofile o perfil é da thread do event loop, não da requisição: as outras corrotinas que rodam
+    no loop enquanto ela aguarda entram junto, então use-o com a API sem carga concorrente.
+    """
+
+    def __init__(self, app, perfilador=perfilador):
+        self.app = app
+        self.perfilador = perfilador
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.perfilador.habilitado:
+            await self.app(scope, receive, send)
+            return
+        decisao = self.perfilador.decidir(scope)
+        # Uma captura por vez: outra requisição pedida no meio segue sem perfil
+        if decisao is None or not self.perfilador._capturando.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        modo, origem = decisao
+        perfil = Perfil(modo, scope.get("method", ""), scope["path"], origem, self.perfilador.intervalo_ms)
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                perfil.status = mensagem["status"]
+                mensagem = {**mensagem, "headers": [*mensagem.get("headers", []), (b"x-medai-perfil-id", perfil.id.encode())]}
+            await send(mensagem)
+
+        inicio = time.perf_counter()
+        try:
+            if modo == "cprofile":
+                perfilador_c = cProfile.Profile()
+                perfilador_c.enable()
+                try:
+                    await self.app(scope, receive, enviar)
+                finally:
+                    perfilador_c.disable()
+                    perfilador_c.create_stats()
+                    perfil.stats = perfilador_c.stats
+            else:
+                amostrador = Amostrador(self.perfilador.intervalo_ms / 1000)
+                amostrador.start()
+                try:
+                    await self.app(scope, receive, enviar)
+                finally:
+                    amostrador.parar()
+                    perfil.pilhas = amostrador.pilhas
+        finally:
+            perfil.duracao_ms = round((time.perf_counter() - inicio) * 1000, 2)
+            self.perfilador.guardar(perfil)
+            self.perfilador._capturando.release()
@@ -0,0 +1,244 @@
+"""
+Rastreio por análise: tempos por tarefa/ferramenta/etapa, tokens por agente, buscas web e cache.
+O registro da análise atual fica em um ContextVar, então ferramentas e caches registram nele sem
+receber parâmetros extras; análises simultâneas (threads diferentes) nunca se misturam.
+"""
+import os # Preços por token via .env
+import time # Duração dos spans
+import threading # Ferramentas em threads auxiliares e agregação global
+from contextvars import ContextVar # Registro da análise atual
+from contextlib import contextmanager, nullcontext # Spans opcionais
+from collections import deque, defaultdict # Rastreios recentes e totais por nome
+import metricas # Duração e tokens das análises no GET /metrics
+
+# Preço em USD por 1M de tokens (padrão: Gemini 2.0 Flash)
+CUSTO_PROMPT_1M = float(os.getenv('MEDAI_CUSTO_PROMPT_1M', '0.10'))
+CUSTO_COMPLETION_1M = float(os.getenv('MEDAI_CUSTO_COMPLETION_1M', '0.40'))
+
+MAX_SPANS_POR_ANALISE = 200
+RASTREIOS_RECENTES = 50
+
+CAMPOS_TOKENS = ("prompt_tokens", "completion_tokens", "cached_prompt_tokens", "total_tokens", "successful_requests")
+
+_registro_atual = ContextVar('rastreio_analise', default=None)
+
+def custo_estimado(tokens):
+    return round(tokens.get("prompt_tokens", 0) / 1e6 * CUSTO_PROMPT_1M
+                 + tokens.get("completion_tokens", 0) / 1e6 * CUSTO_COMPLETION_1M, 6)
+
+class RegistroAnalise:
+    """Tudo o que aconteceu em uma análise"""
+
+    def __init__(self, modo):
+        self.modo = modo
+        self.status = None
+        self.cache = None
+        self.inicio = time.perf_counter()
+        self.duracao_ms = None
+        self.spans = [] # {"tipo", "nome", "inicio_ms", "duracao_ms", ...}
+        self.contadores = defaultdict(lambda: defaultdict(int)) # grupo -> chave -> n
+        self.tokens_por_agente = {}
+        self.marcos = {} # nome -> ms desde o início (ex.: primeiro_token)
+        self._lock = threading.Lock()
+
+    def _ms_desde_inicio(self, instante):
+        return round((instante - self.inicio) * 1000, 2)
+
+    def adicionar_span(self, tipo, nome, inicio, fim, **atributos):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_POR_ANALISE:
+                self.spans.append({"tipo": tipo, "nome": nome, "inicio_ms": self._ms_desde_inicio(inicio),
+                                   "duracao_ms": round((fim - inicio) * 1000, 2), **atributos})
+
+    @contextmanager
+    def span(self, tipo, nome, **atributos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.adicionar_span(tipo, nome, inicio, time.perf_counter(), **atributos)
+
+    def marcar(self, nome):
+        """Marca o instante de um acontecimento único da análise (o primeiro registro vale)"""
+        with self._lock:
+            self.marcos.setdefault(nome, self._ms_desde_inicio(time.perf_counter()))
+
+    def contar(self, grupo, chave, n=1):
+        with self._lock:
+            self.contadores[grupo][chave] += n
+
+    def registrar_tokens(self, agente, uso):
+        with self._lock:
+            atual = self.tokens_por_agente.setdefault(agente, dict.fromkeys(CAMPOS_TOKENS, 0))
+            for campo in CAMPOS_TOKENS:
+                atual[campo] += int(uso.get(campo, 0) or 0)
+
+    def finalizar(self, status, cache=None):
+        self.status = status
+        self.cache = cache
+        self.duracao_ms = self._ms_desde_inicio(time.perf_counter())
+
+    def resumo(self):
+        """Rastreio em JSON: totais de tokens e custo, tarefas com tempo aproximado de LLM, ferramentas e contadores"""
+        with self._lock:
+            spans = list(self.spans)
+            contadores = {grupo: dict(valores) for grupo, valores in self.contadores.items()}
+            por_agente = {agente: dict(uso) for agente, uso in self.tokens_por_agente.items()}
+
+        tokens = dict.fromkeys(CAMPOS_TOKENS, 0)
+        for uso in por_agente.values():
+            for campo in CAMPOS_TOKENS:
+                tokens[campo] += uso[campo]
+
+        ferramentas = [s for s in spans if s["tipo"] == "ferramenta"]
+        tarefas = []
+        for s in (s for s in spans if s["tipo"] == "tarefa"):
+            # Tempo de LLM ~ duração da tarefa menos as ferramentas chamadas dentro dela
+            fim = s["inicio_ms"] + s["duracao_ms"]
+            em_ferramentas = sum(f["duracao_ms"] for f in ferramentas if s["inicio_ms"] <= f["inicio_ms"] < fim)
+            tarefas.append({**s, "ferramentas_ms": round(em_ferramentas, 2),
+                            "llm_ms_aprox": round(s["duracao_ms"] - em_ferramentas, 2)})
+
+        por_ferramenta = {}
+        for f in ferramentas:
+            total = por_ferramenta.setdefault(f["nome"], {"chamadas": 0, "total_ms": 0.0})
+            total["chamadas"] += 1
+            total["total_ms"] = round(total["total_ms"] + f["duracao_ms"], 2)
+
+        return {
+            "modo": self.modo,
+            "status": self.status,
+            "cache": self.cache,
+            "duracao_ms": self.duracao_ms,
+            "tokens": tokens,
+            "tokens_por_agente": por_agente,
+            "custo_estimado_usd": custo_estimado(tokens),
+            "tarefas": tarefas,
+            "ferramentas": por_ferramenta,
+            "etapas": [s for s in spans if s["tipo"] == "etapa"],
+            "marcos": dict(self.marcos),
+            "contadores": contadores
+        }
+
+def atual():
+    """Registro da análise em andamento neste contexto (ou None)"""
+    return _registro_atual.get()
+
+def span(tipo, nome, **atributos):
+    """Span no registro atual; sem análise em andamento não faz nada"""
+    registro = _registro_atual.get()
+    return registro.span(tipo, nome, **atributos) if registro else nullcontext()
+
+def contar(grupo, chave, n=1):
+    registro = _registro_atual.get()
+    if registro:
+        registro.contar(grupo, chave, n)
+
+class AgregadorRastreios:
+    """Totais de todas as análises do processo, para achar quais tarefas e ferramentas dominam custo e latência"""
+
+    def __init__(self, recentes=RASTREIOS_RECENTES):
+        self.recentes = deque(maxlen=recentes)
+        self._lock = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        with self._lock:
+            self.analises = 0
+            self.por_status = defaultdict(int)
+            self.por_modo = defaultdict(int)
+            self.por_cache = defaultdict(int)
+            self.tokens = dict.fromkeys(CAMPOS_TOKENS, 0)
+            self.custo_usd = 0.0
+            self.duracao_total_ms = 0.0
+            self.por_tarefa = defaultdict(lambda: {"execucoes": 0, "total_ms": 0.0, "llm_ms_aprox": 0.0, "max_ms": 0.0})
+            self.por_ferramenta = defaultdict(lambda: {"chamadas": 0, "total_ms": 0.0})
+            self.tokens_por_agente = defaultdict(lambda: dict.fromkeys(CAMPOS_TOKENS, 0))
+            self.contadores = defaultdict(lambda: defaultdict(int))
+            self.marcos = defaultdict(lambda: {"n": 0, "total_ms": 0.0, "max_ms": 0.0})
+            self.recentes.clear()
+
+    def registrar(self, resumo):
+        with self._lock:
+            self.analises += 1
+            self.por_status[resumo["status"]] += 1
+            self.por_modo[resumo["modo"]] += 1
+            self.por_cache[resumo["cache"]] += 1
+            self.custo_usd += resumo["custo_estimado_usd"]
+            self.duracao_total_ms += resumo["duracao_ms"] or 0.0
+            for campo in CAMPOS_TOKENS:
+                self.tokens[campo] += resumo["tokens"][campo]
+            for agente, uso in resumo["tokens_por_agente"].items():
+                for campo in CAMPOS_TOKENS:
+                    self.tokens_por_agente[agente][campo] += uso[campo]
+            for tarefa in resumo["tarefas"]:
+                total = self.por_tarefa[tarefa.get("agente", tarefa["nome"])]
+                total["execucoes"] += 1
+                total["total_ms"] += tarefa["duracao_ms"]
+                total["llm_ms_aprox"] += tarefa["llm_ms_aprox"]
+                total["max_ms"] = max(total["max_ms"], tarefa["duracao_ms"])
+            for nome, uso in resumo["ferramentas"].items():
+                self.por_ferramenta[nome]["chamadas"] += uso["chamadas"]
+                self.por_ferramenta[nome]["total_ms"] += uso["total_ms"]
+            for grupo, valores in resumo["contadores"].items():
+                for chave, n in valores.items():
+                    self.contadores[grupo][chave] += n
+            for nome, ms in resumo["marcos"].items():
+                marco = self.marcos[nome]
+                marco["n"] += 1
+                marco["total_ms"] += ms
+                marco["max_ms"] = max(marco["max_ms"], ms)
+            self.recentes.append(resumo)
+
+    def estatisticas(self, incluir_recentes=False):
+        with self._lock:
+            n = self.analises
+            dados = {
+                "analises": n,
+                "por_status": dict(self.por_status),
+                "por_modo": dict(self.por_modo),
+                "por_cache": dict(self.por_cache),
+                "duracao_media_ms": round(self.duracao_total_ms / n, 2) if n else 0.0,
+                "tokens": dict(self.tokens),
+                "tokens_medios_por_analise": round(self.tokens["total_tokens"] / n, 1) if n else 0.0,
+                "tokens_por_agente": {a: dict(u) for a, u in self.tokens_por_agente.items()},
+                "custo_total_usd": round(self.custo_usd, 6),
+                "custo_medio_usd": round(self.custo_usd / n, 6) if n else 0.0,
+                "tarefas": {
+                    nome: {**t, "media_ms": round(t["total_ms"] / t["execucoes"], 2),
+                           "total_ms": round(t["total_ms"], 2), "llm_ms_aprox": round(t["llm_ms_aprox"], 2)}
+                    for nome, t in self.por_tarefa.items()
+                },
+                "ferramentas": {
+                    nome: {**f, "media_ms": round(f["total_ms"] / f["chamadas"], 2), "total_ms": round(f["total_ms"], 2)}
+                    for nome, f in self.por_ferramenta.items()
+                },
+                "contadores": {grupo: dict(valores) for grupo, valores in self.contadores.items()},
+                # Ex.: primeiro_token = tempo até o primeiro byte útil do relatório
+                "marcos": {
+                    nome: {"n": m["n"], "media_ms": round(m["total_ms"] / m["n"], 2), "max_ms": round(m["max_ms"], 2)}
+                    for nome, m in self.marcos.items()
+                }
+            }
+            if incluir_recentes:
+                dados["recentes"] = list(self.recentes)
+        return dados
+
+agregador = AgregadorRastreios()
+
+@contextmanager
+def rastrear(modo):
+    """Abre o registro da análise no contexto atual e, ao sair, soma o resumo no agregador"""
+    registro = RegistroAnalise(modo)
+    token = _registro_atual.set(registro)
+    try:
+        yield registro
+    finally:
+        _registro_atual.reset(token)
+        if registro.duracao_ms is None:
+            registro.finalizar("erro")
+        resumo = registro.resumo()
+        agregador.registrar(resumo)
+        metricas.duracao_analises.observar(registro.duracao_ms / 1000, modo=str(registro.modo), status=str(registro.status))
+        metricas.tokens_analises.inc(resumo["tokens"]["prompt_tokens"], tipo="prompt")
+        metricas.tokens_analises.inc(resumo["tokens"]["completion_tokens"], tipo="completion")
@@ -0,0 +1,64 @@
+"""
+Respostas HTTP enxutas da API: JSON com orjson (quando instalado), compressão gzip sem tocar nos streams SSE,
+projeção de campos e ETag por versão do índice para consultas que só mudam quando o índice muda.
+"""
+import json # Serialização padrão quando orjson não está instalado
+import hashlib # ETag
+from fastapi.responses import JSONResponse # Base da resposta JSON
+from starlette.middleware.gzip import GZipMiddleware # Compressão gzip
+
+try:
+    import orjson # Serialização JSON bem mais rápida, aceita tipos numpy (opcional)
+except ImportError:
+    orjson = None
+
+# Respostas menores que isso não compensam comprimir
+TAMANHO_MINIMO_COMPRESSAO = 1000
+
+class RespostaJSON(JSONResponse):
+    """
+    JSON com orjson quando disponível, senão json padrão compacto. Devolver esta resposta direto no
+    endpoint também pula o jsonable_encoder do FastAPI, que é a parte cara em listas de resultados.
+    """
+
+    def render(self, content):
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class CompressaoGzip:
+    """GZipMiddleware para tudo, menos os streams de eventos: eles precisam sair evento a evento, sem buffer"""
+
+    def __init__(self, app, minimum_size=TAMANHO_MINIMO_COMPRESSAO):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/eventos"):
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+def validar_campos(campos, validos):
+    """Levanta ValueError se algum campo pedido não existe na resposta"""
+    desconhecidos = [campo for campo in campos or [] if campo not in validos]
+    if desconhecidos:
+        raise ValueError(f"Campos desconhecidos: {', '.join(desconhecidos)}. Válidos: {', '.join(validos)}")
+
+def projetar(item, campos):
+    """Só os campos pedidos (na ordem da resposta original); sem campos, o item inteiro"""
+    if not campos:
+        return item
+    return {chave: valor for chave, valor in item.items() if chave in campos}
+
+def calcular_etag(versao_indice, *partes):
+    """ETag forte: mesma versão do índice e mesma consulta produzem a mesma resposta"""
+    assinatura = "|".join([str(versao_indice), *(str(p) for p in partes)])
+    return '"' + hashlib.sha1(assinatura.encode("utf-8")).hexdigest()[:16] + '"'
+
+def etag_confere(if_none_match, etag):
+    """If-None-Match pode trazer várias ETags, fracas (W/) ou '*'"""
+    if not if_none_match:
+        return False
+    candidatas = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatas or any(c.removeprefix("W/") == etag for c in candidatas)
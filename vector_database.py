@@ -1,74 +1,341 @@
 """
 Módulo do banco vetorial FAISS, usando csv do limpeza.py
 """
+import os # Configurações via variáveis de ambiente
+import re # Contagem aproximada de tokens quando o modelo não tem tokenizer
+import logging # Estatísticas de tokens na construção do índice
+import time # Vazão da geração de embeddings
+import hashlib # Versão do índice
+from string import Formatter # Interpretar o template de texto para embeddings
 import pandas as pd # Para carregar CSV e manipular dataFrame
 import numpy as np # Conversões para FAISS (dtype=np.float32)
 import faiss # Banco vetorial que vamos usar localmente
-from sentence_transformers import SentenceTransformer # Para carregar modelo e gerar embeddings
+from categorias import categorizar_classes, categoria_principal, nomes_da_mascara, mascara_de_nomes, NOMES_CATEGORIAS # Categorias multi-rótulo
+from categorias import classificar_risco, VERSAO_REGRAS_RISCO # Regras de risco/receita por categoria
+from autocompletar import construir_indice_prefixos, normalizar # Sugestões de nomes por prefixo e nomes normalizados
+import metricas # Tempo de cada etapa da busca (GET /metrics)
+
+# Corpus disponíveis: agregado por princípio ativo (padrão) ou uma linha por registro de produto
+CORPUS_PATHS = {
+    'principio': 'anvisa_medicamentos.csv',
+    'produto': 'anvisa_produtos.csv'
+}
+
+# Tipo de índice FAISS: 'flat' (exato) ou 'hnsw' (aproximado, para corpus grandes)
+TIPO_INDICE = os.getenv('MEDAI_INDICE_FAISS', 'flat')
+
+# Template do texto enviado ao modelo; campos entre chaves são colunas do CSV processado
+TEMPLATE_EMBEDDING = os.getenv('MEDAI_TEMPLATE_EMBEDDING', '{texto_completo_busca}')
+
+# Janela de tokens do all-MiniLM-L6-v2 (usada se o modelo não informar max_seq_length)
+MAX_TOKENS_PADRAO = 256
+
+# Geração de embeddings em lotes por tamanho: orçamento de tokens (linhas x maior linha) por lote
+TOKENS_POR_LOTE = int(os.getenv('MEDAI_TOKENS_POR_LOTE', '8192'))
+MAX_LINHAS_LOTE = 256
+
+logger = logging.getLogger(__name__)
+
+# No corpus por produto, quantos vizinhos buscar por resultado antes de deduplicar por princípio
+FATOR_SOBREAMOSTRAGEM = 8
+
+# Campos de cada resultado de search_medicamentos e de get_medicamento_detalhes (projeção na API)
+CAMPOS_BUSCA = ("indice", "distancia", "similaridade", "principio_ativo", "categoria_terapeutica", "categorias",
+                "nivel_risco", "requer_receita", "popularidade", "total_produtos", "texto_busca", "produtos_exemplo",
+                "empresas_exemplo", "produtos_encontrados", "numero_registro")
+CAMPOS_DETALHES = ("principio_ativo", "categoria_terapeutica", "categorias", "nivel_risco", "requer_receita",
+                   "popularidade_mercado", "total_produtos", "diversidade_formulacoes", "produtos_exemplo",
+                   "empresas_exemplo", "texto_completo")
+# Muda quando a regra de busca por nome muda, para invalidar ETags de respostas de detalhes antigas
+VERSAO_BUSCA_DETALHES = 2
+
+# Tamanho dos rankings pré-calculados nas estatísticas do corpus (princípios e fabricantes)
+TOP_ESTATISTICAS = 20
 
 class AnvisaVectorDB:
     """gerenciar banco vetorial"""
     
-    def __init__(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2') # Modelo escolhido
+    def __init__(self, model=None, tipo_indice=TIPO_INDICE):
+        if model is None:
+            from sentence_transformers import SentenceTransformer # Para carregar modelo e gerar embeddings
+            model = SentenceTransformer('all-MiniLM-L6-v2') # Modelo escolhido
+        self.model = model
+        self.tipo_indice = tipo_indice
         self.df = None # dados do CSV
         self.embeddings = None # armazena embeddings dos medicamentos
         self.index = None # índice FAISS 
         self.processado = None # dataFrame para geração de embeddings
+        self.tokens_por_linha = None # tamanho em tokens do texto de cada linha (após truncamento)
+        self.linhas_por_segundo = None # vazão da última geração de embeddings
+        self.por_produto = False # True quando o corpus tem uma linha por registro de produto
+        self.principio_codigos = None # código inteiro do princípio ativo de cada linha (deduplicação)
+        self.categorias_mask = None # bitset de categorias de cada linha (np.uint16), usado como filtro
+        self.versao_indice = None # muda quando textos, template, modelo ou tipo de índice mudam (chave de caches)
+        self.estatisticas = None # agregados do corpus inteiro, calculados uma vez por carga (GET /estatisticas)
+        self.indice_prefixos = None # nomes de princípios e produtos para autocompletar (GET /autocomplete)
+        self.linhas_por_nome = None # nome normalizado (princípio ou produto) -> primeira linha, para busca exata
         
     def load_data(self, csv_path):
         """Carrega dados do CSV processado e cria banco vetorial completo"""
-        self.df = pd.read_csv(csv_path)
-        
-        # Criar converte cada linha em dicionário para embeddings
-        self.processado = pd.DataFrame(columns=['processado'])
-        self.processado['processado'] = self.df.apply(lambda row: {
-            "principio_ativo": str(row.get('principio_ativo_limpo', '')), # Nome limpo sem acentos/caracteres especiais
-            "categoria_terapeutica": str(row.get('categoria_terapeutica', '')), # Categoria padronizada (antibiotico, analgesico, etc)
-            "texto_busca": str(row.get('texto_completo_busca', '')),
-            "popularidade": str(row.get('popularidade_mercado', '')), # baseado em qtd produtos
-            "total_produtos": str(row.get('total_produtos_registrados', 0)) 
-        }, axis=1)
+        self.load_dataframe(pd.read_csv(csv_path))
+    
+    def load_dataframe(self, df, template=TEMPLATE_EMBEDDING):
+        """Cria banco vetorial a partir de um DataFrame já no formato do limpeza.py"""
+        if df.empty:
+            raise ValueError("Corpus vazio: nenhuma linha para gerar embeddings e indexar")
+        self.df = df.reset_index(drop=True)
+        
+        # Corpus por produto: várias linhas por princípio, deduplicadas na busca
+        self.por_produto = 'numero_registro' in self.df.columns
+        self.principio_codigos = pd.factorize(self.df['principio_ativo_limpo'])[0]
+        self._garantir_categorias()
+        
+        # Texto de cada linha montado pelo template, vetorizado sobre as colunas
+        textos = compilar_template(template)(self.df)
+        textos, self.tokens_por_linha = self._ajustar_janela_tokens(textos.tolist())
+        self.processado = pd.DataFrame({'processado': textos})
+        self.versao_indice = calcular_versao_indice(self.processado['processado'], template, self.model, self.tipo_indice)
+        self.estatisticas = {"versao_indice": self.versao_indice, **calcular_estatisticas(self.df, self.por_produto)}
+        self.indice_prefixos = construir_indice_prefixos(self.df, self.por_produto)
+        self.linhas_por_nome = mapear_nomes(self.df, self.por_produto)
         
         # Gerar embeddings 384 dim
-        self.embeddings = self.model.encode(self.processado['processado'].tolist())
+        self.embeddings = self._encode_por_tamanho(textos, self.tokens_por_linha)
         
         # Cria índice para busca
         dim = self.embeddings.shape[1] # dim
-        self.index = faiss.IndexFlatL2(dim) # Índice Flat L2 
+        self.index = criar_indice(dim, self.tipo_indice)
         self.index.add(np.array(self.embeddings, dtype=np.float32)) # Adiciona todos os vetores ao índice
+    
+    def _garantir_categorias(self):
+        """Garante as colunas multi-rótulo; CSVs gerados antes delas são categorizados a partir do texto"""
+        csv_legado = 'categorias_mask' not in self.df.columns
+        if csv_legado:
+            # Classe terapêutica original está embutida em texto_completo_busca
+            classes = self.df['texto_completo_busca'].str.extract(r'Classe Terapeutica: (.*?) \|', expand=False)
+            classes = classes.where(~classes.isin(['nan', 'None']))
+            mascaras = categorizar_classes(classes)
+            
+            # Sem classe no texto: usa a categoria única já gravada no CSV
+            bits = {nome: 1 << bit for bit, nome in enumerate(NOMES_CATEGORIAS)}
+            legado = self.df['categoria_terapeutica'].map(bits).fillna(0).astype(np.uint16)
+            mascaras = mascaras.where(classes.notna(), legado).astype(np.uint16)
+            self.df['categorias_mask'] = mascaras
+            
+            # Recalcula a categoria principal pela prioridade da tabela; classe que não casa com nenhuma
+            # categoria vira 'Outros' (como no limpeza.py), para o rótulo nunca discordar da máscara
+            principal = mascaras.map({m: categoria_principal(m) for m in mascaras.unique()})
+            self.df['categoria_terapeutica'] = principal.where(classes.notna(), self.df['categoria_terapeutica'])
+        
+        self.categorias_mask = self.df['categorias_mask'].fillna(0).to_numpy(dtype=np.uint16)
+        if 'categorias_terapeuticas' not in self.df.columns:
+            nomes = {m: '; '.join(nomes_da_mascara(m)) for m in np.unique(self.categorias_mask)}
+            self.df['categorias_terapeuticas'] = self.df['categorias_mask'].map(nomes)
+            self.df['categorias_terapeuticas'] = self.df['categorias_terapeuticas'].where(
+                self.df['categorias_terapeuticas'] != '', self.df['categoria_terapeutica'])
+        if csv_legado:
+            self._reescrever_textos_categoria()
+        
+        # Risco e receita saem de regras fixas por categoria: calculados uma vez aqui, não pelo LLM a cada análise
+        self.df['nivel_risco'], self.df['requer_receita'] = classificar_risco(pd.Series(self.categorias_mask))
+    
+    def _reescrever_textos_categoria(self):
+        """
+        CSV legado recategorizado: troca a categoria antiga gravada nos textos (o 'Categoria: …' do texto de busca,
+        que vira embedding, e o sufixo ' - categoria' do resumo) pelas categorias recalculadas, como o limpeza.py monta
+        """
+        completo = self.df['texto_completo_busca'].astype(str)
+        partes = completo.str.extract(r'^(.*?\| Categoria: )[^|]*?( \| .*)?$')
+        self.df['texto_completo_busca'] = (partes[0] + self.df['categorias_terapeuticas'].astype(str)
+                                           + partes[1].fillna('')).where(partes[0].notna(), completo)
+        
+        if 'texto_resumo_busca' in self.df.columns:
+            resumo = self.df['texto_resumo_busca'].astype(str)
+            self.df['texto_resumo_busca'] = (resumo.str.rsplit(' - ', n=1).str[0] + ' - '
+                                             + self.df['categoria_terapeutica'].astype(str))
+    
+    def _ajustar_janela_tokens(self, textos):
+        """Trunca textos que excedem a janela do modelo e registra estatísticas de tokens por linha"""
+        max_tokens = getattr(self.model, 'max_seq_length', None) or MAX_TOKENS_PADRAO
+        tokenizer = getattr(self.model, 'tokenizer', None)
+        
+        if tokenizer is not None:
+            # Tokenização em lote (tokenizers rápidos do HuggingFace) já contando [CLS]/[SEP]
+            ids = tokenizer(textos, add_special_tokens=True, truncation=False)['input_ids']
+            tamanhos = np.fromiter((len(i) for i in ids), dtype=np.int32, count=len(ids))
+            excedentes = np.flatnonzero(tamanhos > max_tokens)
+            for i in excedentes:
+                # Mantém o início do texto (campos mais importantes primeiro no template)
+                textos[i] = tokenizer.decode(ids[i][1:max_tokens - 1])
+            tamanhos = np.minimum(tamanhos, max_tokens)
+        else:
+            # Aproximação por palavras/pontuação para encoders sem tokenizer
+            tamanhos = np.fromiter((len(re.findall(r'\w+|[^\w\s]', t)) + 2 for t in textos),
+                                   dtype=np.int32, count=len(textos))
+            excedentes = np.flatnonzero(tamanhos > max_tokens)
+            tamanhos = np.minimum(tamanhos, max_tokens)
+        
+        if len(tamanhos):
+            logger.info(
+                f"Tokens por linha: média={tamanhos.mean():.1f} p50={np.percentile(tamanhos, 50):.0f} "
+                f"p95={np.percentile(tamanhos, 95):.0f} máx={tamanhos.max()} | "
+                f"{len(excedentes)} de {len(textos)} linhas truncadas em {max_tokens} tokens"
+            )
+        return textos, tamanhos
+    
+    def _encode_por_tamanho(self, textos, tamanhos):
+        """
+        Gera embeddings em lotes de textos com tamanho parecido: o modelo preenche cada lote até
+        o maior texto, então agrupar por tamanho evita processar padding. O tamanho do lote se
+        adapta para caber em TOKENS_POR_LOTE e os vetores voltam para a ordem original.
+        """
+        inicio = time.perf_counter()
+        ordem = np.argsort(tamanhos, kind='stable')[::-1] # Mais longos primeiro
+        embeddings = None
+        
+        i = 0
+        while i < len(ordem):
+            maior = max(int(tamanhos[ordem[i]]), 1) # Lote ordenado: o primeiro é o mais longo
+            tamanho_lote = int(min(MAX_LINHAS_LOTE, max(1, TOKENS_POR_LOTE // maior)))
+            posicoes = ordem[i:i + tamanho_lote]
+            
+            vetores = np.asarray(self.model.encode(
+                [textos[p] for p in posicoes], batch_size=len(posicoes), show_progress_bar=False
+            ), dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.empty((len(textos), vetores.shape[1]), dtype=np.float32)
+            embeddings[posicoes] = vetores # Devolve cada vetor para a linha original
+            i += tamanho_lote
+        
+        duracao = time.perf_counter() - inicio
+        self.linhas_por_segundo = len(textos) / duracao if duracao > 0 else 0.0
+        logger.info(f"Embeddings: {len(textos)} linhas em {duracao:.1f}s ({self.linhas_por_segundo:.0f} linhas/s)")
+        return embeddings
+    
+    def _buscar_indices(self, query_vectors_np, top_k, mascara=0):
+        """
+        Busca no FAISS uma matriz de consultas (n x dim) e devolve os hits de cada consulta;
+        no corpus por produto agrupa por princípio ativo mantendo o melhor produto.
+        Com mascara != 0 só considera linhas com alguma das categorias (filtro aplicado dentro do FAISS).
+        """
+        params = None
+        total = self.index.ntotal
+        if mascara:
+            candidatos = np.flatnonzero(self.categorias_mask & np.uint16(mascara)).astype(np.int64)
+            if len(candidatos) == 0:
+                return [[] for _ in range(len(query_vectors_np))]
+            seletor = faiss.IDSelectorBatch(candidatos)
+            params = faiss.SearchParametersHNSW(sel=seletor) if self.tipo_indice == 'hnsw' else faiss.SearchParameters(sel=seletor)
+            total = len(candidatos)
+        
+        if not self.por_produto:
+            distances, indices = self.index.search(query_vectors_np, min(top_k, total), params=params)
+            return [[(int(idx), float(dist), []) for idx, dist in zip(linha_indices, linha_distancias) if idx >= 0]
+                    for linha_indices, linha_distancias in zip(indices, distances)]
         
-    def search_medicamentos(self, sintomas, top_k=5):
-        """Busca medicamentos usando similaridade"""
+        # Sobreamostra (todas as consultas em uma chamada) e, para as que não tiverem top_k princípios
+        # distintos, aumenta a busca individualmente até ter (ou esgotar o índice)
+        k = min(top_k * FATOR_SOBREAMOSTRAGEM, total)
+        distances, indices = self.index.search(query_vectors_np, k, params=params)
+        resultados = []
+        for i in range(len(query_vectors_np)):
+            grupos = self._agrupar_por_principio(indices[i], distances[i])
+            k_consulta = k
+            while len(grupos) < top_k and k_consulta < total:
+                k_consulta = min(k_consulta * 2, total)
+                distancias_i, indices_i = self.index.search(query_vectors_np[i:i + 1], k_consulta, params=params)
+                grupos = self._agrupar_por_principio(indices_i[0], distancias_i[0])
+            # dict preserva a ordem de inserção = ordem de similaridade do melhor produto
+            resultados.append(list(grupos.values())[:top_k])
+        return resultados
+    
+    def _agrupar_por_principio(self, indices, distances):
+        """Código do princípio -> [melhor índice, distância, produtos encontrados], na ordem de similaridade"""
+        grupos = {}
+        for idx, dist in zip(indices, distances):
+            if idx < 0:
+                continue
+            codigo = self.principio_codigos[idx]
+            if codigo not in grupos:
+                grupos[codigo] = [int(idx), float(dist), []]
+            grupos[codigo][2].append(int(idx))
+        return grupos
+    
+    def _mascara_categorias(self, categorias):
+        """Nomes de categorias -> bitset (ValueError para categoria desconhecida)"""
+        if not categorias:
+            return 0
+        try:
+            return mascara_de_nomes(categorias)
+        except KeyError as e:
+            raise ValueError(f"Categoria desconhecida: {e.args[0]}. Válidas: {', '.join(NOMES_CATEGORIAS)}")
+        
+    def search_medicamentos(self, sintomas, top_k=5, categorias=None):
+        """Busca medicamentos usando similaridade, opcionalmente restrita a categorias terapêuticas"""
         if not sintomas or not sintomas.strip():
             return []
         
+        mascara = self._mascara_categorias(categorias)
+        
         # Gerar vetor da consulta 
+        inicio = time.perf_counter()
         query_vector = self.model.encode([sintomas])[0]
         query_vector_np = np.array([query_vector], dtype=np.float32) # Converte para formato compatível com FAISS np.float32
+        fim_encode = time.perf_counter()
+        metricas.etapas_busca.observar(fim_encode - inicio, etapa="encode")
         
         # Buscar no índice vetorial - encontra medicamentos mais similares aos sintomas
-        distances, indices = self.index.search(query_vector_np, top_k) # Retorna distâncias e índices dos top_k mais similares
+        hits = self._buscar_indices(query_vector_np, top_k, mascara)[0] # (índice, distância, produtos do mesmo princípio)
+        fim_faiss = time.perf_counter()
+        metricas.etapas_busca.observar(fim_faiss - fim_encode, etapa="faiss")
+        
+        results = self._materializar(hits)
+        metricas.etapas_busca.observar(time.perf_counter() - fim_faiss, etapa="materializacao")
+        return results # Lista ordenada por similaridade (mais similar primeiro)
+    
+    def search_medicamentos_lote(self, lista_sintomas, top_k=5, categorias=None):
+        """
+        Várias consultas de uma vez: um encode em lote e uma chamada ao FAISS para todas.
+        Devolve uma lista de resultados por consulta, na mesma ordem (consulta vazia -> [])
+        """
+        mascara = self._mascara_categorias(categorias)
+        validas = [i for i, sintomas in enumerate(lista_sintomas) if sintomas and sintomas.strip()]
+        resultados = [[] for _ in lista_sintomas]
+        if not validas:
+            return resultados
         
-        # Montar resultados com informações detalhadas
+        vetores = np.asarray(self.model.encode([lista_sintomas[i] for i in validas]), dtype=np.float32)
+        for i, hits in zip(validas, self._buscar_indices(vetores, top_k, mascara)):
+            resultados[i] = self._materializar(hits)
+        return resultados
+    
+    def _materializar(self, hits):
+        """Monta os resultados com informações detalhadas a partir de (índice, distância, produtos)"""
         results = []
-        for idx, dist in zip(indices[0], distances[0]):
+        for idx, dist, produtos in hits:
             if idx >= 0 and idx < len(self.df): # Verifica se índice é válido
                 row = self.df.iloc[idx] 
-                results.append({
+                resultado = {
                     "indice": int(idx), # Posição no dataFrame
                     "distancia": float(dist), # Distância euclidiana (menor = mais similar)
                     "similaridade": float(1 / (1 + dist)), # distância baixa = similaridade alta
                     "principio_ativo": row.get('principio_ativo_limpo', ''), # Nome limpo do medicamento
                     "categoria_terapeutica": row.get('categoria_terapeutica', ''), # Categoria padronizada
+                    "categorias": nomes_da_mascara(self.categorias_mask[idx]), # Todas as categorias (multi-rótulo)
+                    "nivel_risco": row['nivel_risco'], # BAIXO/MÉDIO/ALTO pelas regras da categoria
+                    "requer_receita": bool(row['requer_receita']), # Receita obrigatória pelas regras da categoria
                     "popularidade": row.get('popularidade_mercado', ''), # Popularidade no mercado
-                    "total_produtos": row.get('total_produtos_registrados', 0), # Qtd produtos registrados
+                    "total_produtos": int(row.get('total_produtos_registrados', 0)), # Qtd produtos registrados
                     "texto_busca": row.get('texto_resumo_busca', ''), # Versão resumida para exibição
                     "produtos_exemplo": row.get('produtos_principais', ''), # Exemplos de nomes comerciais
                     "empresas_exemplo": row.get('empresas_principais', '') # Exemplos de fabricantes
-                })
-        
-        return results # Lista ordenada por similaridade (mais similar primeiro)
+                }
+                if self.por_produto:
+                    # Produtos do mesmo princípio que casaram com a consulta, do mais ao menos similar
+                    resultado["produtos_encontrados"] = self.df['nome_produto'].iloc[produtos[:5]].tolist()
+                    resultado["numero_registro"] = row.get('numero_registro', '')
+                results.append(resultado)
+        return results
     
     def get_medicamento_detalhes(self, nome_medicamento):
         """Busca detalhes completos de um medicamento específico pelo nome"""
@@ -76,31 +343,171 @@ class AnvisaVectorDB:
         if not nome_medicamento:
             return None
             
-        # Buscar no dataframe usando busca textual flexível
+        # Nome exato (sem acentos/maiúsculas) primeiro: "Paracetamol" não pode cair em "Aroma De Mel Paracetamol"
+        linha = self.linhas_por_nome.get(normalizar(nome_medicamento))
+        if linha is not None:
+            return self._detalhes(self.df.iloc[linha])
+        
+        # Senão, busca textual flexível
         mask = self.df['principio_ativo_limpo'].str.contains(
-            nome_medicamento, case=False, na=False # case=False = ignora maiúscula/minúscula, na=False = ignora valores nulos
+            nome_medicamento, case=False, na=False, regex=False # case=False = ignora maiúscula/minúscula, na=False = ignora valores nulos
         )
+        if self.por_produto and not mask.any():
+            # No corpus por produto também aceita nome comercial (ex: "Nuwiq")
+            mask = self.df['nome_produto'].str.contains(nome_medicamento, case=False, na=False, regex=False)
         
         matches = self.df[mask] # Filtra DataFrame usando máscara booleana
         if matches.empty: # Se não encontrou nada
             return None
             
         # Retornar informações detalhadas do primeiro match encontrado
-        med = matches.iloc[0] 
+        return self._detalhes(matches.iloc[0])
+    
+    def get_detalhes_por_indice(self, indice):
+        """Detalhes da linha `indice` do corpus (o campo "indice" de um resultado da busca), sem nova busca por nome"""
+        return self._detalhes(self.df.iloc[int(indice)])
+    
+    def _detalhes(self, med):
+        """Dicionário de detalhes de uma linha do DataFrame"""
         return {
             "principio_ativo": med.get('principio_ativo_limpo', ''), # Nome padronizado
             "categoria_terapeutica": med.get('categoria_terapeutica', ''), # Categoria terapêutica
+            "categorias": nomes_da_mascara(med.get('categorias_mask', 0)), # Todas as categorias (multi-rótulo)
+            "nivel_risco": med.get('nivel_risco', ''), # BAIXO/MÉDIO/ALTO pelas regras da categoria
+            "requer_receita": bool(med.get('requer_receita', True)), # Receita obrigatória pelas regras da categoria
             "popularidade_mercado": med.get('popularidade_mercado', ''), # Nível de popularidade
-            "total_produtos": med.get('total_produtos_registrados', 0), # Total de produtos registrados
+            "total_produtos": int(med.get('total_produtos_registrados', 0)), # Total de produtos registrados
             "diversidade_formulacoes": med.get('diversidade_formulacoes', ''), # Diversidade de apresentações
             "produtos_exemplo": med.get('produtos_principais', ''), # Exemplos de nomes comerciais
             "empresas_exemplo": med.get('empresas_principais', ''), # Exemplos de fabricantes
             "texto_completo": med.get('texto_completo_busca', '') # Texto completo com todas as informações
         }
 
+def mapear_nomes(df, por_produto=False):
+    """Nome normalizado -> primeira linha com esse princípio ativo (ou nome comercial, no corpus por produto)"""
+    colunas = ['principio_ativo_limpo'] + (['nome_produto'] if por_produto and 'nome_produto' in df.columns else [])
+    linhas = {}
+    for coluna in colunas:
+        primeiras = df[coluna].dropna().drop_duplicates() # Normaliza cada nome distinto uma vez
+        for linha, nome in zip(primeiras.index, primeiras):
+            linhas.setdefault(normalizar(nome), int(linha)) # Princípio ativo tem prioridade sobre nome comercial
+    return linhas
+
+def compilar_template(template):
+    """
+    Compila um template como "Medicamento: {principio_ativo_limpo} | {texto_completo_busca}"
+    em uma função que monta o texto de todas as linhas com operações de coluna do pandas
+    """
+    partes = list(Formatter().parse(template))
+    campos = [campo for _, campo, _, _ in partes if campo]
+    if not campos:
+        raise ValueError(f"Template de embedding sem nenhum campo: {template!r}")
+    
+    def montar(df):
+        faltando = [campo for campo in campos if campo not in df.columns]
+        if faltando:
+            raise ValueError(f"Colunas do template ausentes no CSV: {faltando}")
+        
+        textos = pd.Series('', index=df.index, dtype=object)
+        for literal, campo, _, _ in partes:
+            if literal:
+                textos = textos + literal
+            if campo:
+                textos = textos + df[campo].fillna('').astype(str)
+        return textos
+    
+    return montar
+
+def calcular_estatisticas(df, por_produto=False, top_n=TOP_ESTATISTICAS):
+    """
+    Agregados do corpus inteiro para o painel de estatísticas: contagens por categoria (principal e multi-rótulo),
+    popularidade, diversidade de formulações, risco, rankings de princípios e fabricantes
+    """
+    # Corpus por produto: estatísticas por princípio usam uma linha por princípio, com a união (OR) das
+    # máscaras dos produtos dele; categoria principal e risco saem da máscara unida
+    if por_produto:
+        unidas = (df['categorias_mask'].fillna(0).astype(np.uint16)
+                  .groupby(df['principio_ativo_limpo']).agg(np.bitwise_or.reduce))
+        principios = df.drop_duplicates('principio_ativo_limpo').copy()
+        principios['categorias_mask'] = principios['principio_ativo_limpo'].map(unidas).fillna(0).astype(np.uint16)
+        principal = principios['categorias_mask'].map({m: categoria_principal(m) for m in unidas.unique()})
+        principios['categoria_terapeutica'] = principal.where(principios['categorias_mask'] != 0, principios['categoria_terapeutica'])
+        principios['nivel_risco'], principios['requer_receita'] = classificar_risco(principios['categorias_mask'])
+    else:
+        principios = df
+    mascaras = principios['categorias_mask'].fillna(0).to_numpy(dtype=np.uint16)
+    
+    def contagem(coluna):
+        if coluna not in principios.columns:
+            return {}
+        return {str(k): int(v) for k, v in principios[coluna].fillna('não informado').value_counts().items()}
+    
+    # Multi-rótulo: um princípio conta em todas as suas categorias (teste de bit vetorizado)
+    multirrotulo = {nome: int(np.count_nonzero(mascaras & (1 << bit))) for bit, nome in enumerate(NOMES_CATEGORIAS)}
+    multirrotulo = {nome: n for nome, n in sorted(multirrotulo.items(), key=lambda item: -item[1]) if n}
+    
+    produtos = principios['total_produtos_registrados'].fillna(0).astype(int)
+    top_principios = principios.assign(total=produtos).nlargest(top_n, 'total')
+    
+    # Fabricantes: registros reais no corpus por produto; no agregado, em quantos princípios a empresa
+    # aparece entre as principais (até 3 por princípio)
+    if por_produto and 'empresa_produto' in df.columns:
+        empresas = df['empresa_produto'].dropna()
+    else:
+        empresas = principios['empresas_principais'].dropna().str.split('; ').explode()
+    empresas = empresas.str.strip()
+    top_empresas = []
+    for empresa, n in empresas[empresas != ''].value_counts().head(top_n).items():
+        cnpj, _, nome = empresa.partition(' - ')
+        top_empresas.append({"empresa": nome or cnpj, "cnpj": cnpj if nome else '', "total": int(n)})
+    
+    return {
+        "total_principios": int(len(principios)),
+        "total_linhas_indice": int(len(df)),
+        "total_produtos_registrados": int(produtos.sum()),
+        "produtos_por_principio": {
+            "media": round(float(produtos.mean()), 2) if len(produtos) else 0.0,
+            "mediana": float(produtos.median()) if len(produtos) else 0.0,
+            "max": int(produtos.max()) if len(produtos) else 0
+        },
+        "por_categoria": contagem('categoria_terapeutica'),
+        "por_categoria_multirrotulo": multirrotulo,
+        "por_popularidade": contagem('popularidade_mercado'),
+        "por_diversidade_formulacoes": contagem('diversidade_formulacoes'),
+        "por_nivel_risco": contagem('nivel_risco'),
+        "requer_receita": int(principios['requer_receita'].sum()) if 'requer_receita' in principios.columns else 0,
+        "top_principios": [
+            {"principio_ativo": linha.principio_ativo_limpo, "categoria_terapeutica": linha.categoria_terapeutica,
+             "total_produtos": int(linha.total)}
+            for linha in top_principios[['principio_ativo_limpo', 'categoria_terapeutica', 'total']].itertuples(index=False)
+        ],
+        "top_empresas": top_empresas
+    }
+
+def calcular_versao_indice(textos, template, model, tipo_indice):
+    """Identificador curto do conteúdo indexado, usado para invalidar caches quando o índice muda"""
+    soma_textos = int(pd.util.hash_pandas_object(textos, index=True).sum()) # Soma de hashes, vetorizada
+    nome_modelo = getattr(model, 'model_card_data', None)
+    nome_modelo = getattr(nome_modelo, 'base_model', None) or type(model).__name__
+    assinatura = f"{soma_textos:x}|{template}|{nome_modelo}|{tipo_indice}|{VERSAO_REGRAS_RISCO}"
+    return hashlib.sha1(assinatura.encode('utf-8')).hexdigest()[:12]
+
+def criar_indice(dim, tipo_indice='flat'):
+    """Cria índice FAISS vazio do tipo configurado"""
+    if tipo_indice == 'hnsw':
+        index = faiss.IndexHNSWFlat(dim, 32) # 32 vizinhos por nó do grafo
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = 64 # Compromisso entre recall e latência
+        return index
+    return faiss.IndexFlatL2(dim) # Índice Flat L2 
+
 # Instância global para facilitar uso em outros módulos 
 vector_db = None
 
+def caminho_corpus():
+    """Retorna o CSV do corpus escolhido em MEDAI_CORPUS ('principio' ou 'produto')"""
+    return CORPUS_PATHS.get(os.getenv('MEDAI_CORPUS', 'principio'), CORPUS_PATHS['principio'])
+
 def initialize_database(csv_path):
     """Inicializa o banco vetorial global a partir do CSV processado"""
     global vector_db